@@ -0,0 +1,99 @@
+import json
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING
+
+try:
+    import orjson
+except ImportError:  # optional, the json module does the same job a bit slower
+    orjson = None
+
+# Helpers for the read-only JSON API under /api/v1. Listings page with keyset
+# cursors ("<sort value>|<_id>" of the last item, like the HTML listings), and
+# ?fields= is turned into a Mongo projection so unused fields never leave the DB.
+
+PREFIX = '/api/v1'
+MAX_LIMIT = 200
+
+# Fields each resource can return, _id is always included
+FIELDS = {
+    'events': ('title', 'start_datetime', 'end_datetime', 'venue', 'organisers', 'link', 'tags', 'artists'),
+    'artists': ('name', 'description', 'tags', 'links'),
+    'venues': ('name', 'description', 'location', 'contact', 'link'),
+}
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _default(value):
+    # Stored datetimes are naive UTC
+    if isinstance(value, datetime):
+        return value.isoformat() + 'Z'
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Can't serialise {type(value).__name__}")
+
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z)
+    return json.dumps(payload, default=_default, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def projection(resource, fields_param, required=()):
+    # `required` fields are fetched for paging even when they weren't asked for
+    allowed = FIELDS[resource]
+    if not fields_param:
+        fields = list(allowed)
+    else:
+        fields = [f.strip() for f in fields_param.split(',') if f.strip()]
+        unknown = [f for f in fields if f not in allowed]
+        if unknown:
+            raise BadRequest(f"Unknown field(s) for {resource}: {', '.join(unknown)}")
+    return fields, {f: 1 for f in set(fields) | set(required)}
+
+
+def limit(args, default):
+    try:
+        value = int(args.get('limit', default))
+    except ValueError:
+        raise BadRequest("limit must be a number")
+    return max(1, min(value, MAX_LIMIT))
+
+
+def shape(docs, fields):
+    # Drop anything fetched only for paging
+    return [{'_id': str(doc['_id']), **{f: doc.get(f) for f in fields}} for doc in docs]
+
+
+def keyset_page(collection, query, sort_field, fields_projection, after, page_size):
+    # String sort keys (artist name_key, venue name), ties broken on _id
+    if after:
+        value, _, event_id = after.rpartition('|')
+        try:
+            last_id = ObjectId(event_id)
+        except InvalidId:
+            raise BadRequest("Invalid cursor")
+        query = {'$and': [query, {'$or': [
+            {sort_field: {'$gt': value}},
+            {sort_field: value, '_id': {'$gt': last_id}}
+        ]}]}
+    docs = list(collection.find(query, fields_projection)
+                .sort([(sort_field, ASCENDING), ('_id', ASCENDING)])
+                .limit(page_size + 1))
+    next_cursor = None
+    if len(docs) > page_size:
+        docs = docs[:page_size]
+        next_cursor = f"{docs[-1].get(sort_field) or ''}|{docs[-1]['_id']}"
+    return docs, next_cursor
+
+
+def names_page(names, after, page_size):
+    # For distinct values (organisers), already sorted
+    if after:
+        names = [n for n in names if n > after]
+    page = names[:page_size]
+    return page, page[-1] if len(names) > page_size else None
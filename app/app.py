@@ -1,77 +1,281 @@
-from flask import Flask, request, render_template, redirect, url_for, abort, Response, session, send_from_directory, send_file
-from pymongo import MongoClient
+from flask import Flask, request, render_template, redirect, url_for, abort, Response, session, send_from_directory, jsonify, g, stream_with_context
 from datetime import datetime, timedelta
 import os
 from bson.objectid import ObjectId  # Added for ObjectId conversion
-import markdown
-import json
-import pytz
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError, DuplicateKeyError
+import hmac
+import functools
+import time
+import io
+import mongo_pool
+import event_time
+from artist_store import name_key, upsert_artists, artist_links
+from indexes import ensure_indexes
+from migrate_datetimes import migrate_events
+import search
+import content_version
+from page_cache import PageCache, LRUBackend
+from http_cache import conditional
+from notes_store import NoteStore
+import exporter
+import metrics
+import event_import
+import ics_feed
+import api
+import event_stats
+import archive
+import bulk_edit
 
 app = Flask(__name__)
 app.secret_key = 'supersecretkey'  # New: secret key for admin sessions
 
+# Requests slower than this are logged with a breakdown of where the time went
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", 1.0))
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.start_request()
+
+@app.after_request
+def record_request_time(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    route = request.endpoint or 'unmatched'
+    metrics.request_duration.observe(elapsed, route, request.method, response.status_code)
+    if elapsed >= SLOW_REQUEST_SECONDS:
+        metrics.slow_requests.inc(route)
+        app.logger.warning(f"Slow request {request.method} {request.full_path} took {elapsed:.3f}s: "
+                           f"{metrics.request_breakdown()}")
+    return response
+
 def get_db_connection():
     # Allow override for testing
     if hasattr(app, 'db_override') and app.db_override is not None:
         return app.db_override
-    client = MongoClient(os.getenv("DB_URL"))
-    db = client[os.getenv("DB_NAME")]
-    return db
+    # Reuse the process-wide pooled client rather than connecting per request
+    return mongo_pool.get_database()
+
+# Rendered public pages, keyed on the content versions of the data they show
+page_cache = PageCache(LRUBackend(max_entries=int(os.getenv("PAGE_CACHE_SIZE", 256)),
+                                  ttl=int(os.getenv("PAGE_CACHE_TTL", 600))))
+
+# Pool and page cache numbers alongside the histograms on /metrics
+# Pool event counts only ever go up, connections open/in use and clients go up and down
+POOL_GAUGES = ('open_connections', 'in_use', 'clients')
+metrics.REGISTRY.append(metrics.Readings('mongo_pool', 'counter', lambda: {
+    f'naarm_mongo_pool_{key}_total': value for key, value in mongo_pool.stats.snapshot().items()
+    if key not in POOL_GAUGES}))
+metrics.REGISTRY.append(metrics.Readings('mongo_pool_gauges', 'gauge', lambda: {
+    f'naarm_mongo_pool_{key}': value for key, value in mongo_pool.pool_stats().items() if key in POOL_GAUGES}))
+metrics.REGISTRY.append(metrics.Readings('page_cache', 'counter', lambda: {
+    f'naarm_page_cache_{outcome}_total': page_cache.stats()[outcome] for outcome in ('hits', 'misses')}))
+# The upcoming/past split moves with the clock, so listing pages also roll over
+# every LISTING_BUCKET_SECONDS even when nothing was written
+LISTING_BUCKET_SECONDS = int(os.getenv("LISTING_BUCKET_SECONDS", 300))
+
+def site_state():
+    # Content versions, read at most once per request
+    if 'site_state' not in g:
+        g.site_state = content_version.current(get_db_connection())
+    return g.site_state
+
+def data_version(*collections):
+    return lambda: tuple(site_state()['versions'].get(c, 0) for c in collections)
+
+def data_validators(*collections, bucket_seconds=None):
+    # (identity, last modified) for http_cache.conditional
+    def state(*args, **kwargs):
+        current = site_state()
+        identity = tuple(current['versions'].get(c, 0) for c in collections)
+        stamps = [current['modified'][c] for c in collections if c in current['modified']]
+        last_modified = max(stamps) if stamps else None
+        if bucket_seconds:
+            # Listings also change when the cutoff moves into a new bucket
+            bucket = int(time.time() // bucket_seconds)
+            identity += (bucket,)
+            bucket_start = datetime.utcfromtimestamp(bucket * bucket_seconds)
+            last_modified = max(last_modified, bucket_start) if last_modified else bucket_start
+        return identity, last_modified
+    return state
+
+# Notes are parsed once and re-read only when their files change
+note_store = NoteStore(os.path.join(os.path.dirname(__file__), 'notes'),
+                       check_interval=float(os.getenv("NOTES_CHECK_INTERVAL", 2)))
+
+def notes_version():
+    return note_store.version()
+
+def mark_changed(db, *collections):
+    # Call after any write so every worker's cached pages for this data go stale. The
+    # cache keys carry the versions, so the stale entries just age out of the LRU
+    content_version.bump(db, *collections)
         
-@app.route('/', methods=['GET', 'POST'])
-def index():
-    db = get_db_connection()
-    search_query = ""
-    # Use cutoff time of 6 hours past the finish time in Melbourne timezone
+# Number of events shown per listing page, older/newer ones are reached with "load more"
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", 50))
+# Search results page by date in bigger pages, each ranked by relevance. Ranking is
+# per page: a strong match further than SEARCH_LIMIT events out by date turns up on
+# a later "load more" page, not at the top of the first one
+SEARCH_LIMIT = int(os.getenv("SEARCH_LIMIT", 200))
+
+# Only the fields the listing template actually renders
+LISTING_PROJECTION = {
+    'start_datetime': 1,
+    'end_datetime': 1,
+    'title': 1,
+    'organisers': 1,
+    'venue': 1,
+    'link': 1,
+    'tags': 1,
+    'artists': 1
+}
+
+def listing_cutoff():
+    # Use cutoff time of 6 hours past the finish time
     # This is to ensure we only show events that are still going on or starting soon
-    melbourne_tz = pytz.timezone("Australia/Melbourne")
-    melbourne_now = datetime.now(melbourne_tz)
-    cutofftime = melbourne_now - timedelta(hours=6)
-    if request.method == 'POST':
-        search_query = request.form['search']
-        events = list(db.events.find({
-            '$and': [
-                {'end_datetime': {'$gte': cutofftime.isoformat()}},
-                {'$or': [
-                    {'title': {'$regex': search_query, '$options': 'i'}},
-                    {'organisers': {'$regex': search_query, '$options': 'i'}},
-                    {'venue': {'$regex': search_query, '$options': 'i'}},
-                    {'tags': {'$regex': search_query, '$options': 'i'}},
-                    {'artists': {'$regex': search_query, '$options': 'i'}}
-                ]}
-            ]
-        }))
-    else:
-        events = list(db.events.find({'end_datetime': {'$gte': cutofftime.isoformat()}}))
+    return event_time.utcnow() - timedelta(hours=6)
 
-    for event in events:
-        event['start_datetime'] = datetime.fromisoformat(event['start_datetime'])
-        event['end_datetime'] = datetime.fromisoformat(event['end_datetime'])
-    events.sort(key=lambda x: x['start_datetime'])
+# Keyset cursors are "<start_datetime>|<_id>" of the last event on the previous page,
+# so paging stays an index range scan no matter how deep into the archive we go
+def encode_cursor(event):
+    return f"{event['start_datetime'].isoformat()}|{event['_id']}"
 
+def decode_cursor(cursor):
+    if not cursor or '|' not in cursor:
+        return None
+    start, event_id = cursor.rsplit('|', 1)
+    try:
+        return datetime.fromisoformat(start), ObjectId(event_id)
+    except (ValueError, InvalidId):
+        return None
+
+def keyset_query(query, after, descending=False):
+    position = decode_cursor(after)
+    if not position:
+        return query
+    start, event_id = position
+    op = '$lt' if descending else '$gt'
+    return {'$and': [query, {'$or': [
+        {'start_datetime': {op: start}},
+        {'start_datetime': start, '_id': {op: event_id}}
+    ]}]}
+
+def fetch_event_page(db, query, descending=False, after=None, page_size=None, projection=None, collection=None):
+    page_size = page_size or PAGE_SIZE
+    direction = DESCENDING if descending else ASCENDING
+    query = keyset_query(query, after, descending)
+    collection = db.events if collection is None else collection
+    # Fetch one extra row to know whether there is another page
+    events = list(collection.find(query, projection or LISTING_PROJECTION)
+                  .sort([('start_datetime', direction), ('_id', direction)])
+                  .limit(page_size + 1))
+    next_cursor = None
+    if len(events) > page_size:
+        events = events[:page_size]
+        next_cursor = encode_cursor(events[-1])
+    return events, next_cursor
+
+def fetch_past_page(db, query, after=None, page_size=None):
+    # Newest first across both tiers. Archiving goes by end date but the listing sorts by
+    # start, so a long-running live event can start before archived ones. The archive is
+    # only read when the live page runs short or reaches back to the newest archived
+    # start, then a page from each tier is merged on the (start_datetime, _id) key
+    page_size = page_size or PAGE_SIZE
+    events, next_cursor = fetch_event_page(db, query, descending=True, after=after, page_size=page_size)
+    archived = db[archive.COLLECTION]
+    if next_cursor:
+        newest = archived.find_one({}, {'start_datetime': 1}, sort=[('start_datetime', DESCENDING)])
+        if newest is None or events[-1]['start_datetime'] > newest['start_datetime']:
+            return events, next_cursor
+    older, archive_cursor = fetch_event_page(db, query, descending=True, after=after, page_size=page_size,
+                                             collection=archived)
+    events = sorted(events + older, key=lambda e: (e['start_datetime'], e['_id']), reverse=True)
+    more = next_cursor is not None or archive_cursor is not None or len(events) > page_size
+    events = events[:page_size]
+    return events, encode_cursor(events[-1]) if more else None
+
+def attach_artist_links(db, events):
     # --- ARTIST LINK LOGIC ---
-    # Collect all unique artist names (case-insensitive, stripped)
-    artist_names = set()
-    for event in events:
-        for artist in event.get('artists', []):
-            artist_names.add(artist.strip().lower())
-    # Fetch all artists from the DB (case-insensitive lookup in Python)
-    artist_docs = list(db.Artists.find())
-    # Build lookup dict (lowercase name -> artist doc)
-    artist_lookup = {a['name'].strip().lower(): a for a in artist_docs}
-    # For each event, build a new list for template
+    # Link each artist to their bio page if they have one, looked up (case-insensitive)
+    # through the artist link cache so only artists it hasn't seen hit the DB
+    keys = {name_key(artist) for event in events for artist in event.get('artists', [])}
+    # Keyed on the same Artists version as the cached page, so it never gets older links
+    artist_ids = artist_links.lookup(db, keys, version=data_version('Artists')()[0])
     for event in events:
-        event['artist_links'] = []
-        for artist in event.get('artists', []):
-            key = artist.strip().lower()
-            artist_doc = artist_lookup.get(key)
-            if artist_doc and artist_doc.get('description', '').strip():
-                event['artist_links'].append({'name': artist.strip(), 'id': str(artist_doc['_id'])})
-            else:
-                event['artist_links'].append({'name': artist.strip(), 'id': None})
+        event['artist_links'] = [
+            {'name': artist.strip(), 'id': artist_ids.get(name_key(artist))}
+            for artist in event.get('artists', [])
+        ]
     # --- END ARTIST LINK LOGIC ---
 
-    return render_template('index.html', events=events, search_query=search_query, show_past=False, artists=artist_docs)
+# Facet filters the listings accept in the query string, see ics_feed.filter_clauses
+LISTING_FILTERS = ('tag', 'venue', 'from', 'to')
+
+def listing_facets(db):
+    # Counts come from the event_stats collection, not from scanning events
+    return {
+        'tags': event_stats.facets(db, 'tag'),
+        'venues': event_stats.facets(db, 'venue'),
+        'days': event_stats.day_facets(db),
+    }
+
+def render_listing(show_past):
+    db = get_db_connection()
+    search_query = ""
+    cutofftime = listing_cutoff()
+    if show_past:
+        query = {'end_datetime': {'$lt': cutofftime}}
+    else:
+        query = {'end_datetime': {'$gte': cutofftime}}
+    filters = {name: request.args[name] for name in LISTING_FILTERS if request.args.get(name)}
+    try:
+        clauses = ics_feed.filter_clauses(request.args)
+    except ics_feed.InvalidFilter as e:
+        return str(e), 400
+    if clauses:
+        query = {'$and': [query] + clauses}
+    after = request.values.get('after')
+    # The search box posts, "load more" links carry the search in the query string
+    search_query = request.values.get('search', '').strip()
+    # Search results come in bigger pages, ranked by relevance within the page only.
+    # The date cursor keeps "load more" cheap; ranking across pages would need every match
+    page_size = SEARCH_LIMIT if search_query else PAGE_SIZE
+    if search_query:
+        query = {'$and': [query, search.search_filter(search_query)]}
+    route = request.endpoint
+    with metrics.phase(route, 'query'):
+        if show_past:
+            # The past listing runs most recent first and carries on into the archive
+            events, next_cursor = fetch_past_page(db, query, after=after, page_size=page_size)
+        else:
+            # Upcoming events run soonest first
+            events, next_cursor = fetch_event_page(db, query, after=after, page_size=page_size)
+    with metrics.phase(route, 'prepare'):
+        if search_query:
+            events = search.rank(events, search_query, descending=show_past)
+        for event in events:
+            event['start_datetime'] = event_time.local(event['start_datetime'])
+            event['end_datetime'] = event_time.local(event['end_datetime'])
+    with metrics.phase(route, 'artist_links'):
+        attach_artist_links(db, events)
+    with metrics.phase(route, 'facets'):
+        facets = listing_facets(db) if not show_past and not search_query else None
+
+    with metrics.phase(route, 'render'):
+        page_args = dict(filters, search=search_query) if search_query else filters
+        return render_template('index.html', events=events, search_query=search_query, show_past=show_past,
+                               next_cursor=next_cursor, is_first_page=not after, filters=filters,
+                               page_args=page_args, facets=facets)
+
+@app.route('/', methods=['GET', 'POST'])
+@conditional(data_validators('events', 'Artists', bucket_seconds=LISTING_BUCKET_SECONDS), 'public, max-age=60')
+@page_cache.cached(data_version('events', 'Artists'), bucket_seconds=LISTING_BUCKET_SECONDS)
+def index():
+    return render_listing(show_past=False)
 
 @app.route('/clearEventSearch', methods=['POST'])
 def clear_event_search():
@@ -81,109 +285,31 @@ def clear_event_search():
     return redirect(url_for('index'))
 
 @app.route('/past', methods=['GET', 'POST'])
+@conditional(data_validators('events', 'Artists', bucket_seconds=LISTING_BUCKET_SECONDS), 'public, max-age=300')
+@page_cache.cached(data_version('events', 'Artists'), bucket_seconds=LISTING_BUCKET_SECONDS)
 def past_events():
-    db = get_db_connection()
-    search_query = ""
-    melbourne_tz = pytz.timezone("Australia/Melbourne")
-    melbourne_now = datetime.now(melbourne_tz)
-    cutofftime = melbourne_now - timedelta(hours=6)
-
-    if request.method == 'POST':
-        search_query = request.form['search']
-        events = list(db.events.find({
-            '$and': [
-                {'end_datetime': {'$lt': cutofftime.isoformat()}},
-                {'$or': [
-                    {'title': {'$regex': search_query, '$options': 'i'}},
-                    {'organisers': {'$regex': search_query, '$options': 'i'}},
-                    {'venue': {'$regex': search_query, '$options': 'i'}},
-                    {'tags': {'$regex': search_query, '$options': 'i'}},
-                    {'artists': {'$regex': search_query, '$options': 'i'}}
-                ]}
-            ]
-        }))
-    else:
-        events = list(db.events.find({'end_datetime': {'$lt': cutofftime.isoformat()}}))
-    for event in events:
-        event['start_datetime'] = datetime.fromisoformat(event['start_datetime'])
-        event['end_datetime'] = datetime.fromisoformat(event['end_datetime'])
-    events.sort(key=lambda x: x['start_datetime'], reverse=True)
-
-    # --- ARTIST LINK LOGIC ---
-    # Collect all unique artist names (case-insensitive, stripped)
-    artist_names = set()
-    for event in events:
-        for artist in event.get('artists', []):
-            artist_names.add(artist.strip().lower())
-    # Fetch all artists from the DB (case-insensitive lookup in Python)
-    artist_docs = list(db.Artists.find())
-    # Build lookup dict (lowercase name -> artist doc)
-    artist_lookup = {a['name'].strip().lower(): a for a in artist_docs}
-    # For each event, build a new list for template
-    for event in events:
-        event['artist_links'] = []
-        for artist in event.get('artists', []):
-            key = artist.strip().lower()
-            artist_doc = artist_lookup.get(key)
-            if artist_doc and artist_doc.get('description', '').strip():
-                event['artist_links'].append({'name': artist.strip(), 'id': str(artist_doc['_id'])})
-            else:
-                event['artist_links'].append({'name': artist.strip(), 'id': None})
-    # --- END ARTIST LINK LOGIC ---
-
-    return render_template('index.html', events=events, search_query=search_query, show_past=True)
+    return render_listing(show_past=True)
 
 @app.route('/createEvent', methods=['POST'])
 def create_event():
 
     ## Validate the input data
-    if not request.form['title'] or not request.form['start_datetime'] or not request.form['end_datetime']:
-        return "Missing required fields", 400
-    # check end datetime is after start datetime
     try:
-        start_datetime = datetime.fromisoformat(request.form['start_datetime'])
-        end_datetime = datetime.fromisoformat(request.form['end_datetime'])
-        if end_datetime <= start_datetime:
-            return "End datetime must be after start datetime", 400
-    except ValueError:
-        return "Invalid datetime format", 400
-    
-    title = request.form['title']
-    organisers = request.form['organisers']
-    venue = request.form['venue']
-    link = request.form['link']
-    start_datetime = request.form['start_datetime']
-    end_datetime = request.form['end_datetime']
-    tags = [t.strip() for t in request.form['tags'].split(',') if t.strip()]
-    artists = [a.strip() for a in request.form['artists'].split(',') if a.strip()]
+        event = event_import.parse_event(request.form)
+    except event_import.InvalidEvent as e:
+        return str(e), 400
 
     db = get_db_connection()
-    db.events.insert_one({
-        'start_datetime': start_datetime,
-        'end_datetime': end_datetime,
-        'title': title,
-        'organisers': organisers,
-        'venue': venue,
-        'link': link,
-        'tags': tags,
-        'artists': artists
-    })
+    event_import.with_derived_fields(event)
+    try:
+        db.events.insert_one(event)
+    except DuplicateKeyError:
+        return "This event is already listed", 400
+    event_stats.record(db, added=[event])
 
     # --- Artists Table Management ---
-    for artist in artists:
-        artist_clean = artist.strip()
-        if not artist_clean:
-            continue
-        # Check if artist exists (case-insensitive, trimmed)
-        existing = db.Artists.find_one({
-            'name': {'$regex': f'^{artist_clean}$', '$options': 'i'}
-        })
-        if not existing:
-            db.Artists.insert_one({
-                'name': artist_clean,
-                'description': '',
-                'tags': ''
-            })
+    upsert_artists(db, event['artists'])
+    mark_changed(db, 'events', 'Artists')
     # --- End Artists Table Management ---
 
     return redirect(url_for('index'))
@@ -204,25 +330,41 @@ def create_venue():
         'contact': contact,
         'link': link
     })
+    mark_changed(db, 'venues')
     return redirect(url_for('venues'))
 
 @app.route('/addEvent', methods=['GET'])
 def add_event():
     return render_template('add_event.html')
 
+# Stats pages split upcoming/past by day, so they roll over with the clock too
 @app.route('/venues', methods=['GET'])
+@page_cache.cached(data_version('venues', 'events'), bucket_seconds=LISTING_BUCKET_SECONDS)
 def venues():
     db = get_db_connection()
-    venues = db.venues.find()
+    venues = list(db.venues.find())
+    counts = event_stats.counts_by_key(db, 'venue')
+    for venue in venues:
+        venue['stats'] = counts.get(name_key(venue.get('name', '')))
     return render_template('venues.html', venues=venues)
 
 @app.route('/organisers', methods=['GET'])
+@page_cache.cached(data_version('events'), bucket_seconds=LISTING_BUCKET_SECONDS)
 def organisers():
     db = get_db_connection()
-    organisers = db.events.distinct('organisers')
+    organisers = event_stats.summary(db, 'organiser')
     return render_template('organisers.html', organisers=organisers)
 
+@app.route('/tags', methods=['GET'])
+@page_cache.cached(data_version('events'), bucket_seconds=LISTING_BUCKET_SECONDS)
+def tags():
+    db = get_db_connection()
+    tags = event_stats.summary(db, 'tag')
+    return render_template('tags.html', tags=tags)
+
 @app.route('/artists', methods=['GET'])
+@conditional(data_validators('Artists'), 'public, max-age=300')
+@page_cache.cached(data_version('Artists'))
 def artists():
     db = get_db_connection()
     # Fetch all artists, sort alphabetically (case-insensitive)
@@ -234,12 +376,12 @@ def artists():
 @app.route('/calendar/<event_id>')
 def calendar_event(event_id):
     db = get_db_connection()
-    event = db.events.find_one({'_id': ObjectId(event_id)})
+    event = archive.find_event(db, {'_id': ObjectId(event_id)})
     if not event:
         abort(404)
-    # Parse datetime and set Melbourne timezone
-    start_dt = datetime.fromisoformat(event['start_datetime'])
-    end_dt = datetime.fromisoformat(event['end_datetime'])
+    # Google Calendar gets Melbourne local time
+    start_dt = event_time.local(event['start_datetime'])
+    end_dt = event_time.local(event['end_datetime'])
 
     # Format for Google Calendar (removing the Z suffix to prevent UTC interpretation)
     start_str = start_dt.strftime("%Y%m%dT%H%M%S")
@@ -268,90 +410,108 @@ def calendar_event(event_id):
 
 # New route to generate ICS file.
 @app.route('/ics/<event_id>')
+@conditional(data_validators('events'), 'public, max-age=3600')
 def ics_file(event_id):
     db = get_db_connection()
-    event = db.events.find_one({'_id': ObjectId(event_id)})
+    event = archive.find_event(db, {'_id': ObjectId(event_id)})
     if not event:
         abort(404)
-    start_dt = datetime.fromisoformat(event['start_datetime'])
-    end_dt = datetime.fromisoformat(event['end_datetime'])
-    dtstamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-    ics_content = f"""BEGIN:VCALENDAR
-VERSION:2.0
-PRODID:NaarmList
-BEGIN:VEVENT
-UID:{event_id}@naarm-list
-DTSTAMP:{dtstamp}
-DTSTART:{start_dt.strftime("%Y%m%dT%H%M%SZ")}
-DTEND:{end_dt.strftime("%Y%m%dT%H%M%SZ")}
-SUMMARY:{event['title']}
-DESCRIPTION:{event['link']}
-LOCATION:{event['venue']}
-END:VEVENT
-END:VCALENDAR
-"""
+    ics_content = ''.join(ics_feed.iter_calendar([event]))
     return Response(ics_content, mimetype="text/calendar", headers={"Content-Disposition": f"attachment; filename={event['title']}.ics"})
 
+# Subscribable feed, e.g. /calendar.ics?tag=techno&venue=Miscellania&from=2025-01-01
+# Filters: tag, venue, artist, organiser (repeatable) and a from/to date window
+CALENDAR_FEED_LIMIT = int(os.getenv("CALENDAR_FEED_LIMIT", 2000))
+
+@app.route('/calendar.ics')
+@conditional(data_validators('events', bucket_seconds=LISTING_BUCKET_SECONDS), 'public, max-age=900')
+@page_cache.cached(data_version('events'), bucket_seconds=LISTING_BUCKET_SECONDS)
+def calendar_feed():
+    try:
+        query = ics_feed.feed_query(request.args, listing_cutoff())
+    except ics_feed.InvalidFilter as e:
+        return str(e), 400
+    db = get_db_connection()
+    events = (db.events.find(query, ics_feed.FEED_PROJECTION)
+              .sort([('start_datetime', ASCENDING), ('_id', ASCENDING)])
+              .limit(CALENDAR_FEED_LIMIT)
+              .batch_size(200))
+    return Response(ics_feed.iter_calendar(events, ics_feed.feed_name(request.args)),
+                    mimetype="text/calendar")
+
+# --- JSON API ---
+# Read only, cached and revalidated exactly like the HTML pages, see api.py
+
+def api_endpoint(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            payload = view(*args, **kwargs)
+        except (api.BadRequest, ics_feed.InvalidFilter) as e:
+            return Response(api.dumps({'error': str(e)}), status=400, mimetype='application/json')
+        return Response(api.dumps(payload), mimetype='application/json')
+    return wrapper
+
+@app.after_request
+def api_headers(response):
+    # Partner sites call the API straight from the browser
+    if request.path.startswith(api.PREFIX):
+        response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+@app.route(f'{api.PREFIX}/events')
+@conditional(data_validators('events', bucket_seconds=LISTING_BUCKET_SECONDS), 'public, max-age=60')
+@page_cache.cached(data_version('events'), bucket_seconds=LISTING_BUCKET_SECONDS)
+@api_endpoint
+def api_events():
+    # Same filters as /calendar.ics: tag, venue, artist, organiser, from, to
+    fields, projection = api.projection('events', request.args.get('fields'), required=('start_datetime',))
+    query = ics_feed.feed_query(request.args, listing_cutoff())
+    after = request.args.get('after')
+    if after and not decode_cursor(after):
+        raise api.BadRequest("Invalid cursor")
+    events, next_cursor = fetch_event_page(get_db_connection(), query, after=after,
+                                           page_size=api.limit(request.args, PAGE_SIZE), projection=projection)
+    return {'data': api.shape(events, fields), 'next_cursor': next_cursor}
+
+@app.route(f'{api.PREFIX}/artists')
+@conditional(data_validators('Artists'), 'public, max-age=300')
+@page_cache.cached(data_version('Artists'))
+@api_endpoint
+def api_artists():
+    fields, projection = api.projection('artists', request.args.get('fields'), required=('name_key',))
+    artists, next_cursor = api.keyset_page(get_db_connection().Artists, {}, 'name_key', projection,
+                                           request.args.get('after'), api.limit(request.args, PAGE_SIZE))
+    return {'data': api.shape(artists, fields), 'next_cursor': next_cursor}
+
+@app.route(f'{api.PREFIX}/venues')
+@conditional(data_validators('venues'), 'public, max-age=300')
+@page_cache.cached(data_version('venues'))
+@api_endpoint
+def api_venues():
+    fields, projection = api.projection('venues', request.args.get('fields'), required=('name',))
+    venues, next_cursor = api.keyset_page(get_db_connection().venues, {}, 'name', projection,
+                                          request.args.get('after'), api.limit(request.args, PAGE_SIZE))
+    return {'data': api.shape(venues, fields), 'next_cursor': next_cursor}
+
+@app.route(f'{api.PREFIX}/organisers')
+@conditional(data_validators('events'), 'public, max-age=300')
+@page_cache.cached(data_version('events'))
+@api_endpoint
+def api_organisers():
+    names = sorted(row['name'] for row in event_stats.summary(get_db_connection(), 'organiser'))
+    page, next_cursor = api.names_page(names, request.args.get('after'), api.limit(request.args, PAGE_SIZE))
+    return {'data': page, 'next_cursor': next_cursor}
+
 @app.route('/notes', methods=['GET', 'POST'])
+@page_cache.cached(notes_version)
 def notes():
-    notes_dir = os.path.join(os.path.dirname(__file__), 'notes')
     search_query = ""
-    notes = []
-    
     if request.method == 'POST' and 'search' in request.form:
         search_query = request.form['search']
-    
-    if os.path.exists(notes_dir):
-        for filename in os.listdir(notes_dir):
-            if filename.endswith('.md'):
-                filepath = os.path.join(notes_dir, filename)
-                with open(filepath, 'r') as f:
-                    content = f.read()
-                    # Parse front matter
-                    metadata = {}
-                    if content.startswith('---'):
-                        parts = content.split('---', 2)[1:]
-                        if len(parts) >= 2:
-                            front_matter = parts[0].strip()
-                            content = parts[1].strip()
-                            # Parse each line of front matter
-                            for line in front_matter.split('\n'):
-                                if ':' in line:
-                                    key, value = line.split(':', 1)
-                                    metadata[key.strip()] = value.strip()
-                    
-                    # Convert date string to datetime if present
-                    if 'date' in metadata:
-                        try:
-                            metadata['date'] = datetime.strptime(metadata['date'], '%Y-%m-%d')
-                        except ValueError:
-                            metadata['date'] = datetime.now()
-                    else:
-                        metadata['date'] = datetime.now()
-
-                    # Convert tags string to list if present
-                    if 'tags' in metadata:
-                        metadata['tags'] = [tag.strip() for tag in metadata['tags'].split(',')]
-                    else:
-                        metadata['tags'] = []
-
-                    # Apply search filter only if there's a query from POST
-                    if search_query:
-                        title_match = metadata.get('title', '').lower().find(search_query.lower()) != -1
-                        tags_match = any(search_query.lower() in tag.lower() for tag in metadata.get('tags', []))
-                        content_match = content.lower().find(search_query.lower()) != -1
-                        if not (title_match or tags_match or content_match):
-                            continue
-
-                    html_content = markdown.markdown(content)
-                    notes.append({
-                        'filename': filename,
-                        'content': html_content,
-                        'metadata': metadata
-                    })
-
-    # Sort notes by date, newest first
-    notes.sort(key=lambda x: x['metadata']['date'], reverse=True)
+
+    # Parsed, rendered and sorted newest first by the note store
+    notes = note_store.search(search_query)
     has_results = len(notes) > 0
     return render_template('notes.html', 
                          notes=notes, 
@@ -375,24 +535,73 @@ def admin_login():
             return render_template('admin_login.html', error=error)
     return render_template('admin_login.html')
 
+# Dashboard filters, dates are Melbourne days (upcoming events when `from` is empty)
+ADMIN_FILTERS = ('from', 'to', 'venue', 'q')
+
 @app.route('/admin/dashboard')
 def admin_dashboard():
     if not session.get('admin'):
         return redirect(url_for('admin_login'))
     db = get_db_connection()
-    events = list(db.events.find())
+    filters = {name: request.args[name] for name in ADMIN_FILTERS if request.args.get(name)}
+    try:
+        query = ics_feed.feed_query(request.args, listing_cutoff())
+    except ics_feed.InvalidFilter as e:
+        return str(e), 400
+    if filters.get('q'):
+        query = {'$and': [query, search.search_filter(filters['q'])]}
+    after = request.args.get('after')
+    events, next_cursor = fetch_event_page(db, query, after=after)
     for event in events:
-        event['start_datetime'] = datetime.fromisoformat(event['start_datetime'])
-        event['end_datetime'] = datetime.fromisoformat(event['end_datetime'])
-    events.sort(key=lambda x: x['start_datetime'])
-    return render_template('admin_dashboard.html', events=events)
+        event['start_datetime'] = event_time.local(event['start_datetime'])
+        event['end_datetime'] = event_time.local(event['end_datetime'])
+    return render_template('admin_dashboard.html', events=events, filters=filters, next_cursor=next_cursor,
+                           is_first_page=not after, message=session.pop('admin_message', None))
+
+@app.route('/admin/bulk', methods=['POST'])
+def admin_bulk():
+    if not session.get('admin'):
+        return redirect(url_for('admin_login'))
+    db = get_db_connection()
+    action = request.form.get('action')
+    try:
+        ids = [ObjectId(value) for value in request.form.getlist('ids')]
+    except InvalidId:
+        return "Invalid event id", 400
+    try:
+        if action == 'delete':
+            message = f"{bulk_edit.delete_events(db, ids)} events deleted"
+            changed = ('events',)
+        elif action == 'tag':
+            count = bulk_edit.rewrite_tag(db, request.form.get('old', ''), request.form.get('new', ''), ids)
+            message, changed = f"Tag rewritten on {count} events", ('events',)
+        elif action == 'venue':
+            count = bulk_edit.rewrite_venue(db, request.form.get('old', ''), request.form.get('new', ''), ids)
+            message, changed = f"Venue rewritten on {count} events", ('events',)
+        elif action == 'merge_artists':
+            duplicates = [name.strip() for name in request.form.get('duplicates', '').split(',') if name.strip()]
+            removed, count = bulk_edit.merge_artists(db, request.form.get('keep', ''), duplicates)
+            message, changed = f"Merged {removed} artists, {count} events updated", ('events', 'Artists')
+        else:
+            return "Unknown action", 400
+    except ValueError as e:
+        return str(e), 400
+    mark_changed(db, *changed)
+    session['admin_message'] = message
+    # Back to the same filtered page
+    return_to = request.form.get('return_to', '')
+    if not return_to.startswith(url_for('admin_dashboard')):
+        return_to = url_for('admin_dashboard')
+    return redirect(return_to)
 
 @app.route('/admin/delete/<event_id>', methods=['POST'])
 def admin_delete(event_id):
     if not session.get('admin'):
         return redirect(url_for('admin_login'))
     db = get_db_connection()
-    db.events.delete_one({'_id': ObjectId(event_id)})
+    deleted = db.events.find_one_and_delete({'_id': ObjectId(event_id)}, projection=event_stats.PROJECTION)
+    event_stats.record(db, removed=[deleted])
+    mark_changed(db, 'events')
     return redirect(url_for('admin_dashboard'))
 
 @app.route('/admin/edit/<event_id>', methods=['GET', 'POST'])
@@ -401,79 +610,118 @@ def admin_edit(event_id):
         return redirect(url_for('admin_login'))
     db = get_db_connection()
     if request.method == 'POST':
+        try:
+            start_datetime = event_time.to_utc(request.form['start_datetime'])
+            end_datetime = event_time.to_utc(request.form['end_datetime'])
+        except ValueError:
+            return "Invalid datetime format", 400
         updated_fields = {
             'title': request.form['title'],
             'organisers': request.form['organisers'],
             'venue': request.form['venue'],
             'link': request.form['link'],
-            'start_datetime': request.form['start_datetime'],
-            'end_datetime': request.form['end_datetime'],
+            'start_datetime': start_datetime,
+            'end_datetime': end_datetime,
             'tags': [tag.strip() for tag in request.form['tags'].split(',') if tag.strip()],
             'artists': [artist.strip() for artist in request.form['artists'].split(',') if artist.strip()]
         }
-        db.events.update_one({'_id': ObjectId(event_id)}, {'$set': updated_fields}, upsert=True)
+        updated_fields['search_tokens'] = search.event_search_tokens(updated_fields)
+        updated_fields['fingerprint'] = event_import.fingerprint(updated_fields)
+        now = datetime.utcnow()
+        updated_fields['updated_at'] = now
+        try:
+            # An upserted event gets its creation stamp too
+            previous = db.events.find_one_and_update({'_id': ObjectId(event_id)},
+                                                     {'$set': updated_fields, '$setOnInsert': {'created_at': now}},
+                                                     projection=event_stats.PROJECTION, upsert=True)
+        except DuplicateKeyError:
+            return "Another event has the same title, venue and start", 400
+        event_stats.record(db, added=[updated_fields], removed=[previous])
         # --- Artists Table Management for update ---
-        for artist in updated_fields['artists']:
-            artist_clean = artist.strip()
-            if not artist_clean:
-                continue
-            existing = db.Artists.find_one({
-                'name': {'$regex': f'^{artist_clean}$', '$options': 'i'}
-            })
-            if not existing:
-                db.Artists.insert_one({
-                    'name': artist_clean,
-                    'description': '',
-                    'tags': '',
-                    'links': []
-                })
+        upsert_artists(db, updated_fields['artists'])
+        mark_changed(db, 'events', 'Artists')
         # --- End Artists Table Management ---
         return redirect(url_for('admin_dashboard'))
     else:
         event = db.events.find_one({'_id': ObjectId(event_id)})
         if not event:
             abort(404)
+        # The form edits Melbourne local time
+        event['start_datetime'] = event_time.to_form(event['start_datetime'])
+        event['end_datetime'] = event_time.to_form(event['end_datetime'])
         return render_template('admin_edit.html', event=event)
 
-def export_database():
+def export_database(fmt='json', collection=None, compress=False):
+    # Returns an iterator of chunks, see exporter for the formats
     db = get_db_connection()
-    export_data = {
-        'events': list(db.events.find()),
-        'venues': list(db.venues.find()),
-    }
-    
-    for collection in export_data.values():
-        for doc in collection:
-            doc['_id'] = str(doc['_id'])
-    
-    # Create exports directory if it doesn't exist
-    exports_dir = os.path.join(os.path.dirname(__file__), 'exports')
-    if not os.path.exists(exports_dir):
-        os.makedirs(exports_dir)
-    
-    # Generate filename with timestamp
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = os.path.join(exports_dir, f'db_backup_{timestamp}.json')
-    
-    with open(filename, 'w') as f:
-        json.dump(export_data, f, indent=2, default=str)
-    
-    return filename
+    if fmt == 'ndjson':
+        chunks = exporter.iter_ndjson(db, collection)
+    else:
+        chunks = exporter.iter_json(db, [collection] if collection else exporter.export_collections(db))
+    if compress:
+        chunks = exporter.gzipped(chunks)
+    return chunks
 
 @app.route('/admin/export_db')
 def admin_export_db():
     if not session.get('admin'):
         abort(403)
+    fmt = request.args.get('format', 'json')
+    collection = request.args.get('collection')
+    compress = request.args.get('gzip') == '1'
+    if fmt not in ('json', 'ndjson'):
+        return "Unknown export format", 400
+    if fmt == 'ndjson' and not collection:
+        return "NDJSON exports need a collection", 400
+    if collection and collection not in exporter.export_collections(get_db_connection()):
+        return "Unknown collection", 400
+
+    name = f'naarm_list_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
+    if collection:
+        name += f'_{collection}'
+    name += '.ndjson' if fmt == 'ndjson' else '.json'
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    if compress:
+        name += '.gz'
+        mimetype = 'application/gzip'
+    return Response(
+        stream_with_context(export_database(fmt, collection, compress)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={name}"}
+    )
+
+@app.route('/admin/import', methods=['GET', 'POST'])
+def admin_import():
+    if not session.get('admin'):
+        return redirect(url_for('admin_login'))
+    if request.method == 'GET':
+        return render_template('admin_import.html')
+    upload = request.files.get('file')
+    if not upload:
+        return "No file uploaded", 400
+    fmt = request.form.get('format') or event_import.detect_format(upload.filename)
+    if fmt not in event_import.FORMATS:
+        return "Unknown import format", 400
     try:
-        filename = export_database()
-        return send_file(
-            filename,
-            mimetype='application/json',
-            as_attachment=True,
-            download_name=f'naarm_list_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
-        )
-    except Exception as e:
-        return f"Export failed: {str(e)}", 500
+        rows = event_import.read_rows(io.TextIOWrapper(upload.stream, encoding='utf-8', newline=''), fmt)
+    except (ValueError, KeyError) as e:
+        return f"Could not read {fmt} file: {e}", 400
+    db = get_db_connection()
+    result = event_import.import_events(db, rows)
+    mark_changed(db, 'events', 'Artists')
+    return jsonify(result)
+
+@app.route('/admin/pool_stats')
+def admin_pool_stats():
+    if not session.get('admin'):
+        abort(403)
+    return jsonify(mongo_pool.pool_stats())
+
+@app.route('/admin/cache_stats')
+def admin_cache_stats():
+    if not session.get('admin'):
+        abort(403)
+    return jsonify(page_cache.stats())
 
 @app.route('/admin/logout')
 def admin_logout():
@@ -485,6 +733,7 @@ def robots():
     return send_from_directory(os.path.dirname(__file__), 'robots.txt')
 
 @app.route('/artist/<artist_id>')
+@conditional(data_validators('Artists'), 'public, max-age=300')
 def artist_detail(artist_id):
     db = get_db_connection()
     artist = db.Artists.find_one({'_id': ObjectId(artist_id)})
@@ -508,11 +757,59 @@ def edit_artist(artist_id):
         else:
             update_fields['links'] = []
         db.Artists.update_one({'_id': ObjectId(artist_id)}, {'$set': update_fields})
+        # The artist may have just gained (or lost) a bio, so its link changes
+        artist_links.invalidate([name_key(artist['name'])])
+        mark_changed(db, 'Artists')
         return redirect(url_for('artist_detail', artist_id=artist_id))
     # Ensure links field exists for rendering
     if 'links' not in artist:
         artist['links'] = []
     return render_template('edit_artist.html', artist=artist)
 
+def prepare_database():
+    # One-off startup work, idempotent so it is safe to run from every process
+    db = get_db_connection()
+    # Dates first, so converted events are fingerprinted before the unique index is built
+    migrate_events(db)
+    ensure_indexes(db)
+    event_stats.ensure_built(db)
+
+def reset_process_state():
+    # Per-process caches must not be shared across a fork, the Mongo pool resets itself
+    page_cache.clear()
+    artist_links.invalidate()
+
+def create_app(prepare=True):
+    # WSGI entry point for the production server (see gunicorn.conf.py)
+    reset_process_state()
+    if prepare:
+        prepare_database()
+    return app
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Admins, or a scraper sending "Authorization: Bearer $METRICS_TOKEN"
+    token = os.getenv("METRICS_TOKEN")
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not session.get('admin') and not (token and hmac.compare_digest(supplied, token)):
+        abort(403)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/healthz')
+def healthz():
+    # Liveness: the worker is up and answering
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    # Readiness: the worker can reach Mongo through its pool
+    try:
+        get_db_connection().command('ping')
+    except PyMongoError as e:
+        return jsonify({'status': 'unavailable', 'error': str(e)}), 503
+    return jsonify({'status': 'ok', 'pool': mongo_pool.pool_stats()})
+
 if __name__ == '__main__':
+    # Development server, production runs gunicorn against create_app()
+    create_app()
     app.run(host='0.0.0.0', port=8000)
@@ -0,0 +1,103 @@
+import os
+import sys
+from datetime import timedelta
+from pymongo.errors import BulkWriteError, OperationFailure
+import event_time
+
+# Hot/cold tiering for events. Events that finished more than ARCHIVE_AFTER_DAYS ago
+# are moved out of `events` into `events_archive`, so the live collection (and its
+# indexes) only holds recent and upcoming gigs. The past listing and past search
+# only read the archive once they reach back that far, merging the two tiers in start
+# order, see app.fetch_past_page.
+
+COLLECTION = 'events_archive'
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 365))
+
+BATCH_SIZE = 500
+
+DUPLICATE_KEY = 11000
+
+
+def horizon(days=None):
+    # Never less than a day, the upcoming listing still shows events for 6 hours after they end
+    days = max(1, ARCHIVE_AFTER_DAYS if days is None else days)
+    return event_time.utcnow() - timedelta(days=days)
+
+
+def find_event(db, query, projection=None):
+    # Single event lookups (calendar links, .ics downloads) for either tier
+    return db.events.find_one(query, projection) or db[COLLECTION].find_one(query, projection)
+
+
+def collection_sizes(db, names=('events', COLLECTION)):
+    # {name: {'count': n, 'size': bytes, 'storage': bytes, 'indexes': bytes}}, the byte
+    # counts are None where collStats isn't available
+    sizes = {}
+    for name in names:
+        entry = {'count': db[name].estimated_document_count(), 'size': None, 'storage': None, 'indexes': None}
+        try:
+            stats = db.command({'collStats': name})
+            entry.update(size=stats.get('size'), storage=stats.get('storageSize'),
+                         indexes=stats.get('totalIndexSize'))
+        except (OperationFailure, NotImplementedError):
+            pass
+        sizes[name] = entry
+    return sizes
+
+
+def archive_events(db, days=None, batch_size=BATCH_SIZE, dry_run=False):
+    # Moves a batch at a time: copy into the archive, then delete from events, so a
+    # crash in between leaves a copy in both places which the next run cleans up
+    query = {'end_datetime': {'$lt': horizon(days)}}
+    if dry_run:
+        return db.events.count_documents(query)
+    moved = 0
+    while True:
+        batch = list(db.events.find(query).sort('_id', 1).limit(batch_size))
+        if not batch:
+            return moved
+        try:
+            db[COLLECTION].insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # Already copied by an interrupted run
+            if any(error['code'] != DUPLICATE_KEY for error in e.details['writeErrors']):
+                raise
+        db.events.delete_many({'_id': {'$in': [event['_id'] for event in batch]}})
+        moved += len(batch)
+
+
+def _format_size(value):
+    return 'n/a' if value is None else f"{value / 1024 / 1024:.1f}MB"
+
+
+def report(before, after):
+    lines = []
+    for name in before:
+        b, a = before[name], after[name]
+        lines.append(f"{name}: {b['count']} -> {a['count']} documents, "
+                     f"data {_format_size(b['size'])} -> {_format_size(a['size'])}, "
+                     f"indexes {_format_size(b['indexes'])} -> {_format_size(a['indexes'])}")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    # Run from cron / a scheduled task, e.g. nightly: python archive.py
+    import argparse
+    import content_version
+    import mongo_pool
+    parser = argparse.ArgumentParser(description='Move old events into the events_archive collection')
+    parser.add_argument('--days', type=int, default=None, help=f'archive events that ended this many days ago '
+                                                                f'(default ARCHIVE_AFTER_DAYS, {ARCHIVE_AFTER_DAYS})')
+    parser.add_argument('--dry-run', action='store_true', help='only count what would be moved')
+    args = parser.parse_args()
+    db = mongo_pool.get_database()
+    if args.dry_run:
+        print(f"{archive_events(db, args.days, dry_run=True)} events would be archived")
+        sys.exit()
+    before = collection_sizes(db)
+    moved = archive_events(db, args.days)
+    if moved:
+        content_version.bump(db, 'events')
+    print(f"{moved} events archived")
+    print(report(before, collection_sizes(db)))
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+import content_version
+
+# Artists are matched case-insensitively and ignoring surrounding whitespace. Rather
+# than an unindexable '^name$' regex we store the normalised form as name_key.
+
+
+def name_key(name):
+    return ' '.join(name.split()).casefold()
+
+
+def backfill_name_keys(db):
+    # Artists inserted without a name_key (old data, restores, manual inserts) get one.
+    # {'name_key': None} is answered from the name_key index so this is cheap once done.
+    missing = list(db.Artists.find({'name_key': None}, {'name': 1}))
+    if not missing:
+        return 0
+    db.Artists.bulk_write([
+        UpdateOne({'_id': doc['_id']}, {'$set': {'name_key': name_key(doc.get('name', ''))}})
+        for doc in missing
+    ], ordered=False)
+    return len(missing)
+
+
+def _artist_upserts(names):
+    # One upsert per distinct key, the first spelling submitted wins for new artists
+    spellings = {}
+    for name in names:
+        name = name.strip()
+        if name and name_key(name) not in spellings:
+            spellings[name_key(name)] = name
+    return spellings, [
+        UpdateOne({'name_key': key},
+                  {'$setOnInsert': {'name': name, 'description': '', 'tags': '', 'links': []}},
+                  upsert=True)
+        for key, name in spellings.items()
+    ]
+
+
+def upsert_artists(db, names):
+    # Make sure every named artist exists with a single round trip, returning the
+    # names of the ones that were newly created. The unique name_key index makes this
+    # safe against two submissions racing to create the same artist.
+    spellings, operations = _artist_upserts(names)
+    if not operations:
+        return []
+    backfill_name_keys(db)
+    upserted = []
+    try:
+        result = db.Artists.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        if any(error.get('code') != 11000 for error in e.details.get('writeErrors', [])):
+            raise
+        # The rest of the batch went through, the artists it created count too
+        upserted = [doc['_id'] for doc in e.details.get('upserted', [])]
+        # Lost a race with a concurrent insert of the same key, which now matches
+        result = db.Artists.bulk_write(operations, ordered=False)
+    upserted += result.upserted_ids.values()
+    created = []
+    if upserted:
+        created = [doc['name'] for doc in db.Artists.find({'_id': {'$in': upserted}}, {'name': 1})]
+    artist_links.invalidate(spellings.keys())
+    return created
+
+
+class ArtistLinkCache:
+    # name_key -> artist id (as a string) when the artist has a bio page, else None.
+    # Entries belong to one Artists content version (see content_version): a write in any
+    # worker bumps it, and the next lookup with the new version starts the cache afresh,
+    # so a page cached under that version never carries older links. Entries also
+    # expire after `ttl` seconds, and writes in this process invalidate keys directly.
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._version = None
+
+    def lookup(self, db, keys, version=None):
+        # `version` is the Artists content version the caller's page is built from
+        if version is None:
+            version = content_version.versions_of(db, ('Artists',))[0]
+        now = time.monotonic()
+        found = {}
+        missing = []
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            for key in set(keys):
+                entry = self._entries.get(key)
+                if entry and entry[1] > now:
+                    found[key] = entry[0]
+                else:
+                    missing.append(key)
+        if missing:
+            # Only fetch the artists on this page that we don't already know about
+            fetched = {key: None for key in missing}
+            for doc in db.Artists.find({'name_key': {'$in': missing}}, {'name_key': 1, 'description': 1}):
+                if (doc.get('description') or '').strip():
+                    fetched[doc['name_key']] = str(doc['_id'])
+            expires = now + self.ttl
+            with self._lock:
+                # unless another request moved the cache on to a newer version meanwhile
+                if version == self._version:
+                    for key, artist_id in fetched.items():
+                        self._entries[key] = (artist_id, expires)
+            found.update(fetched)
+        return found
+
+    def invalidate(self, keys=None):
+        with self._lock:
+            if keys is None:
+                self._entries.clear()
+                self._version = None
+            else:
+                for key in keys:
+                    self._entries.pop(key, None)
+
+
+artist_links = ArtistLinkCache(ttl=int(os.getenv("ARTIST_CACHE_TTL", 300)))
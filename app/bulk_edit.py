@@ -0,0 +1,141 @@
+import re
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+import event_time
+import event_stats
+import search
+from artist_store import name_key, artist_links
+from event_import import fingerprint
+
+# Bulk admin actions. Each one reads the affected events once and writes them back
+# with a single delete_many / bulk_write per collection, keeping the derived fields
+# (search tokens, fingerprint, updated_at) and event_stats in step.
+
+# Both tiers, an old tag or artist spelling shouldn't survive in the archive
+TIERS = ('events', 'events_archive')
+
+# What the derived fields are computed from
+FIELDS = dict(event_stats.PROJECTION, title=1)
+
+
+def _exactly(value):
+    return re.compile(f"^\\s*{re.escape(value.strip())}\\s*$", re.IGNORECASE)
+
+
+def _apply(db, collection, query, change):
+    # `change(event)` returns the fields to $set, or None to leave the event alone
+    operations, before, after = [], [], []
+    now = event_time.utcnow()
+    for event in db[collection].find(query, FIELDS):
+        fields = change(event)
+        if fields is None:
+            continue
+        updated = {**event, **fields}
+        fields['search_tokens'] = search.event_search_tokens(updated)
+        fields['updated_at'] = now
+        operations.append(UpdateOne({'_id': event['_id']}, {'$set': fields}))
+        if not event.get('start_datetime') or isinstance(event['start_datetime'], str):
+            # Not migrated yet, still gets the change but has no fingerprint or day to
+            # count under (event_stats.rebuild skips these too)
+            before.append(None)
+            after.append(None)
+            continue
+        fields['fingerprint'] = fingerprint(updated)
+        before.append(event)
+        after.append(updated)
+    if not operations:
+        return 0
+    try:
+        db[collection].bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # e.g. a venue rename making two events the same gig, the unique fingerprint
+        # index keeps the second one as it was
+        failed = {error['index'] for error in e.details['writeErrors']}
+        before = [event for i, event in enumerate(before) if i not in failed]
+        after = [event for i, event in enumerate(after) if i not in failed]
+    event_stats.record(db, added=after, removed=before)
+    return len(after)
+
+
+def _dedupe(names):
+    seen = set()
+    result = []
+    for name in names:
+        if name and name_key(name) not in seen:
+            seen.add(name_key(name))
+            result.append(name)
+    return result
+
+
+def delete_events(db, ids):
+    if not ids:
+        return 0
+    query = {'_id': {'$in': list(ids)}}
+    removed = list(db.events.find(query, event_stats.PROJECTION))
+    db.events.delete_many(query)
+    event_stats.record(db, removed=removed)
+    return len(removed)
+
+
+def rewrite_tag(db, old, new, ids=None):
+    # Renames (or with an empty `new`, removes) a tag, on the given events or everywhere
+    old_key, new = name_key(old), new.strip()
+    if not old_key:
+        raise ValueError("Which tag should be rewritten?")
+    query = {'tags': _exactly(old)}
+    if ids:
+        query['_id'] = {'$in': list(ids)}
+
+    def change(event):
+        tags = [new if name_key(tag) == old_key else tag for tag in event.get('tags', [])]
+        return {'tags': _dedupe(tags)}
+    return sum(_apply(db, collection, query, change) for collection in (['events'] if ids else TIERS))
+
+
+def rewrite_venue(db, old, new, ids=None):
+    # Sets the venue of the selected events, or renames `old` everywhere
+    new = new.strip()
+    if not new:
+        raise ValueError("New venue name is missing")
+    if ids:
+        query = {'_id': {'$in': list(ids)}}
+    elif old.strip():
+        query = {'venue': _exactly(old)}
+    else:
+        raise ValueError("Select events or give the venue to rename")
+
+    def change(event):
+        return None if event.get('venue') == new else {'venue': new}
+    return sum(_apply(db, collection, query, change) for collection in (['events'] if ids else TIERS))
+
+
+def merge_artists(db, keep, duplicates):
+    # Folds the duplicate artist entries into `keep` and renames them in every event.
+    # Returns (artists removed, events changed)
+    target = db.Artists.find_one({'name_key': name_key(keep)})
+    if target is None:
+        raise ValueError(f"No artist called {keep}")
+    keys = {name_key(name) for name in duplicates} - {target['name_key'], ''}
+    if not keys:
+        raise ValueError("No duplicate artists given")
+    merged = list(db.Artists.find({'name_key': {'$in': list(keys)}}))
+
+    # Keep the target's bio, fill gaps from the duplicates
+    update = {'links': list(dict.fromkeys(target.get('links', []) +
+                                          [link for a in merged for link in a.get('links', [])]))}
+    for field in ('description', 'tags'):
+        if not target.get(field):
+            update[field] = next((a[field] for a in merged if a.get(field)), '')
+    db.Artists.update_one({'_id': target['_id']}, {'$set': update})
+    if merged:
+        db.Artists.delete_many({'_id': {'$in': [a['_id'] for a in merged]}})
+
+    spellings = list(duplicates) + [a['name'] for a in merged]
+    query = {'artists': {'$in': [_exactly(name) for name in spellings]}}
+
+    def change(event):
+        artists = [target['name'] if name_key(a) in keys else a for a in event.get('artists', [])]
+        return {'artists': _dedupe(artists)}
+    changed = sum(_apply(db, collection, query, change) for collection in TIERS)
+    artist_links.invalidate(keys | {target['name_key']})
+    return len(merged), changed
@@ -0,0 +1,34 @@
+import pytest
+import mongomock
+from mongomock.collection import BulkOperationBuilder
+
+# mongomock predates pymongo 4.11, which passes a `sort` argument to bulk update
+# operations (UpdateOne/ReplaceOne inside bulk_write). Accept and ignore it.
+def _ignoring_sort(add):
+    def wrapper(self, *args, sort=None, **kwargs):
+        return add(self, *args, **kwargs)
+    return wrapper
+
+
+BulkOperationBuilder.add_update = _ignoring_sort(BulkOperationBuilder.add_update)
+BulkOperationBuilder.add_replace = _ignoring_sort(BulkOperationBuilder.add_replace)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Use mongomock for MongoDB via app.db_override
+    mock_client = mongomock.MongoClient()
+    db = mock_client['testdb']
+    monkeypatch.setenv('DB_URL', 'mongodb://localhost')
+    monkeypatch.setenv('DB_NAME', 'testdb')
+    from app import app as real_app
+    from app import page_cache
+    from artist_store import artist_links
+    # Each test gets a fresh database, so nothing cached from the last one applies
+    artist_links.invalidate()
+    page_cache.clear()
+    real_app.db_override = db
+    real_app.config['TESTING'] = True
+    with real_app.test_client() as client:
+        yield client
+    real_app.db_override = None
@@ -0,0 +1,27 @@
+# Per-collection change counters kept in Mongo, so every worker process agrees on
+# when the data behind a page last changed. Writes bump the counters of the
+# collections they touch, readers fold the counters into their cache keys.
+
+META_ID = 'content_version'
+
+
+def bump(db, *collections):
+    db.site_meta.update_one(
+        {'_id': META_ID},
+        {
+            '$inc': {f'versions.{c}': 1 for c in collections},
+            '$currentDate': {f'modified.{c}': True for c in collections},
+        },
+        upsert=True
+    )
+
+
+def current(db):
+    # {'versions': {collection: n}, 'modified': {collection: datetime}}
+    doc = db.site_meta.find_one({'_id': META_ID}) or {}
+    return {'versions': doc.get('versions', {}), 'modified': doc.get('modified', {})}
+
+
+def versions_of(db, collections):
+    versions = current(db)['versions']
+    return tuple(versions.get(c, 0) for c in collections)
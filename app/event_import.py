@@ -0,0 +1,228 @@
+import csv
+import hashlib
+import logging
+import os
+import sys
+import pytz
+from bson import json_util
+from bson.json_util import JSONOptions
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+import event_time
+import search
+import event_stats
+from artist_store import name_key, upsert_artists
+
+# Validation shared by the /createEvent form and bulk imports, plus the bulk import
+# itself: rows are validated with the same rules, deduplicated by fingerprint
+# (title + venue + start) against each other and the database, inserted with
+# unordered insert_many batches, and their artists upserted in one bulk write.
+
+BATCH_SIZE = 500
+
+FORMATS = ('json', 'ndjson', 'csv')
+
+# Our own exports write dates as {"$date": ...}, decoded as aware UTC so to_utc
+# doesn't take them for Melbourne time
+_JSON_OPTIONS = JSONOptions(tz_aware=True, tzinfo=pytz.utc)
+
+DUPLICATE_KEY = 11000
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidEvent(ValueError):
+    pass
+
+
+def _split(value):
+    # Forms and CSV send comma separated strings, JSON may send lists
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [v.strip() for v in (value or '').split(',') if v.strip()]
+
+
+def parse_event(row):
+    # Returns the event document for a submitted form/row or raises InvalidEvent
+    if not isinstance(row, dict):
+        raise InvalidEvent("Row is not an object")
+    if not row.get('title') or not row.get('start_datetime') or not row.get('end_datetime'):
+        raise InvalidEvent("Missing required fields")
+    # check end datetime is after start datetime
+    # the form sends Melbourne local time, it is stored as UTC
+    try:
+        start_datetime = event_time.to_utc(row['start_datetime'])
+        end_datetime = event_time.to_utc(row['end_datetime'])
+    except (ValueError, TypeError, AttributeError):
+        raise InvalidEvent("Invalid datetime format")
+    if end_datetime <= start_datetime:
+        raise InvalidEvent("End datetime must be after start datetime")
+    for field in ('title', 'organisers', 'venue', 'link'):
+        if not isinstance(row.get(field) or '', str):
+            raise InvalidEvent(f"Invalid {field}")
+    return {
+        'start_datetime': start_datetime,
+        'end_datetime': end_datetime,
+        'title': row['title'],
+        'organisers': row.get('organisers') or '',
+        'venue': row.get('venue') or '',
+        'link': row.get('link') or '',
+        'tags': _split(row.get('tags')),
+        'artists': _split(row.get('artists'))
+    }
+
+
+def fingerprint(event):
+    key = '|'.join([name_key(event.get('title', '')), name_key(event.get('venue', '')),
+                    event['start_datetime'].isoformat()])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def with_derived_fields(event):
+    # Everything stored alongside the submitted fields of a new event
+    event['search_tokens'] = search.event_search_tokens(event)
+    event['fingerprint'] = fingerprint(event)
+    # Stamps let the weekly digest pick out only new or changed events
+    event['created_at'] = event['updated_at'] = event_time.utcnow()
+    return event
+
+
+def backfill_fingerprints(db):
+    # Events from before fingerprints existed. The unique index only covers events that
+    # have one, so this is a scan, but only of the fingerprint field. Legacy copies of a
+    # gig that already has its fingerprint are left without one (and logged) so they
+    # can't block the unique index or fail the write
+    missing = [e for e in db.events.find({'fingerprint': None}, {'title': 1, 'venue': 1, 'start_datetime': 1})
+               if e.get('start_datetime') and not isinstance(e['start_datetime'], str)]
+    if not missing:
+        return 0
+    fingerprints = {e['_id']: fingerprint(e) for e in missing}
+    taken = {e['fingerprint'] for e in db.events.find({'fingerprint': {'$in': list(fingerprints.values())}},
+                                                       {'fingerprint': 1})}
+    operations, ids, skipped = [], [], []
+    for event in missing:
+        if fingerprints[event['_id']] in taken:
+            skipped.append(event['_id'])
+            continue
+        taken.add(fingerprints[event['_id']])
+        ids.append(event['_id'])
+        operations.append(UpdateOne({'_id': event['_id']}, {'$set': {'fingerprint': fingerprints[event['_id']]}}))
+    written = len(operations)
+    if operations:
+        try:
+            db.events.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # Another process fingerprinted the same gig in the meantime
+            errors = e.details['writeErrors']
+            if any(error.get('code') != DUPLICATE_KEY for error in errors):
+                raise
+            skipped += [ids[error['index']] for error in errors]
+            written -= len(errors)
+    if skipped:
+        logger.warning("%d events duplicate another event's title, venue and start and were left "
+                       "without a fingerprint: %s", len(skipped), ', '.join(map(str, skipped)))
+    return written
+
+
+def read_rows(stream, fmt):
+    # `stream` is a text stream, returns a list of dicts
+    if fmt == 'csv':
+        return list(csv.DictReader(stream))
+    if fmt == 'ndjson':
+        return [json_util.loads(line, json_options=_JSON_OPTIONS) for line in stream if line.strip()]
+    data = json_util.loads(stream.read(), json_options=_JSON_OPTIONS)
+    # Either a bare list or the {"events": [...]} layout of the exports
+    rows = data['events'] if isinstance(data, dict) else data
+    if not isinstance(rows, list):
+        raise ValueError("expected a list of events")
+    return rows
+
+
+def detect_format(filename):
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    return {'jsonl': 'ndjson'}.get(extension, extension) if extension in FORMATS + ('jsonl',) else None
+
+
+def import_events(db, rows, batch_size=BATCH_SIZE):
+    # Returns {'inserted': n, 'duplicates': n, 'invalid': n, 'created_artists': [...], 'rows': [...]}
+    report = []
+    pending = []
+    seen = set()
+    for number, row in enumerate(rows, start=1):
+        try:
+            event = with_derived_fields(parse_event(row))
+        except InvalidEvent as e:
+            report.append({'row': number, 'status': 'invalid', 'error': str(e)})
+            continue
+        if event['fingerprint'] in seen:
+            report.append({'row': number, 'status': 'duplicate', 'title': event['title']})
+            continue
+        seen.add(event['fingerprint'])
+        pending.append((number, event))
+
+    backfill_fingerprints(db)
+    artists = []
+    inserted = []
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        # archived events count too, re-importing an old listing mustn't bring its gigs back
+        fingerprints = {'fingerprint': {'$in': [event['fingerprint'] for _, event in batch]}}
+        existing = {e['fingerprint'] for collection in (db.events, db.events_archive)
+                    for e in collection.find(fingerprints, {'fingerprint': 1})}
+        to_insert = []
+        for number, event in batch:
+            if event['fingerprint'] in existing:
+                report.append({'row': number, 'status': 'duplicate', 'title': event['title']})
+            else:
+                to_insert.append((number, event))
+        if not to_insert:
+            continue
+        failed = {}
+        try:
+            db.events.insert_many([event for _, event in to_insert], ordered=False)
+        except BulkWriteError as e:
+            failed = {error['index']: error for error in e.details['writeErrors']}
+        for index, (number, event) in enumerate(to_insert):
+            if index in failed and failed[index].get('code') == DUPLICATE_KEY:
+                # The unique fingerprint index caught an insert racing this one
+                report.append({'row': number, 'status': 'duplicate', 'title': event['title']})
+            elif index in failed:
+                report.append({'row': number, 'status': 'invalid',
+                               'error': failed[index].get('errmsg', 'insert failed')})
+            else:
+                report.append({'row': number, 'status': 'inserted', 'id': str(event['_id']),
+                               'title': event['title']})
+                artists.extend(event['artists'])
+                inserted.append(event)
+
+    event_stats.record(db, added=inserted)
+    report.sort(key=lambda r: r['row'])
+    return {
+        'inserted': sum(r['status'] == 'inserted' for r in report),
+        'duplicates': sum(r['status'] == 'duplicate' for r in report),
+        'invalid': sum(r['status'] == 'invalid' for r in report),
+        'created_artists': upsert_artists(db, artists),
+        'rows': report,
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    import content_version
+    import mongo_pool
+    parser = argparse.ArgumentParser(description='Bulk import events from JSON, NDJSON or CSV')
+    parser.add_argument('file')
+    parser.add_argument('--format', choices=FORMATS)
+    args = parser.parse_args()
+    fmt = args.format or detect_format(args.file)
+    if not fmt:
+        sys.exit("Can't tell the format from the file name, pass --format")
+    db = mongo_pool.get_database()
+    with open(args.file, newline='') as f:
+        result = import_events(db, read_rows(f, fmt))
+    content_version.bump(db, 'events', 'Artists')
+    for row in result['rows']:
+        if row['status'] != 'inserted':
+            print(f"row {row['row']}: {row['status']} {row.get('error', row.get('title', ''))}")
+    print(f"{result['inserted']} inserted, {result['duplicates']} duplicates, {result['invalid']} invalid, "
+          f"{len(result['created_artists'])} new artists")
@@ -0,0 +1,140 @@
+import itertools
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+import event_time
+from artist_store import name_key
+
+# Materialised per organiser/venue/tag/artist event counts, so the organisers, venues
+# and tags pages and the listing facets never scan `events`. Counts are kept per
+# Melbourne calendar day of the event start ({'days': {'2025-03-01': 2, ...}}), which
+# keeps them correct as the clock moves: anything from today on is upcoming, the rest
+# is past. Writes to events call record() with the before/after documents.
+
+COLLECTION = 'event_stats'
+
+# kind -> event field, list fields count once per distinct value
+KINDS = {'organiser': 'organisers', 'venue': 'venue', 'tag': 'tags', 'artist': 'artists'}
+
+# Every event also counts towards this, the per day totals behind the date facet
+ALL = ('all', '')
+
+PROJECTION = {field: 1 for field in KINDS.values()}
+PROJECTION['start_datetime'] = 1
+
+
+def _day(event):
+    return event_time.local(event['start_datetime']).strftime('%Y-%m-%d')
+
+
+def _entries(event):
+    # (kind, key, display name) for everything the event counts towards
+    seen = {ALL}
+    yield ALL + ('',)
+    for kind, field in KINDS.items():
+        values = event.get(field) or []
+        if isinstance(values, str):
+            values = [values]
+        for value in values:
+            key = name_key(value)
+            if key and (kind, key) not in seen:
+                seen.add((kind, key))
+                yield kind, key, value.strip()
+
+
+def _operations(event, delta):
+    day = _day(event)
+    for kind, key, name in _entries(event):
+        update = {'$inc': {f'days.{day}': delta}}
+        if delta > 0:
+            # the latest spelling is the one shown
+            update['$set'] = {'kind': kind, 'key': key, 'name': name}
+        yield UpdateOne({'_id': f'{kind}:{key}'}, update, upsert=delta > 0)
+
+
+def _counted(event):
+    return bool(event) and isinstance(event.get('start_datetime'), datetime)
+
+
+def record(db, added=(), removed=()):
+    # Call with the stored event documents a write added and/or removed. Events still
+    # holding string dates (migrate_datetimes couldn't parse them) were never counted,
+    # like in rebuild()
+    operations = [op for event in removed if _counted(event) for op in _operations(event, -1)]
+    operations += [op for event in added if _counted(event) for op in _operations(event, 1)]
+    if operations:
+        db[COLLECTION].bulk_write(operations, ordered=False)
+
+
+def rebuild(db, batch_size=1000):
+    # Recount from scratch, for the first deploy or if the counts ever drift
+    docs = {}
+    events = itertools.chain(db.events.find({}, PROJECTION).batch_size(batch_size),
+                             db.events_archive.find({}, PROJECTION).batch_size(batch_size))
+    for event in events:
+        if not _counted(event):
+            continue
+        day = _day(event)
+        for kind, key, name in _entries(event):
+            doc = docs.setdefault(f'{kind}:{key}', {'kind': kind, 'key': key, 'name': name,
+                                                   'days': defaultdict(int)})
+            doc['days'][day] += 1
+    db[COLLECTION].delete_many({})
+    if docs:
+        db[COLLECTION].insert_many([{'_id': _id, **doc, 'days': dict(doc['days'])}
+                                    for _id, doc in docs.items()])
+    return len(docs)
+
+
+def ensure_built(db):
+    if db[COLLECTION].find_one({}, {'_id': 1}) is None and db.events.find_one({}, {'_id': 1}):
+        rebuild(db)
+
+
+def _today():
+    return event_time.local(event_time.utcnow()).strftime('%Y-%m-%d')
+
+
+def _summarise(doc, today):
+    days = {day: n for day, n in doc.get('days', {}).items() if n > 0}
+    return {
+        'name': doc.get('name', ''),
+        'key': doc.get('key', ''),
+        'upcoming': sum(n for day, n in days.items() if day >= today),
+        'past': sum(n for day, n in days.items() if day < today),
+        'last': max(days) if days else None,
+    }
+
+
+def summary(db, kind):
+    # [{'name', 'key', 'upcoming', 'past', 'last'}] sorted by name, empty entries left out
+    today = _today()
+    rows = [_summarise(doc, today) for doc in db[COLLECTION].find({'kind': kind})]
+    return sorted((r for r in rows if r['upcoming'] or r['past']), key=lambda r: r['name'].casefold())
+
+
+def counts_by_key(db, kind):
+    return {row['key']: row for row in summary(db, kind)}
+
+
+def facets(db, kind, limit=15):
+    # Most common values among upcoming events
+    rows = [r for r in summary(db, kind) if r['upcoming']]
+    return sorted(rows, key=lambda r: (-r['upcoming'], r['name'].casefold()))[:limit]
+
+
+def day_facets(db, days=14):
+    # [(YYYY-MM-DD, count)] for the next `days` days that have events
+    doc = db[COLLECTION].find_one({'_id': f'{ALL[0]}:{ALL[1]}'}) or {}
+    counts = doc.get('days', {})
+    start = event_time.local(event_time.utcnow()).date()
+    window = [(start + timedelta(days=i)).isoformat() for i in range(days)]
+    return [(day, counts[day]) for day in window if counts.get(day, 0) > 0]
+
+
+if __name__ == '__main__':
+    import mongo_pool
+    if '--rebuild' not in sys.argv:
+        sys.exit('usage: python event_stats.py --rebuild')
+    print(f"{rebuild(mongo_pool.get_database())} stats entries rebuilt")
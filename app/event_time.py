@@ -0,0 +1,34 @@
+from datetime import datetime
+import pytz
+
+# Event start/end times are stored as BSON dates in UTC. pymongo hands them back as
+# naive datetimes (implicitly UTC), so naive-UTC is what the app queries and compares
+# with, and times are only converted to Melbourne for display and the edit forms.
+
+MELBOURNE = pytz.timezone("Australia/Melbourne")
+
+# What <input type="datetime-local"> submits, and what older events stored as strings
+FORM_FORMAT = '%Y-%m-%dT%H:%M'
+
+
+def utcnow():
+    return datetime.utcnow()
+
+
+def to_utc(value):
+    # Accepts a datetime or an ISO string, naive values are Melbourne local time
+    # (which is how the event forms and the old string storage meant them)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = MELBOURNE.localize(value)
+    return value.astimezone(pytz.utc).replace(tzinfo=None)
+
+
+def local(value):
+    # Stored (naive UTC) -> aware Melbourne time for rendering
+    return pytz.utc.localize(value).astimezone(MELBOURNE)
+
+
+def to_form(value):
+    return local(value).strftime(FORM_FORMAT)
@@ -0,0 +1,68 @@
+import json
+import zlib
+from datetime import datetime
+
+# Streams the database out as JSON without holding it in memory. The default
+# format is the same {"<collection>": [docs...]} layout seed_db.sh imports, written
+# a batch of documents at a time straight from the cursors.
+
+BATCH_SIZE = 500
+
+# Derived data that is rebuilt by the app, not worth backing up
+SKIP_COLLECTIONS = {'site_meta', 'event_stats'}
+
+
+def export_collections(db):
+    return sorted(name for name in db.list_collection_names()
+                  if name not in SKIP_COLLECTIONS and not name.startswith('system.'))
+
+
+def _default(value):
+    # Dates are written as Extended JSON so mongoimport restores them as BSON dates
+    if isinstance(value, datetime):
+        return {'$date': value.strftime('%Y-%m-%dT%H:%M:%S.') + f'{value.microsecond // 1000:03d}Z'}
+    return str(value)
+
+
+def _encode(doc):
+    doc['_id'] = str(doc['_id'])
+    return json.dumps(doc, default=_default)
+
+
+def _batches(db, collection, batch_size):
+    batch = []
+    for doc in db[collection].find().batch_size(batch_size):
+        batch.append(_encode(doc))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_json(db, collections, batch_size=BATCH_SIZE):
+    yield '{'
+    for i, collection in enumerate(collections):
+        yield f'{"," if i else ""}\n{json.dumps(collection)}: ['
+        first = True
+        for batch in _batches(db, collection, batch_size):
+            yield ('\n' if first else ',\n') + ',\n'.join(batch)
+            first = False
+        yield '\n]'
+    yield '\n}\n'
+
+
+def iter_ndjson(db, collection, batch_size=BATCH_SIZE):
+    # One document per line, for a single collection (what mongoimport takes without --jsonArray)
+    for batch in _batches(db, collection, batch_size):
+        yield '\n'.join(batch) + '\n'
+
+
+def gzipped(chunks, level=6):
+    # wbits=31 writes a gzip header, so the download is a normal .gz file
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
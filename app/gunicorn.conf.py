@@ -0,0 +1,78 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+
+# Production server settings, run with:
+#   gunicorn -c gunicorn.conf.py "app:create_app(prepare=False)"
+# Send SIGHUP to the master for a graceful reload (new workers start, old ones
+# finish their in-flight requests), SIGTERM for a graceful shutdown.
+
+bind = os.getenv("WEB_BIND", "0.0.0.0:8000")
+
+# Pre-forked worker processes, each with a pool of threads sharing one Mongo pool
+workers = int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", 4))
+
+# Recycle workers after a number of requests (jittered so they don't all restart
+# together) to cap any slow memory growth
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", 100))
+
+timeout = int(os.getenv("WEB_TIMEOUT", 30))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.getenv("WEB_KEEPALIVE", 5))
+
+# Load the app once in the master and fork it, or import it in every worker.
+# With preloading, SIGHUP can't pick up code changes, restart the container instead
+preload_app = os.getenv("WEB_PRELOAD", "0") == "1"
+# Restart workers when code changes, for development only
+reload = os.getenv("WEB_RELOAD", "0") == "1"
+
+accesslog = "-"
+errorlog = "-"
+
+# Workers write their metrics here so /metrics can add them all up, see metrics.py.
+# Inherited by the workers through the environment
+metrics_dir = os.environ.setdefault("METRICS_DIR", "/tmp/naarm-metrics")
+
+
+def on_starting(server):
+    # Counters start from zero with the server, like a single process's would
+    os.makedirs(metrics_dir, exist_ok=True)
+    for name in os.listdir(metrics_dir):
+        if name.endswith('.json'):
+            os.remove(os.path.join(metrics_dir, name))
+    # Index creation and data migrations run once before any worker forks. They run in
+    # a child process: importing the app here would leave it loaded in the master, and
+    # workers forked after a SIGHUP / reload would keep serving the old code
+    result = subprocess.run([sys.executable, '-c', 'import app; app.prepare_database()'],
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        # Still start serving, /readyz reports the database as unavailable
+        server.log.error(f"Database preparation failed (exit code {result.returncode})")
+
+
+def post_fork(server, worker):
+    # With preload_app the workers inherit the master's module state; start them clean
+    if preload_app:
+        from app import reset_process_state
+        reset_process_state()
+
+
+def post_worker_init(worker):
+    import metrics
+    metrics.start_flushing()
+
+
+def worker_exit(server, worker):
+    # Runs in the exiting worker, keeps its counters in the totals
+    import metrics
+    metrics.retire()
+
+
+def child_exit(server, worker):
+    # Runs in the master. A worker killed before worker_exit ran leaves its metrics file
+    import metrics
+    metrics.reap(worker.pid)
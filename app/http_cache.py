@@ -0,0 +1,48 @@
+import functools
+import hashlib
+from datetime import timezone
+from flask import request, make_response, Response
+
+# Validators (ETag / Last-Modified) for pages whose content is fully determined by
+# the content versions in content_version. The version check costs one small read,
+# so a client revalidating an unchanged page gets a 304 without the view running.
+
+
+def _utc(dt):
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    # HTTP dates only have second precision
+    return dt.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def conditional(state, cache_control):
+    # `state(*view_args)` returns (anything identifying the content, last modified
+    # datetime or None), `cache_control` is sent on every 200 and 304
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+            identity, last_modified = state(*args, **kwargs)
+            etag = hashlib.sha1(repr((request.endpoint, request.full_path, identity)).encode()).hexdigest()
+            last_modified = _utc(last_modified) if last_modified else None
+
+            # If-None-Match wins over If-Modified-Since when both are sent
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = bool(last_modified and request.if_modified_since
+                                    and last_modified <= request.if_modified_since)
+            if not_modified:
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,115 @@
+import re
+from datetime import datetime, timedelta
+import event_time
+
+# iCalendar output for the single event download and the filterable /calendar.ics
+# feed. The feed is written one VEVENT at a time straight off the Mongo cursor so a
+# big date window never has to sit in memory.
+
+# Only what a VEVENT needs
+FEED_PROJECTION = {'title': 1, 'start_datetime': 1, 'end_datetime': 1, 'venue': 1, 'link': 1,
+                   'organisers': 1}
+
+# Query string parameter -> event field, repeat a parameter to match any of the values
+FILTER_FIELDS = {'tag': 'tags', 'venue': 'venue', 'artist': 'artists', 'organiser': 'organisers'}
+
+
+class InvalidFilter(ValueError):
+    pass
+
+
+def _stamp(value):
+    return value.strftime("%Y%m%dT%H%M%SZ")
+
+
+def _text(value):
+    # RFC 5545 TEXT escaping
+    return (str(value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _fold(line):
+    # Content lines are at most 75 octets, continuations start with a space
+    data = line.encode()
+    if len(data) <= 75:
+        return line + '\r\n'
+    parts = []
+    while data:
+        size = 75 if not parts else 74
+        # don't split a multi-byte character
+        while size < len(data) and (data[size] & 0xC0) == 0x80:
+            size -= 1
+        parts.append(data[:size].decode())
+        data = data[size:]
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def vevent(event, dtstamp):
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:{event['_id']}@naarm-list",
+        f'DTSTAMP:{dtstamp}',
+        # Stored times are already UTC, as the Z suffix says
+        f"DTSTART:{_stamp(event['start_datetime'])}",
+        f"DTEND:{_stamp(event['end_datetime'])}",
+        f"SUMMARY:{_text(event.get('title'))}",
+        f"DESCRIPTION:{_text(event.get('link'))}",
+        f"LOCATION:{_text(event.get('venue'))}",
+        'END:VEVENT',
+    ]
+    return ''.join(_fold(line) for line in lines)
+
+
+def iter_calendar(events, name=None):
+    # Yields the calendar in chunks, `events` can be a live cursor
+    dtstamp = _stamp(event_time.utcnow())
+    header = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:NaarmList', 'CALSCALE:GREGORIAN']
+    if name:
+        header += [f'X-WR-CALNAME:{_text(name)}', 'X-WR-TIMEZONE:Australia/Melbourne']
+    yield ''.join(_fold(line) for line in header)
+    for event in events:
+        yield vevent(event, dtstamp)
+    yield 'END:VCALENDAR\r\n'
+
+
+def _day(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise InvalidFilter(f"{name} must be a YYYY-MM-DD date")
+
+
+def filter_clauses(args):
+    # `args` is a MultiDict of the query string, dates are Melbourne calendar days.
+    # Also used for the listing page filters
+    clauses = []
+    if args.get('from'):
+        clauses.append({'end_datetime': {'$gte': event_time.to_utc(_day(args['from'], 'from'))}})
+    if args.get('to'):
+        # `to` is inclusive, so everything starting before the next midnight
+        day_after = _day(args['to'], 'to') + timedelta(days=1)
+        clauses.append({'start_datetime': {'$lt': event_time.to_utc(day_after)}})
+    for param, field in FILTER_FIELDS.items():
+        values = [v.strip() for v in args.getlist(param) if v.strip()]
+        if not values:
+            continue
+        if field == 'organisers':
+            # organisers is free text, often several names, so match within it
+            patterns = [re.compile(re.escape(v), re.IGNORECASE) for v in values]
+        else:
+            patterns = [re.compile(f'^{re.escape(v)}$', re.IGNORECASE) for v in values]
+        clauses.append({field: {'$in': patterns}})
+    return clauses
+
+
+def feed_query(args, default_start):
+    # Without `from` the feed starts at `default_start` (the upcoming listing cutoff)
+    clauses = filter_clauses(args)
+    if not args.get('from'):
+        clauses.insert(0, {'end_datetime': {'$gte': default_start}})
+    return {'$and': clauses}
+
+
+def feed_name(args):
+    parts = [v for param in FILTER_FIELDS for v in args.getlist(param) if v.strip()]
+    return 'Naarm List' + (f" ({', '.join(parts)})" if parts else '')
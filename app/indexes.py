@@ -0,0 +1,164 @@
+import logging
+import sys
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+from artist_store import backfill_name_keys
+from search import backfill_search_tokens
+from event_import import backfill_fingerprints
+
+logger = logging.getLogger(__name__)
+
+# Every index the app and the mail job rely on. ensure_indexes() is idempotent, it
+# runs at app startup and after restoring a backup.
+INDEXES = {
+    'events': [
+        # cutoff filter on end_datetime for the upcoming/past split
+        ([('end_datetime', ASCENDING), ('start_datetime', ASCENDING)], {'name': 'end_start'}),
+        # listing sort + keyset paging, and the start_datetime filter in mailsend
+        ([('start_datetime', ASCENDING), ('_id', ASCENDING), ('end_datetime', ASCENDING)], {'name': 'start_id_end'}),
+        # organiser filters on the calendar feed and API
+        ([('organisers', ASCENDING)], {'name': 'organisers'}),
+        # new/changed events for the weekly digest
+        ([('updated_at', ASCENDING)], {'name': 'updated_at'}),
+        # duplicate detection for bulk imports, unique so concurrent imports can't both
+        # insert a gig. Legacy string-dated events have no fingerprint, hence the filter
+        ([('fingerprint', ASCENDING)], {'name': 'fingerprint', 'unique': True,
+                                        'partialFilterExpression': {'fingerprint': {'$type': 'string'}}}),
+        # prefix matches from the search box
+        ([('search_tokens', ASCENDING)], {'name': 'search_tokens'}),
+    ],
+    # cold tier, read by the past listing and past search once they run out of live events
+    'events_archive': [
+        ([('end_datetime', ASCENDING), ('start_datetime', ASCENDING)], {'name': 'end_start'}),
+        ([('start_datetime', ASCENDING), ('_id', ASCENDING), ('end_datetime', ASCENDING)], {'name': 'start_id_end'}),
+        ([('fingerprint', ASCENDING)], {'name': 'fingerprint'}),
+        ([('search_tokens', ASCENDING)], {'name': 'search_tokens'}),
+    ],
+    'Artists': [
+        # unique, so concurrent upserts of the same artist can't create duplicates
+        ([('name_key', ASCENDING)], {'name': 'name_key', 'unique': True}),
+    ],
+    'venues': [
+        ([('name', ASCENDING)], {'name': 'name'}),
+    ],
+    # organisers/venues/tags pages and listing facets
+    'event_stats': [
+        ([('kind', ASCENDING)], {'name': 'kind'}),
+    ],
+    'subscribers': [
+        ([('email', ASCENDING)], {'name': 'email'}),
+    ],
+}
+
+
+# Server error codes for an existing index with the same name but other options
+INDEX_CONFLICT_CODES = (85, 86)
+DUPLICATE_KEY = 11000
+
+
+def _create_index(db, collection, keys, options):
+    try:
+        return db[collection].create_index(keys, **options)
+    except OperationFailure as e:
+        if e.code not in INDEX_CONFLICT_CODES:
+            raise
+    # These indexes belong to the app, so an older definition is replaced
+    db[collection].drop_index(options['name'])
+    return db[collection].create_index(keys, **options)
+
+
+def create_indexes(db, collection, target=None):
+    # The indexes INDEXES lists for `collection`, built on `target` (e.g. a staging
+    # copy that is renamed into place later) when given
+    target = target or collection
+    created = []
+    for keys, options in INDEXES.get(collection, []):
+        try:
+            created.append(f"{target}.{_create_index(db, target, keys, options)}")
+        except OperationFailure as e:
+            if e.code == DUPLICATE_KEY and options.get('unique'):
+                # Existing duplicates (e.g. "Sun Araw" and "sun araw") block the unique
+                # index, fall back to a plain one until they are merged
+                logger.warning("Duplicate keys in %s.%s, creating it non-unique: %s", target, options['name'], e)
+                fallback = {k: v for k, v in options.items() if k != 'unique'}
+                created.append(f"{target}.{_create_index(db, target, keys, fallback)}")
+            else:
+                logger.warning("Could not create index %s.%s: %s", target, options['name'], e)
+    return created
+
+
+def ensure_indexes(db):
+    # name_key and fingerprint have to be filled in before they can be uniquely indexed
+    # (run migrate_datetimes first, string-dated events get no fingerprint)
+    backfill_name_keys(db)
+    backfill_search_tokens(db)
+    backfill_fingerprints(db)
+    created = []
+    for collection in INDEXES:
+        created += create_indexes(db, collection)
+    return created
+
+
+def _plan_stages(plan, found=None):
+    # Walk an explain plan tree collecting (stage, index name) pairs
+    found = [] if found is None else found
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            found.append((plan['stage'], plan.get('indexName')))
+        for key in ('inputStage', 'queryPlan'):
+            if key in plan:
+                _plan_stages(plan[key], found)
+        for child in plan.get('inputStages', []):
+            _plan_stages(child, found)
+    return found
+
+
+def _winning_plan(explain):
+    planner = explain.get('queryPlanner', explain)
+    return planner.get('winningPlan', {})
+
+
+def representative_queries(db):
+    now = datetime.utcnow()
+    cutoff = now - timedelta(hours=6)
+    listing_sort = [('start_datetime', ASCENDING), ('_id', ASCENDING)]
+    return {
+        'upcoming listing': lambda: db.events.find({'end_datetime': {'$gte': cutoff}})
+                                            .sort(listing_sort).limit(51).explain(),
+        'past listing': lambda: db.events.find({'end_datetime': {'$lt': cutoff}})
+                                        .sort([('start_datetime', DESCENDING), ('_id', DESCENDING)])
+                                        .limit(51).explain(),
+        'mailsend upcoming': lambda: db.events.find({'start_datetime': {'$gte': now}}).explain(),
+        'event search': lambda: db.events.find({'$and': [{'end_datetime': {'$gte': cutoff}},
+                                                          {'search_tokens': {'$regex': '^techno'}}]})
+                                         .sort(listing_sort).limit(201).explain(),
+        'artist lookup': lambda: db.Artists.find({'name_key': 'example'}).explain(),
+        # the organisers/venues/tags pages read event_stats rather than distinct over events
+        'organiser stats': lambda: db.event_stats.find({'kind': 'organiser'}).explain(),
+    }
+
+
+def explain_report(db):
+    # For each query the app runs, which indexes (if any) the planner picks
+    report = {}
+    for label, explain in representative_queries(db).items():
+        stages = _plan_stages(_winning_plan(explain()))
+        indexes = [name for stage, name in stages if name]
+        report[label] = {
+            'indexes': indexes,
+            'collection_scan': any(stage == 'COLLSCAN' for stage, _ in stages),
+        }
+    return report
+
+
+if __name__ == '__main__':
+    import mongo_pool
+    db = mongo_pool.get_database()
+    for name in ensure_indexes(db):
+        print(f"Index ready: {name}")
+    if '--explain' in sys.argv:
+        for label, result in explain_report(db).items():
+            used = ', '.join(result['indexes']) or 'none'
+            status = 'COLLSCAN' if result['collection_scan'] else 'ok'
+            print(f"{label:22} {status:8} indexes: {used}")
@@ -0,0 +1,351 @@
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pymongo import monitoring
+
+# Metrics rendered in the Prometheus text format. Each process counts in memory; with
+# METRICS_DIR set (gunicorn.conf.py does) every worker also writes its numbers to a
+# file there every METRICS_FLUSH_SECONDS, and /metrics adds up all the files
+# so whichever worker answers the scrape reports the whole server. A worker that
+# exits (or that the master reaps after it was killed) folds its counters into
+# retired.json, so totals don't drop on recycling.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class Counter:
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render(self, values=None):
+        values = self.snapshot() if values is None else values
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(values.items()):
+            lines.append(f'{self.name}{_labels(self.label_names, labels)} {value}')
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {labels: list(series) for labels, series in self._series.items()}
+
+    def render(self, values=None):
+        values = self.snapshot() if values is None else values
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        names = self.label_names + ('le',)
+        for labels, series in sorted(values.items()):
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{_labels(names, labels + (bound,))} {count}')
+            lines.append(f'{self.name}_bucket{_labels(names, labels + ("+Inf",))} {series[-1]}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {round(series[-2], 6)}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {series[-1]}')
+        return lines
+
+
+class Readings:
+    # Numbers another module keeps (pool events, page cache hits), read when flushing or
+    # rendering. `read()` returns {metric name: value}. Counters of exited workers are
+    # kept, gauges only add up the live ones
+    def __init__(self, name, kind, read):
+        self.name = name
+        self.kind = kind
+        self.read = read
+
+    def snapshot(self):
+        return {(name,): value for name, value in self.read().items()}
+
+    def render(self, values=None):
+        values = self.snapshot() if values is None else values
+        lines = []
+        for (name,), value in sorted(values.items()):
+            lines += [f'# TYPE {name} {self.kind}', f'{name} {value}']
+        return lines
+
+
+request_duration = Histogram('naarm_http_request_duration_seconds', 'Time to handle a request',
+                             ('route', 'method', 'status'))
+phase_duration = Histogram('naarm_phase_duration_seconds', 'Time spent in each phase of a route',
+                           ('route', 'phase'))
+mongo_duration = Histogram('naarm_mongo_command_duration_seconds', 'MongoDB command latency',
+                           ('collection', 'command'))
+mongo_documents = Counter('naarm_mongo_documents_returned_total', 'Documents returned by MongoDB',
+                          ('collection', 'command'))
+mongo_failures = Counter('naarm_mongo_command_failures_total', 'Failed MongoDB commands',
+                         ('collection', 'command'))
+slow_requests = Counter('naarm_slow_requests_total', 'Requests slower than the slow request threshold',
+                        ('route',))
+
+REGISTRY = [request_duration, phase_duration, mongo_duration, mongo_documents, mongo_failures, slow_requests]
+
+FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", 1))
+RETIRED = 'retired.json'
+
+# This process's file in METRICS_DIR, named afresh after a fork
+_process = {'pid': None, 'name': None, 'retired': False}
+_flush_lock = threading.Lock()
+
+
+def _directory():
+    return os.getenv("METRICS_DIR")
+
+
+def _own_file(directory):
+    if _process['pid'] != os.getpid():
+        _process.update(pid=os.getpid(), name=f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json', retired=False)
+    return os.path.join(directory, _process['name'])
+
+
+@contextmanager
+def _locked(directory, mode):
+    # Readers share the lock, retiring a worker takes it exclusively so its numbers are
+    # never in both its own file and retired.json as seen by a reader
+    with open(os.path.join(directory, '.lock'), 'a') as f:
+        fcntl.flock(f, mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _snapshot():
+    # {name: (kind, {labels: value})}, histograms count as counters
+    return {metric.name: (getattr(metric, 'kind', 'counter'), metric.snapshot()) for metric in REGISTRY}
+
+
+def _counters(snapshot):
+    # What outlives a worker, gauges only describe live ones
+    return {name: entry for name, entry in snapshot.items() if entry[0] != 'gauge'}
+
+
+def _write(path, snapshot):
+    # labels tuples become lists in JSON
+    data = {name: [kind, [[list(labels), value] for labels, value in values.items()]]
+            for name, (kind, values) in snapshot.items()}
+    with open(path + '.tmp', 'w') as f:
+        json.dump(data, f)
+    os.replace(path + '.tmp', path)
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {name: (kind, {tuple(labels): value for labels, value in values}) for name, (kind, values) in data.items()}
+
+
+def _add(total, value):
+    # histogram series add up bucket by bucket
+    return [a + b for a, b in zip(total, value)] if isinstance(total, list) else total + value
+
+
+def _combine(snapshots):
+    total = {}
+    for snapshot in snapshots:
+        for name, (kind, values) in snapshot.items():
+            combined = total.setdefault(name, (kind, {}))[1]
+            for labels, value in values.items():
+                combined[labels] = _add(combined[labels], value) if labels in combined else value
+    return total
+
+
+def _fold_into_retired(directory, snapshot):
+    retired = os.path.join(directory, RETIRED)
+    _write(retired, _combine([_read(retired), _counters(snapshot)]))
+
+
+def flush():
+    directory = _directory()
+    if not directory:
+        return
+    with _flush_lock:
+        path = _own_file(directory)
+        if not _process['retired']:
+            _write(path, _snapshot())
+
+
+def start_flushing():
+    # Called once a worker has started (gunicorn's post_worker_init hook)
+    if not _directory():
+        return
+
+    def run():
+        while not _process['retired']:
+            time.sleep(FLUSH_SECONDS)
+            flush()
+
+    flush()
+    threading.Thread(target=run, name='metrics-flush', daemon=True).start()
+
+
+def retire():
+    # Called as a worker exits (gunicorn's worker_exit hook)
+    directory = _directory()
+    if not directory:
+        return
+    with _flush_lock, _locked(directory, fcntl.LOCK_EX):
+        path = _own_file(directory)
+        _process['retired'] = True
+        _fold_into_retired(directory, _snapshot())
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def reap(pid):
+    # Called in the gunicorn master once a worker is gone (child_exit hook). A worker that
+    # was killed (e.g. on timeout) never retired, fold its last counters in and drop its
+    # file so its gauges stop counting
+    directory = _directory()
+    if not directory:
+        return
+    with _locked(directory, fcntl.LOCK_EX):
+        for path in glob.glob(os.path.join(directory, f'{pid}-*.json')):
+            _fold_into_retired(directory, _read(path))
+            os.remove(path)
+
+
+def render():
+    directory = _directory()
+    if directory:
+        flush()
+        with _locked(directory, fcntl.LOCK_SH):
+            values = _combine(_read(path) for path in glob.glob(os.path.join(directory, '*.json')))
+    else:
+        values = _snapshot()
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render(values.get(metric.name, (None, {}))[1]))
+    return '\n'.join(lines) + '\n'
+
+
+# Per-thread tally of the current request, so the slow request log can say where the time went
+_current = threading.local()
+
+
+def start_request():
+    _current.phases = {}
+    _current.mongo_seconds = 0.0
+    _current.mongo_commands = 0
+
+
+def request_breakdown():
+    return {
+        'phases': dict(getattr(_current, 'phases', {})),
+        'mongo_seconds': round(getattr(_current, 'mongo_seconds', 0.0), 4),
+        'mongo_commands': getattr(_current, 'mongo_commands', 0),
+    }
+
+
+@contextmanager
+def phase(route, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        phase_duration.observe(elapsed, route, name)
+        phases = getattr(_current, 'phases', None)
+        if phases is not None:
+            phases[name] = round(phases.get(name, 0) + elapsed, 4)
+
+
+# Commands whose first argument names the collection
+_COLLECTION_KEYS = {'find', 'insert', 'update', 'delete', 'aggregate', 'count', 'distinct',
+                    'findAndModify', 'findandmodify', 'createIndexes', 'listIndexes'}
+
+
+class CommandTimer(monitoring.CommandListener):
+    # Times every command the pooled client sends, by collection and command name
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def started(self, event):
+        collection = ''
+        if event.command_name in _COLLECTION_KEYS:
+            collection = str(event.command.get(event.command_name, ''))
+        elif event.command_name == 'getMore':
+            collection = str(event.command.get('collection', ''))
+        with self._lock:
+            self._inflight[(event.connection_id, event.request_id)] = collection
+
+    def _finish(self, event):
+        with self._lock:
+            collection = self._inflight.pop((event.connection_id, event.request_id), '')
+        seconds = event.duration_micros / 1e6
+        if hasattr(_current, 'mongo_seconds'):
+            _current.mongo_seconds += seconds
+            _current.mongo_commands += 1
+        return collection, seconds
+
+    def succeeded(self, event):
+        collection, seconds = self._finish(event)
+        mongo_duration.observe(seconds, collection, event.command_name)
+        cursor = event.reply.get('cursor') if isinstance(event.reply, dict) else None
+        if cursor:
+            returned = len(cursor.get('firstBatch', cursor.get('nextBatch', [])))
+        elif event.command_name in ('count', 'distinct'):
+            returned = 1
+        else:
+            returned = 0
+        if returned:
+            mongo_documents.inc(collection, event.command_name, amount=returned)
+
+    def failed(self, event):
+        collection, seconds = self._finish(event)
+        mongo_duration.observe(seconds, collection, event.command_name)
+        mongo_failures.inc(collection, event.command_name)
+
+
+command_timer = CommandTimer()
@@ -0,0 +1,80 @@
+import json
+import os
+import sys
+from pymongo import UpdateOne
+import event_time
+
+# Converts events stored with start/end as ISO strings (Melbourne local time) to
+# BSON dates in UTC. Works through the collection in _id order a batch at a time,
+# so it can run against a live database and is a no-op once everything is converted.
+
+BATCH_SIZE = 500
+
+DATE_FIELDS = ('start_datetime', 'end_datetime')
+
+
+def _string_dates():
+    return {'$or': [{field: {'$type': 'string'}} for field in DATE_FIELDS]}
+
+
+def migrate_events(db, collection='events', batch_size=BATCH_SIZE):
+    converted = 0
+    failed = []
+    last_id = None
+    while True:
+        query = _string_dates()
+        if last_id is not None:
+            query = {'$and': [query, {'_id': {'$gt': last_id}}]}
+        batch = list(db[collection].find(query, {field: 1 for field in DATE_FIELDS})
+                     .sort('_id', 1).limit(batch_size))
+        if not batch:
+            break
+        last_id = batch[-1]['_id']
+        operations = []
+        for doc in batch:
+            try:
+                update = {field: event_time.to_utc(doc[field]) for field in DATE_FIELDS
+                          if isinstance(doc.get(field), str)}
+            except ValueError:
+                failed.append(doc['_id'])
+                continue
+            operations.append(UpdateOne({'_id': doc['_id']}, {'$set': update}))
+        if operations:
+            db[collection].bulk_write(operations, ordered=False)
+            converted += len(operations)
+    return converted, failed
+
+
+def _as_extended_json(value):
+    return {'$date': event_time.to_utc(value).strftime('%Y-%m-%dT%H:%M:%S.000Z')}
+
+
+def migrate_backup_file(path):
+    # Rewrites a db_data backup so its events carry {"$date": ...} values, which
+    # mongoimport loads as BSON dates. Written to a temp file and swapped in.
+    with open(path) as f:
+        data = json.load(f)
+    converted = 0
+    for event in data.get('events', []):
+        for field in DATE_FIELDS:
+            if isinstance(event.get(field), str):
+                event[field] = _as_extended_json(event[field])
+                converted += 1
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+    return converted
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if args and args[0] == '--backup':
+        for path in args[1:]:
+            print(f"{path}: converted {migrate_backup_file(path)} datetimes")
+    else:
+        import mongo_pool
+        converted, failed = migrate_events(mongo_pool.get_database())
+        print(f"Converted {converted} events")
+        if failed:
+            print(f"Could not parse the dates of {len(failed)} events: {', '.join(map(str, failed))}")
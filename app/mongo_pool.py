@@ -0,0 +1,149 @@
+import os
+import threading
+from pymongo import MongoClient, monitoring
+import metrics
+
+# One MongoClient (and so one connection pool + one set of monitor threads) per
+# process, shared by every request. MongoClient is thread safe but NOT fork
+# safe, so the registry is keyed on the pid and emptied in forked children.
+
+_lock = threading.Lock()
+_clients = {}
+_pid = os.getpid()
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    if value is None or value == '':
+        return default
+    return int(value)
+
+
+def pool_options():
+    # Tunables for the pool, all overridable from the environment
+    options = {
+        'maxPoolSize': _env_int('MONGO_MAX_POOL_SIZE', 50),
+        'minPoolSize': _env_int('MONGO_MIN_POOL_SIZE', 0),
+        'maxIdleTimeMS': _env_int('MONGO_MAX_IDLE_TIME_MS', 60000),
+        'connectTimeoutMS': _env_int('MONGO_CONNECT_TIMEOUT_MS', 5000),
+        'serverSelectionTimeoutMS': _env_int('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000),
+        'waitQueueTimeoutMS': _env_int('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000),
+    }
+    socket_timeout = _env_int('MONGO_SOCKET_TIMEOUT_MS', None)
+    if socket_timeout is not None:
+        options['socketTimeoutMS'] = socket_timeout
+    return options
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    # Counts connection pool events so operators can see how busy the pool is
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {
+                'pools_created': 0,
+                'pools_cleared': 0,
+                'connections_created': 0,
+                'connections_closed': 0,
+                'checkouts': 0,
+                'checkins': 0,
+                'checkout_failures': 0,
+            }
+
+    def _incr(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def pool_created(self, event):
+        self._incr('pools_created')
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._incr('pools_cleared')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._incr('connections_created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._incr('connections_closed')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._incr('checkout_failures')
+
+    def connection_checked_out(self, event):
+        self._incr('checkouts')
+
+    def connection_checked_in(self, event):
+        self._incr('checkins')
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['open_connections'] = stats['connections_created'] - stats['connections_closed']
+        stats['in_use'] = stats['checkouts'] - stats['checkins']
+        return stats
+
+
+stats = PoolStats()
+
+
+def _reset_after_fork():
+    # The parent's sockets and monitor threads are unusable in the child, just
+    # forget them (closing would also tear down the parent's connections)
+    global _lock, _pid
+    _lock = threading.Lock()
+    _clients.clear()
+    _pid = os.getpid()
+    stats.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_client(url=None):
+    url = url or os.getenv("DB_URL")
+    if os.getpid() != _pid:
+        _reset_after_fork()
+    client = _clients.get(url)
+    if client is None:
+        with _lock:
+            client = _clients.get(url)
+            if client is None:
+                client = MongoClient(url, event_listeners=[stats, metrics.command_timer], **pool_options())
+                _clients[url] = client
+    return client
+
+
+def get_database(name=None, url=None):
+    return get_client(url)[name or os.getenv("DB_NAME")]
+
+
+def close_all():
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+def pool_stats():
+    result = stats.snapshot()
+    result['pid'] = os.getpid()
+    result['clients'] = len(_clients)
+    result['options'] = pool_options()
+    return result
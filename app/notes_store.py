@@ -0,0 +1,113 @@
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+import markdown
+
+# Parsed and rendered notes kept in memory. Each .md file is parsed and run through
+# markdown once, then only re-read when its mtime or size changes, so a request
+# costs a directory scan (at most every `check_interval` seconds) plus a filter.
+
+
+def parse_note(filename, content):
+    # Parse front matter
+    metadata = {}
+    if content.startswith('---'):
+        parts = content.split('---', 2)[1:]
+        if len(parts) >= 2:
+            front_matter = parts[0].strip()
+            content = parts[1].strip()
+            # Parse each line of front matter
+            for line in front_matter.split('\n'):
+                if ':' in line:
+                    key, value = line.split(':', 1)
+                    metadata[key.strip()] = value.strip()
+
+    # Convert date string to datetime if present
+    if 'date' in metadata:
+        try:
+            metadata['date'] = datetime.strptime(metadata['date'], '%Y-%m-%d')
+        except ValueError:
+            metadata['date'] = datetime.now()
+    else:
+        metadata['date'] = datetime.now()
+
+    # Convert tags string to list if present
+    if 'tags' in metadata:
+        metadata['tags'] = [tag.strip() for tag in metadata['tags'].split(',')]
+    else:
+        metadata['tags'] = []
+
+    return {
+        'filename': filename,
+        'content': markdown.markdown(content),
+        'metadata': metadata,
+        # Pre-lowercased text the search box is matched against
+        'search_title': metadata.get('title', '').lower(),
+        'search_tags': [tag.lower() for tag in metadata['tags']],
+        'search_body': content.lower(),
+    }
+
+
+class NoteStore:
+
+    def __init__(self, notes_dir, check_interval=2.0):
+        self.notes_dir = notes_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._files = {}  # filename -> (mtime_ns, size, note)
+        self._notes = []  # newest first
+        self._checked_at = None
+        # Bumped whenever a note is added, changed or removed
+        self.generation = 0
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            seen = {}
+            if os.path.exists(self.notes_dir):
+                for entry in os.scandir(self.notes_dir):
+                    if entry.name.endswith('.md') and entry.is_file():
+                        stat = entry.stat()
+                        seen[entry.name] = (stat.st_mtime_ns, stat.st_size, entry.path)
+            removed = set(self._files) - set(seen)
+            for filename in removed:
+                del self._files[filename]
+            changed = bool(removed)
+            for filename, (mtime, size, path) in seen.items():
+                cached = self._files.get(filename)
+                if cached and cached[0] == mtime and cached[1] == size:
+                    continue
+                with open(path, 'r') as f:
+                    self._files[filename] = (mtime, size, parse_note(filename, f.read()))
+                changed = True
+            if changed:
+                self._notes = sorted((note for _, _, note in self._files.values()),
+                                     key=lambda note: note['metadata']['date'], reverse=True)
+                self.generation += 1
+            self._checked_at = now
+
+    def version(self):
+        self.refresh()
+        return self.generation
+
+    def fingerprint(self):
+        # Same files -> same value in any process (generation only counts this process's reloads)
+        self.refresh()
+        with self._lock:
+            files = sorted((name, mtime, size) for name, (mtime, size, _) in self._files.items())
+        return hashlib.sha1(repr(files).encode()).hexdigest()
+
+    def search(self, query=''):
+        self.refresh()
+        notes = self._notes
+        if not query:
+            return list(notes)
+        query = query.lower()
+        return [note for note in notes
+                if query in note['search_title']
+                or any(query in tag for tag in note['search_tags'])
+                or query in note['search_body']]
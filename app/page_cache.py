@@ -0,0 +1,130 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+from flask import request, make_response, Response
+
+# Cache of fully rendered GET responses for the public pages. Keys are built from
+# the route, its query string, the content versions of the data the page shows and
+# (for pages that depend on the clock) a time bucket, so a write anywhere simply
+# makes new keys and the stale entries age out of the backend.
+
+
+class CacheBackend:
+    # Interface for where rendered pages live, swap in e.g. a shared cache server
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LRUBackend(CacheBackend):
+    # In-process, bounded by entry count and age
+
+    def __init__(self, max_entries=256, ttl=600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class PageCache:
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.counters = {}
+
+    def _count(self, endpoint, outcome):
+        with self._lock:
+            counts = self.counters.setdefault(endpoint, {'hits': 0, 'misses': 0})
+            counts[outcome] += 1
+
+    def cached(self, version, bucket_seconds=None):
+        # `version` is called per request and returns whatever identifies the current
+        # state of the page's data, `bucket_seconds` rolls the key over with the clock
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET':
+                    return view(*args, **kwargs)
+                bucket = int(time.time() // bucket_seconds) if bucket_seconds else None
+                key = (request.endpoint, request.path, tuple(sorted(request.args.items(multi=True))),
+                       version(), bucket)
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self._count(request.endpoint, 'hits')
+                    body, status, mimetype = entry
+                    return Response(body, status=status, mimetype=mimetype)
+                self._count(request.endpoint, 'misses')
+                response = view(*args, **kwargs)
+                response = make_response(response)
+                if response.status_code == 200 and not response.direct_passthrough:
+                    if response.is_streamed:
+                        # Keep streaming, the body is stored once the last chunk went out
+                        response.response = self._store_when_done(key, response)
+                    else:
+                        self.backend.set(key, (response.get_data(), response.status_code, response.mimetype))
+                return response
+            return wrapper
+        return decorator
+
+    def _store_when_done(self, key, response):
+        body, status, mimetype = response.response, response.status_code, response.mimetype
+
+        def generate():
+            chunks = []
+            for chunk in body:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                chunks.append(chunk)
+                yield chunk
+            # Not reached when the client goes away mid-stream, so partial bodies aren't kept
+            self.backend.set(key, (b''.join(chunks), status, mimetype))
+        return generate()
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self.counters = {}
+
+    def stats(self):
+        with self._lock:
+            counters = {endpoint: dict(counts) for endpoint, counts in self.counters.items()}
+        return {
+            'entries': len(self.backend) if hasattr(self.backend, '__len__') else None,
+            'routes': counters,
+            'hits': sum(c['hits'] for c in counters.values()),
+            'misses': sum(c['misses'] for c in counters.values()),
+        }
@@ -0,0 +1,317 @@
+import glob
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from bson import ObjectId, json_util
+from bson.json_util import JSONOptions
+from pymongo import ReplaceOne
+import content_version
+import event_stats
+import event_time
+import search
+from artist_store import name_key
+from event_import import fingerprint
+from exporter import SKIP_COLLECTIONS
+from indexes import create_indexes, ensure_indexes
+
+# Restores a db_data/naarm_list_backup_*.json file ({"<collection>": [docs...]}).
+# The file is parsed incrementally, a document at a time, and batches are inserted
+# by a thread pool into "<collection>__restore" staging collections. Once every
+# batch is in, each staging collection gets its indexes and is renamed over the live
+# one, so the site keeps serving the old data until the swap. --incremental instead
+# writes only the documents that differ from what is already there.
+
+BATCH_SIZE = 1000
+WORKERS = int(os.getenv("RESTORE_WORKERS", 4))
+CHUNK_SIZE = 1 << 16
+
+STAGING_SUFFIX = '__restore'
+
+EVENT_COLLECTIONS = ('events', 'events_archive')
+
+# Written by the app, kept on live documents that an incremental restore rewrites
+KEPT_FIELDS = ('created_at', 'updated_at')
+
+_MISSING = object()
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'db_data'))
+
+# $date values come back as naive UTC datetimes, like pymongo returns them
+_JSON_OPTIONS = JSONOptions(tz_aware=False)
+_WHITESPACE = re.compile(r'\s*')
+_OBJECT_ID = re.compile(r'^[0-9a-f]{24}$')
+
+
+class _Reader:
+    # Just enough of a streaming JSON reader for the backup layout, documents are
+    # decoded one at a time from a sliding buffer
+
+    def __init__(self, stream, chunk_size):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.decoder = json.JSONDecoder(object_hook=lambda d: json_util.object_hook(d, _JSON_OPTIONS))
+
+    def _fill(self):
+        data = self.stream.read(self.chunk_size)
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return bool(data)
+
+    def peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Backup file: expected {char!r} at {self.buffer[self.pos:self.pos + 40]!r}")
+        self.pos += 1
+
+    def skip(self, char):
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, self.pos = self.decoder.raw_decode(self.buffer, self.pos)
+                return value
+            except json.JSONDecodeError:
+                # document runs past the end of the buffer
+                if not self._fill():
+                    raise
+
+
+def iter_backup(stream, chunk_size=CHUNK_SIZE):
+    # Yields (collection, None) as each collection starts, then (collection, doc)
+    reader = _Reader(stream, chunk_size)
+    reader.expect('{')
+    if reader.skip('}'):
+        return
+    while True:
+        collection = reader.value()
+        reader.expect(':')
+        reader.expect('[')
+        yield collection, None
+        if not reader.skip(']'):
+            while True:
+                yield collection, reader.value()
+                if not reader.skip(','):
+                    reader.expect(']')
+                    break
+        if not reader.skip(','):
+            reader.expect('}')
+            return
+
+
+def restore_doc(collection, doc):
+    # Back to what the app stores: ObjectId _ids, UTC dates and the derived fields
+    if isinstance(doc.get('_id'), str) and _OBJECT_ID.match(doc['_id']):
+        doc['_id'] = ObjectId(doc['_id'])
+    if collection in EVENT_COLLECTIONS:
+        for field in ('start_datetime', 'end_datetime'):
+            if isinstance(doc.get(field), str):
+                # older backups have Melbourne local ISO strings. One that doesn't parse
+                # is kept as it is, like migrate_datetimes leaves them, and counted
+                try:
+                    doc[field] = event_time.to_utc(doc[field])
+                except ValueError:
+                    pass
+        if 'search_tokens' not in doc:
+            doc['search_tokens'] = search.event_search_tokens(doc)
+        if 'fingerprint' not in doc and doc.get('start_datetime') and not isinstance(doc['start_datetime'], str):
+            doc['fingerprint'] = fingerprint(doc)
+    elif collection == 'Artists' and 'name_key' not in doc:
+        doc['name_key'] = name_key(doc.get('name', ''))
+    return doc
+
+
+def _batches(stream, batch_size, include_empty=False):
+    # (collection, [docs]) with an empty list marking the start of each collection. An
+    # empty array in the backup is left out unless `include_empty`, restoring it would
+    # wipe the live collection
+    batch, current, started = [], None, True
+    for collection, doc in iter_backup(stream):
+        if collection in SKIP_COLLECTIONS:
+            continue
+        if doc is None:
+            if batch:
+                yield current, batch
+            if not started and include_empty:
+                yield current, []
+            batch, current, started = [], collection, False
+            continue
+        if not started:
+            yield current, []
+            started = True
+        batch.append(restore_doc(collection, doc))
+        if len(batch) >= batch_size:
+            yield current, batch
+            batch = []
+    if batch:
+        yield current, batch
+    if not started and include_empty:
+        yield current, []
+
+
+def _unparsed_dates(collection, batch):
+    if collection not in EVENT_COLLECTIONS:
+        return 0
+    return sum(any(isinstance(doc.get(field), str) for field in ('start_datetime', 'end_datetime'))
+               for doc in batch)
+
+
+def _run(executor, batches, start, process, finish, workers):
+    # Keeps up to 2x workers batches in flight so the reader never runs far ahead.
+    # `finish(collection, result)` gets what each `process` call returned, on this thread
+    pending = {}
+
+    def collect(futures):
+        for future in futures:
+            finish(pending.pop(future), future.result())
+
+    for collection, batch in batches:
+        start(collection)
+        if not batch:
+            continue
+        if len(pending) >= workers * 2:
+            collect(wait(pending, return_when=FIRST_COMPLETED).done)
+        pending[executor.submit(process, collection, batch)] = collection
+    collect(list(pending))
+
+
+def _add_counts(report, collection, counts):
+    entry = report[collection]
+    for what, n in counts.items():
+        # unparsed_dates only shows up when there are some
+        if n or what in entry:
+            entry[what] = entry.get(what, 0) + n
+
+
+def _load_staging(db, stream, workers, batch_size, report, include_empty):
+    def start(collection):
+        if collection not in report:
+            staging = collection + STAGING_SUFFIX
+            db.drop_collection(staging)
+            db.create_collection(staging)
+            report[collection] = {'documents': 0}
+
+    def process(collection, batch):
+        db[collection + STAGING_SUFFIX].insert_many(batch, ordered=False)
+        return {'documents': len(batch), 'unparsed_dates': _unparsed_dates(collection, batch)}
+
+    def finish(collection, counts):
+        _add_counts(report, collection, counts)
+
+    with ThreadPoolExecutor(workers) as executor:
+        try:
+            _run(executor, _batches(stream, batch_size, include_empty), start, process, finish, workers)
+        except Exception:
+            # The live collections were never touched
+            for collection in report:
+                db.drop_collection(collection + STAGING_SUFFIX)
+            raise
+        list(executor.map(lambda c: create_indexes(db, c, c + STAGING_SUFFIX), list(report)))
+    for collection in report:
+        # rename is atomic, readers see either the old or the restored collection
+        db[collection + STAGING_SUFFIX].rename(collection, dropTarget=True)
+
+
+def _apply_changes(db, stream, workers, batch_size, report, include_empty):
+    seen = {}
+
+    def start(collection):
+        if collection not in report:
+            report[collection] = {'documents': 0, 'written': 0, 'deleted': 0}
+            seen[collection] = set()
+
+    def process(collection, batch):
+        ids = [doc['_id'] for doc in batch]
+        existing = {doc['_id']: doc for doc in db[collection].find({'_id': {'$in': ids}})}
+        changed = []
+        for doc in batch:
+            live = existing.get(doc['_id'])
+            # Only what the backup carries (and the fields restore_doc derives from it)
+            # counts, older backups lack fields like updated_at that the live data has
+            if live is not None and all(live.get(field, _MISSING) == value for field, value in doc.items()):
+                continue
+            # Stamps the backup doesn't have are kept
+            kept = {field: live[field] for field in KEPT_FIELDS if live and field in live and field not in doc}
+            changed.append(ReplaceOne({'_id': doc['_id']}, {**doc, **kept}, upsert=True))
+        if changed:
+            db[collection].bulk_write(changed, ordered=False)
+        return ids, {'documents': len(batch), 'written': len(changed),
+                     'unparsed_dates': _unparsed_dates(collection, batch)}
+
+    def finish(collection, result):
+        ids, counts = result
+        seen[collection].update(ids)
+        _add_counts(report, collection, counts)
+
+    with ThreadPoolExecutor(workers) as executor:
+        _run(executor, _batches(stream, batch_size, include_empty), start, process, finish, workers)
+    for collection, ids in seen.items():
+        # Anything the backup doesn't have any more
+        gone = [doc['_id'] for doc in db[collection].find({}, {'_id': 1}) if doc['_id'] not in ids]
+        for i in range(0, len(gone), batch_size):
+            db[collection].delete_many({'_id': {'$in': gone[i:i + batch_size]}})
+        report[collection]['deleted'] = len(gone)
+        create_indexes(db, collection)
+
+
+def restore(db, stream, incremental=False, workers=WORKERS, batch_size=BATCH_SIZE, include_empty=False):
+    # Returns {collection: {'documents': n, ...}} for the collections restored, see
+    # _batches for `include_empty`
+    report = {}
+    if incremental:
+        _apply_changes(db, stream, workers, batch_size, report, include_empty)
+    else:
+        _load_staging(db, stream, workers, batch_size, report, include_empty)
+    # Indexes/backfills for anything the backup didn't cover, then the derived data
+    ensure_indexes(db)
+    if any(collection in report for collection in EVENT_COLLECTIONS):
+        event_stats.rebuild(db)
+    if report:
+        content_version.bump(db, *report)
+    return report
+
+
+def latest_backup(backup_dir=BACKUP_DIR):
+    # naarm_list_backup_YYYYMMDD_HHMMSS.json sorts by date
+    files = sorted(glob.glob(os.path.join(backup_dir, 'naarm_list_backup_*.json')))
+    return files[-1] if files else None
+
+
+if __name__ == '__main__':
+    import argparse
+    import mongo_pool
+    parser = argparse.ArgumentParser(description='Restore the database from a backup JSON file')
+    parser.add_argument('file', nargs='?', help='backup file (default: latest in db_data)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only write documents that differ from the database, and delete ones not in the backup')
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--include-empty', action='store_true',
+                        help='also restore collections that are empty in the backup, emptying them here')
+    args = parser.parse_args()
+    path = args.file or latest_backup()
+    if not path or not os.path.exists(path):
+        sys.exit(f"Backup file not found: {path}")
+    db = mongo_pool.get_database()
+    print(f"Restoring {db.name} from {path}{' (incremental)' if args.incremental else ''}")
+    started = time.perf_counter()
+    with open(path, encoding='utf-8') as f:
+        result = restore(db, f, incremental=args.incremental, workers=args.workers, batch_size=args.batch_size,
+                         include_empty=args.include_empty)
+    for collection, counts in result.items():
+        print(f"  {collection}: " + ', '.join(f"{n} {what}" for what, n in counts.items()))
+    print(f"Done in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,88 @@
+import re
+import unicodedata
+from pymongo import UpdateOne
+
+# Event search works on a stored, multikey-indexed `search_tokens` array instead of
+# regexes over five fields. Every query term becomes an anchored, escaped prefix
+# match ('^term') which Mongo answers from the index bounds, and the (bounded)
+# candidate set is then ranked in Python by which fields matched.
+
+# How much a match in each field counts towards an event's relevance
+FIELD_WEIGHTS = {
+    'title': 5,
+    'artists': 4,
+    'venue': 3,
+    'organisers': 2,
+    'tags': 2,
+}
+
+# Guard against pathological queries, terms past this are ignored
+MAX_TERMS = 8
+
+_WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    # Lowercase, strip accents (so "café" also finds "cafe") and split on non-word chars
+    if not text:
+        return []
+    if isinstance(text, (list, tuple)):
+        text = ' '.join(t for t in text if isinstance(t, str))
+    decomposed = unicodedata.normalize('NFKD', text)
+    plain = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return _WORD.findall(plain.casefold())
+
+
+def event_search_tokens(event):
+    tokens = set()
+    for field in FIELD_WEIGHTS:
+        tokens.update(tokenize(event.get(field)))
+    return sorted(tokens)
+
+
+def query_terms(search_query):
+    terms = []
+    for term in tokenize(search_query):
+        if term not in terms:
+            terms.append(term)
+    return terms[:MAX_TERMS]
+
+
+def search_filter(search_query):
+    terms = query_terms(search_query)
+    if not terms:
+        # Nothing searchable (e.g. only punctuation), match nothing
+        return {'_id': None}
+    return {'$and': [{'search_tokens': {'$regex': '^' + re.escape(term)}} for term in terms]}
+
+
+def score(event, terms):
+    total = 0
+    for field, weight in FIELD_WEIGHTS.items():
+        field_tokens = tokenize(event.get(field))
+        for term in terms:
+            if term in field_tokens:
+                total += weight * 2
+            elif any(token.startswith(term) for token in field_tokens):
+                total += weight
+    return total
+
+
+def rank(events, search_query, descending=False):
+    # Best match first, ties keep the listing's date order so results stay stable
+    terms = query_terms(search_query)
+    by_date = sorted(events, key=lambda e: (e['start_datetime'], e['_id']), reverse=descending)
+    return sorted(by_date, key=lambda e: -score(e, terms))
+
+
+def backfill_search_tokens(db):
+    # Events written before search_tokens existed (or restored from a backup).
+    # {'search_tokens': None} is answered from the index so this is cheap once done.
+    missing = list(db.events.find({'search_tokens': None}, {field: 1 for field in FIELD_WEIGHTS}))
+    if not missing:
+        return 0
+    db.events.bulk_write([
+        UpdateOne({'_id': event['_id']}, {'$set': {'search_tokens': event_search_tokens(event)}})
+        for event in missing
+    ], ordered=False)
+    return len(missing)
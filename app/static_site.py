@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from bson import json_util
+import content_version
+import event_time
+from app import app, get_db_connection, listing_cutoff, note_store, LISTING_BUCKET_SECONDS
+
+# Renders the public, identical-for-everyone pages through the app itself (so the
+# same views, templates and queries) into a directory a web server can serve as
+# files. Each page has a signature of what it was rendered from, kept in
+# manifest.json, and a run only re-renders pages whose signature changed:
+#   - list pages: the content versions of their collections (+ the clock for pages
+#     that split upcoming/past, + the notes files for /notes)
+#   - /artist/<id> and /ics/<id>: a digest of that one artist/event document
+# Only plain URLs are written, anything with a query string (paging, filters, search)
+# is left to the app. See the README for the matching nginx config.
+
+MANIFEST = 'manifest.json'
+
+# url -> what the page depends on
+PAGES = {
+    '/': ('events', 'Artists', 'bucket'),
+    '/past': ('events', 'Artists', 'bucket'),
+    '/venues': ('venues', 'events', 'day'),
+    '/organisers': ('events', 'day'),
+    '/tags': ('events', 'day'),
+    '/artists': ('Artists',),
+    '/notes': ('notes',),
+    '/calendar.ics': ('events', 'bucket'),
+}
+
+# Fields the per-document pages render, anything else changing doesn't matter
+ARTIST_FIELDS = {'name': 1, 'description': 1, 'tags': 1, 'links': 1}
+ICS_FIELDS = {'title': 1, 'start_datetime': 1, 'end_datetime': 1, 'venue': 1, 'link': 1}
+
+
+def current_state(db):
+    versions = content_version.current(db)['versions']
+    state = {c: versions.get(c, 0) for c in ('events', 'Artists', 'venues')}
+    state['notes'] = note_store.fingerprint()
+    state['bucket'] = int(time.time() // LISTING_BUCKET_SECONDS)
+    state['day'] = event_time.local(event_time.utcnow()).strftime('%Y-%m-%d')
+    return state
+
+
+def _digest(doc):
+    return hashlib.sha1(json_util.dumps(doc, sort_keys=True).encode()).hexdigest()
+
+
+def output_path(url):
+    # /ics/<id> -> ics/<id>.ics, /calendar.ics -> calendar.ics, other pages -> <url>/index.html
+    if url.startswith('/ics/'):
+        return url.lstrip('/') + '.ics'
+    if url.endswith('.ics'):
+        return url.lstrip('/')
+    return os.path.join(url.strip('/'), 'index.html')
+
+
+def page_signatures(db, state, previous):
+    # {url: signature} for every page that should exist now
+    signatures = {url: json.dumps([state[dep] for dep in deps]) for url, deps in PAGES.items()}
+    old_pages = previous.get('pages', {})
+    old_state = previous.get('state', {})
+    # (url prefix, collection, query, fields, what decides whether the set of documents can have changed)
+    for prefix, collection, query, fields, deps in (
+            ('/artist/', 'Artists', {}, ARTIST_FIELDS, ('Artists',)),
+            # upcoming events only, so the set also moves with the clock
+            ('/ics/', 'events', {'end_datetime': {'$gte': listing_cutoff()}}, ICS_FIELDS, ('events', 'bucket'))):
+        if all(old_state.get(dep) == state[dep] for dep in deps):
+            # Nothing in the collection changed since the last run, reuse its digests
+            signatures.update({url: sig for url, sig in old_pages.items() if url.startswith(prefix)})
+            continue
+        for doc in db[collection].find(query, fields):
+            signatures[f"{prefix}{doc['_id']}"] = _digest(doc)
+    return signatures
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    # the web server never sees a half written file
+    os.replace(tmp, path)
+
+
+def _load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def generate(out_dir, full=False):
+    # Returns {'rendered': [urls], 'removed': [urls], 'unchanged': n}
+    db = get_db_connection()
+    previous = {} if full else _load_manifest(out_dir)
+    state = current_state(db)
+    signatures = page_signatures(db, state, previous)
+    old_pages = previous.get('pages', {})
+
+    rendered, failed = [], []
+    client = app.test_client()
+    for url, signature in signatures.items():
+        path = os.path.join(out_dir, output_path(url))
+        if old_pages.get(url) == signature and os.path.exists(path):
+            continue
+        # A fresh app context per page, so nothing cached on `g` (the content versions)
+        # leaks in from whatever context generate() was called in
+        with app.app_context():
+            response = client.get(url)
+        if response.status_code != 200:
+            failed.append(url)
+            continue
+        _write(path, response.get_data())
+        rendered.append(url)
+    for url in failed:
+        # leave those to the app, and try again next run
+        signatures.pop(url)
+
+    removed = [url for url in old_pages if url not in signatures]
+    for url in removed:
+        try:
+            os.remove(os.path.join(out_dir, output_path(url)))
+        except FileNotFoundError:
+            pass
+
+    static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    shutil.copytree(static_dir, os.path.join(out_dir, 'static'), dirs_exist_ok=True)
+    _write(os.path.join(out_dir, MANIFEST), json.dumps({'state': state, 'pages': signatures}).encode())
+    return {'rendered': rendered, 'removed': removed, 'unchanged': len(signatures) - len(rendered)}
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Pre-render the public pages into a directory of static files')
+    parser.add_argument('out_dir')
+    parser.add_argument('--full', action='store_true', help='ignore the manifest and render every page')
+    parser.add_argument('--watch', type=float, metavar='SECONDS',
+                        help='keep running, checking for changes every SECONDS')
+    args = parser.parse_args()
+    while True:
+        result = generate(args.out_dir, full=args.full)
+        if result['rendered'] or result['removed'] or not args.watch:
+            print(f"{len(result['rendered'])} pages rendered, {len(result['removed'])} removed, "
+                  f"{result['unchanged']} unchanged")
+        if not args.watch:
+            sys.exit()
+        args.full = False
+        time.sleep(args.watch)
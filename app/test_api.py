@@ -0,0 +1,65 @@
+from datetime import datetime
+from bson import ObjectId
+from app import get_db_connection, page_cache
+import api
+import event_stats
+
+
+def add_event(db, title, day, **fields):
+    event = {'title': title, 'venue': 'Warehouse', 'link': 'example.com', 'organisers': 'Crew',
+             'start_datetime': datetime(2099, 1, day, 10), 'end_datetime': datetime(2099, 1, day, 12),
+             'tags': ['techno'], 'artists': []}
+    event.update(fields)
+    db.events.insert_one(event)
+
+
+def test_events_page_with_cursor_and_fields(client):
+    db = get_db_connection()
+    for day in range(1, 6):
+        add_event(db, f'Event {day}', day)
+    add_event(db, 'Elsewhere', 6, venue='Club')
+    first = client.get('/api/v1/events?limit=2&fields=title&venue=warehouse')
+    assert first.headers['Access-Control-Allow-Origin'] == '*'
+    body = first.get_json()
+    assert [e['title'] for e in body['data']] == ['Event 1', 'Event 2']
+    assert set(body['data'][0]) == {'_id', 'title'}
+    titles = []
+    cursor = body['next_cursor']
+    while cursor:
+        body = client.get('/api/v1/events', query_string={'limit': 2, 'venue': 'warehouse', 'after': cursor}).get_json()
+        titles += [e['title'] for e in body['data']]
+        cursor = body['next_cursor']
+    assert titles == ['Event 3', 'Event 4', 'Event 5']
+
+    full = client.get('/api/v1/events?to=2099-01-01').get_json()['data'][0]
+    assert full['start_datetime'] == '2099-01-01T10:00:00Z'
+    assert client.get('/api/v1/events?fields=password').status_code == 400
+    bad = client.get('/api/v1/events?after=yesterday')
+    assert bad.status_code == 400 and 'Invalid cursor' in bad.get_data(as_text=True)
+
+
+def test_artists_venues_organisers_and_caching(client):
+    db = get_db_connection()
+    db.Artists.insert_many([{'name': n, 'name_key': n.lower(), 'description': '', 'tags': '', 'links': []}
+                            for n in ['Cee', 'Ay', 'Bee']])
+    db.venues.insert_one({'name': 'Club', 'location': 'CBD'})
+    add_event(db, 'One', 1, organisers='Zed')
+    add_event(db, 'Two', 2, organisers='Crew')
+    event_stats.rebuild(db)
+
+    first = client.get('/api/v1/artists?limit=2&fields=name').get_json()
+    assert [a['name'] for a in first['data']] == ['Ay', 'Bee']
+    rest = client.get('/api/v1/artists', query_string={'after': first['next_cursor']}).get_json()
+    assert [a['name'] for a in rest['data']] == ['Cee'] and rest['next_cursor'] is None
+    assert client.get('/api/v1/venues').get_json()['data'][0]['location'] == 'CBD'
+    assert client.get('/api/v1/organisers?limit=1').get_json() == {'data': ['Crew'], 'next_cursor': 'Crew'}
+
+    client.get('/api/v1/venues')
+    assert page_cache.stats()['routes']['api_venues'] == {'hits': 1, 'misses': 1}
+
+
+def test_encoders_agree(monkeypatch):
+    payload = {'_id': ObjectId('0123456789ab0123456789ab'), 'when': datetime(2099, 1, 1, 10, 30, 0, 5000), 'name': 'Café'}
+    fast = api.dumps(payload)
+    monkeypatch.setattr(api, 'orjson', None)
+    assert api.dumps(payload) == fast
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+import app as app_module
+from app import get_db_connection
+import archive
+
+
+def add_events(db, count, days_ago_start):
+    now = datetime.utcnow()
+    db.events.insert_many([{
+        'title': f'Gig {days_ago_start + i}', 'venue': 'V', 'link': '', 'organisers': '', 'tags': [],
+        'artists': [], 'search_tokens': ['gig'],
+        'start_datetime': now - timedelta(days=days_ago_start + i, hours=4),
+        'end_datetime': now - timedelta(days=days_ago_start + i)} for i in range(count)])
+
+
+def past_titles(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'PAGE_SIZE', 3)
+    titles, cursor = [], None
+    while True:
+        page = client.get('/past', query_string={'after': cursor} if cursor else {}).get_data(as_text=True)
+        titles += [line.split('>Gig ')[1].split('<')[0] for line in page.splitlines() if '>Gig ' in line]
+        if '?after=' not in page:
+            return titles
+        cursor = page.split('?after=')[1].split('"')[0].replace('%7C', '|').replace('%3A', ':')
+
+
+def test_archive_moves_old_events_and_past_pages_span_both_tiers(client, monkeypatch):
+    db = get_db_connection()
+    add_events(db, 4, 1)      # days 1-4, stay live
+    add_events(db, 5, 400)    # days 400-404, archived
+    before = past_titles(client, monkeypatch)
+    assert archive.archive_events(db, days=365, batch_size=2) == 5
+    assert db.events.count_documents({}) == 4
+    assert db.events_archive.count_documents({}) == 5
+    assert archive.archive_events(db, days=365) == 0
+
+    app_module.page_cache.clear()
+    assert past_titles(client, monkeypatch) == before
+    assert before == [str(d) for d in list(range(1, 5)) + list(range(400, 405))]
+
+    found = client.post('/past', data={'search': 'gig'}).get_data(as_text=True)
+    assert 'Gig 404' in found and 'Gig 1<' in found
+    old = db.events_archive.find_one()
+    assert client.get(f"/ics/{old['_id']}").status_code == 200
+
+
+def test_past_pages_merge_tiers_by_start(client, monkeypatch):
+    db = get_db_connection()
+    add_events(db, 2, 1)
+    add_events(db, 2, 400)
+    archive.archive_events(db, days=365)
+    # a residency that started long ago but only just ended stays live, while sorting
+    # after the archived gigs
+    now = datetime.utcnow()
+    db.events.insert_one({'title': 'Gig 900', 'venue': 'V', 'link': '', 'organisers': '', 'tags': [],
+                          'artists': [], 'search_tokens': ['gig'], 'start_datetime': now - timedelta(days=900),
+                          'end_datetime': now - timedelta(days=1)})
+    expected = ['1', '2', '400', '401', '900']
+    assert past_titles(client, monkeypatch) == expected
+    found = client.post('/past', data={'search': 'gig'}).get_data(as_text=True)
+    positions = [found.index(f'>Gig {title}<') for title in expected]
+    assert positions == sorted(positions)
+
+
+def test_collection_sizes_report(client):
+    db = get_db_connection()
+    add_events(db, 2, 400)
+    before = archive.collection_sizes(db)
+    archive.archive_events(db)
+    after = archive.collection_sizes(db)
+    assert (before['events']['count'], after['events']['count'], after['events_archive']['count']) == (2, 0, 2)
+    assert 'events: 2 -> 0 documents' in archive.report(before, after)
+
+
+def test_past_first_pages_leave_the_archive_alone(client, monkeypatch):
+    db = get_db_connection()
+    add_events(db, 4, 1)
+    add_events(db, 2, 400)
+    archive.archive_events(db, days=365)
+    reads = []
+    real_fetch = app_module.fetch_event_page
+
+    def fetch(db, query, **kwargs):
+        reads.append(kwargs.get('collection') is not None)
+        return real_fetch(db, query, **kwargs)
+
+    monkeypatch.setattr(app_module, 'fetch_event_page', fetch)
+    assert past_titles(client, monkeypatch) == ['1', '2', '3', '4', '400', '401']
+    # the first page is all newer than anything archived, the second one runs short
+    assert reads == [False, False, True]
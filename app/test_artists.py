@@ -1,24 +1,4 @@
-import pytest
-from flask import Flask
-from app import app as flask_app, get_db_connection
-import mongomock
-import os
-import tempfile
-
-@pytest.fixture
-def client(monkeypatch):
-    # Use mongomock for MongoDB
-    mock_client = mongomock.MongoClient()
-    db = mock_client['testdb']
-    monkeypatch.setenv('DB_URL', 'mongodb://localhost')
-    monkeypatch.setenv('DB_NAME', 'testdb')
-    # Patch get_db_connection to use mongomock via app.db_override
-    from app import app as real_app
-    real_app.db_override = db
-    real_app.config['TESTING'] = True
-    with real_app.test_client() as client:
-        yield client
-    real_app.db_override = None
+from app import get_db_connection
 
 def test_artist_added_on_event_creation(client):
     # Post a new event with a new artist
@@ -80,3 +60,66 @@ def test_artists_page_table(client):
     assert html.count('edit this entry') >= 1
     # Sorted order
     assert html.index('Alpha') < html.index('Bravo') < html.index('Charlie')
+
+def test_artist_link_follows_bio_edits(client):
+    db = get_db_connection()
+    client.post('/createEvent', data={
+        'title': 'Linked Event',
+        'organisers': 'Org3',
+        'venue': 'Venue3',
+        'link': 'http://example.com',
+        'start_datetime': '2099-06-10T20:00',
+        'end_datetime': '2099-06-10T22:00',
+        'tags': '',
+        'artists': 'Sun Araw'
+    })
+    artist = db.Artists.find_one({'name_key': 'sun araw'})
+    artist_url = f"/artist/{artist['_id']}"
+    # No bio yet, so no link (and that answer is now cached)
+    assert artist_url not in client.get('/').data.decode()
+    client.post(f"{artist_url}/edit", data={'description': 'Drone from LA'})
+    assert artist_url in client.get('/').data.decode()
+
+def test_upsert_artists_reports_new_artists_once(client):
+    from artist_store import upsert_artists
+    db = get_db_connection()
+    db.Artists.insert_one({'name': 'Sun Araw', 'name_key': 'sun araw', 'description': 'x', 'tags': ''})
+    created = upsert_artists(db, ['sun araw', 'New One', ' new one ', 'Other'])
+    assert sorted(created) == ['New One', 'Other']
+    assert db.Artists.count_documents({}) == 3
+    assert db.Artists.find_one({'name_key': 'sun araw'})['description'] == 'x'
+    assert upsert_artists(db, ['Other']) == []
+
+def test_upsert_artists_counts_artists_created_before_a_lost_race(client, monkeypatch):
+    import mongomock
+    from pymongo.errors import BulkWriteError
+    from artist_store import upsert_artists
+    db = get_db_connection()
+    real_bulk_write = mongomock.Collection.bulk_write
+    calls = []
+
+    def racing_bulk_write(self, operations, **kwargs):
+        calls.append(len(operations))
+        if len(calls) > 1:
+            return real_bulk_write(self, operations, **kwargs)
+        # 'New One' goes in, a concurrent request beat this one to 'Other'
+        result = real_bulk_write(self, operations[:1], **kwargs)
+        self.insert_one({'name': 'Other', 'name_key': 'other'})
+        raise BulkWriteError({'writeErrors': [{'index': 1, 'code': 11000, 'errmsg': 'duplicate key'}],
+                              'upserted': [{'index': 0, '_id': result.upserted_ids[0]}]})
+
+    monkeypatch.setattr(mongomock.Collection, 'bulk_write', racing_bulk_write)
+    assert upsert_artists(db, ['New One', 'Other']) == ['New One']
+    assert calls == [2, 2]
+
+def test_artist_links_follow_the_artists_version(client):
+    # another worker edits the bio: this process's cache must not outlive the version bump
+    import content_version
+    from artist_store import artist_links
+    db = get_db_connection()
+    db.Artists.insert_one({'name': 'Sun Araw', 'name_key': 'sun araw', 'description': ''})
+    assert artist_links.lookup(db, ['sun araw']) == {'sun araw': None}
+    db.Artists.update_one({'name_key': 'sun araw'}, {'$set': {'description': 'Drone'}})
+    assert artist_links.lookup(db, ['sun araw']) == {'sun araw': None}
+    content_version.bump(db, 'Artists')
+    assert artist_links.lookup(db, ['sun araw'])['sun araw']
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+from app import get_db_connection
+import event_stats
+
+
+def login(client):
+    with client.session_transaction() as session:
+        session['admin'] = True
+
+
+def create(client, title, days=1, **fields):
+    start = datetime.now() + timedelta(days=days)
+    data = {'title': title, 'organisers': '', 'venue': 'Warehouse', 'link': '', 'tags': 'techno',
+            'artists': '', 'start_datetime': start.strftime('%Y-%m-%dT%H:%M'),
+            'end_datetime': (start + timedelta(hours=2)).strftime('%Y-%m-%dT%H:%M')}
+    data.update(fields)
+    client.post('/createEvent', data=data)
+
+
+def test_dashboard_pages_and_filters(client, monkeypatch):
+    import app as app_module
+    monkeypatch.setattr(app_module, 'PAGE_SIZE', 2)
+    login(client)
+    for i in range(3):
+        create(client, f'Gig {i}', days=i + 1)
+    create(client, 'Elsewhere', venue='Club')
+    page = client.get('/admin/dashboard?venue=warehouse').get_data(as_text=True)
+    assert 'Gig 0' in page and 'Gig 1' in page and 'Gig 2' not in page and 'Next page' in page
+    cursor = page.split('after=')[1].split('&')[0].split('"')[0]
+    second = client.get(f'/admin/dashboard?venue=warehouse&after={cursor}').get_data(as_text=True)
+    assert 'Gig 2' in second and 'Elsewhere' not in second
+    assert 'Elsewhere' in client.get('/admin/dashboard?q=elsew').get_data(as_text=True)
+
+
+def test_bulk_delete_and_rewrites(client):
+    db = get_db_connection()
+    login(client)
+    create(client, 'One', tags='Techno, house')
+    create(client, 'Two', tags='techno')
+    create(client, 'Three', venue='Old Pub')
+    ids = [str(e['_id']) for e in db.events.find({'title': {'$in': ['One', 'Three']}})]
+
+    response = client.post('/admin/bulk', data={'action': 'tag', 'old': 'TECHNO', 'new': 'Techno',
+                                               'return_to': '/admin/dashboard?venue=Warehouse'})
+    assert response.headers['Location'].endswith('/admin/dashboard?venue=Warehouse')
+    assert db.events.find_one({'title': 'One'})['tags'] == ['Techno', 'house']
+    client.post('/admin/bulk', data={'action': 'venue', 'old': 'old pub', 'new': 'New Pub'})
+    assert db.events.find_one({'title': 'Three'})['venue'] == 'New Pub'
+    assert 'pub' in db.events.find_one({'title': 'Three'})['search_tokens']
+
+    client.post('/admin/bulk', data={'action': 'delete', 'ids': ids})
+    assert [e['title'] for e in db.events.find()] == ['Two']
+    assert 'deleted' in client.get('/admin/dashboard').get_data(as_text=True)
+    venues = {row['key']: row['upcoming'] for row in event_stats.summary(db, 'venue')}
+    assert venues == {'warehouse': 1}
+    assert client.post('/admin/bulk', data={'action': 'venue', 'new': ''}).status_code == 400
+
+
+def test_rewrites_reach_events_with_string_dates(client):
+    db = get_db_connection()
+    login(client)
+    create(client, 'New', tags='techno')
+    db.events.insert_one({'title': 'Old', 'venue': 'Warehouse', 'tags': ['techno'], 'artists': [],
+                          'start_datetime': '2020-01-01T20:00', 'end_datetime': '2020-01-01T23:00'})
+    response = client.post('/admin/bulk', data={'action': 'tag', 'old': 'techno', 'new': 'Techno'})
+    assert response.status_code == 302
+    assert [e['tags'] for e in db.events.find().sort('title')] == [['Techno'], ['Techno']]
+    assert 'fingerprint' not in db.events.find_one({'title': 'Old'})
+
+
+def test_merge_duplicate_artists(client):
+    db = get_db_connection()
+    login(client)
+    create(client, 'One', artists='Sun Araw, Other')
+    create(client, 'Two', artists='SunAraw')
+    db.Artists.update_one({'name': 'SunAraw'}, {'$set': {'description': 'Drone', 'links': ['x.com']}})
+    client.post('/admin/bulk', data={'action': 'merge_artists', 'keep': 'sun araw', 'duplicates': 'Sunaraw'})
+    assert sorted(a['name'] for a in db.Artists.find()) == ['Other', 'Sun Araw']
+    assert db.Artists.find_one({'name': 'Sun Araw'})['description'] == 'Drone'
+    assert [e['artists'] for e in db.events.find().sort('title')] == [['Sun Araw', 'Other'], ['Sun Araw']]
+    assert client.post('/admin/bulk', data={'action': 'merge_artists', 'keep': 'Nobody',
+                                            'duplicates': 'x'}).status_code == 400
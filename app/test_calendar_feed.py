@@ -0,0 +1,50 @@
+from datetime import datetime
+from app import get_db_connection
+
+
+def add_event(db, title, start, **fields):
+    event = {'title': title, 'venue': 'Warehouse', 'link': 'example.com', 'organisers': 'Crew',
+             'start_datetime': start, 'end_datetime': start.replace(hour=23), 'tags': [], 'artists': []}
+    event.update(fields)
+    return db.events.insert_one(event).inserted_id
+
+
+def test_feed_filters_and_streams_every_match(client):
+    db = get_db_connection()
+    add_event(db, 'Techno, night; 1', datetime(2099, 1, 1, 10), tags=['Techno'], artists=['DJ One'])
+    add_event(db, 'House night', datetime(2099, 1, 2, 10), tags=['house'])
+    add_event(db, 'Techno elsewhere', datetime(2099, 1, 3, 10), tags=['techno'], venue='Club')
+    add_event(db, 'Old techno', datetime(2000, 1, 1, 10), tags=['techno'])
+
+    response = client.get('/calendar.ics')
+    assert response.is_streamed and response.mimetype == 'text/calendar'
+    assert response.data.count(b'BEGIN:VEVENT') == 3
+    assert rb'SUMMARY:Techno\, night\; 1' in response.data
+
+    body = client.get('/calendar.ics?tag=techno&venue=warehouse').data
+    assert body.count(b'BEGIN:VEVENT') == 1
+    assert client.get('/calendar.ics?artist=dj one').data.count(b'BEGIN:VEVENT') == 1
+    assert client.get('/calendar.ics?tag=techno&tag=house&to=2099-01-02').data.count(b'BEGIN:VEVENT') == 2
+    assert client.get('/calendar.ics?from=1999-12-31&to=2000-01-01').data.count(b'BEGIN:VEVENT') == 1
+    assert client.get('/calendar.ics?from=yesterday').status_code == 400
+
+
+def test_feed_is_cached_revalidated_and_invalidated(client):
+    from app import page_cache
+    db = get_db_connection()
+    add_event(db, 'First', datetime(2099, 1, 1, 10))
+    first = client.get('/calendar.ics?venue=Warehouse')
+    assert b'SUMMARY:First' in first.data
+    assert client.get('/calendar.ics?venue=Warehouse',
+                      headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+    assert b'SUMMARY:First' in client.get('/calendar.ics?venue=Warehouse').data
+    assert page_cache.stats()['routes']['calendar_feed'] == {'hits': 1, 'misses': 1}
+
+    with client.session_transaction() as session:
+        session['admin'] = True
+    client.post('/createEvent', data={
+        'title': 'Second', 'organisers': '', 'venue': 'Warehouse', 'link': '', 'tags': '', 'artists': '',
+        'start_datetime': '2099-02-01T20:00', 'end_datetime': '2099-02-01T23:00'})
+    again = client.get('/calendar.ics?venue=Warehouse', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 200
+    assert b'SUMMARY:Second' in again.data
@@ -0,0 +1,48 @@
+from datetime import datetime
+from app import get_db_connection
+
+
+def test_front_page_revalidates_with_etag(client):
+    first = client.get('/')
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'public, max-age=60'
+    etag = first.headers['ETag']
+    again = client.get('/', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+
+
+def test_ics_revalidates_until_the_event_changes(client):
+    db = get_db_connection()
+    event_id = db.events.insert_one({
+        'title': 'Gig', 'venue': 'Venue', 'link': 'example.com', 'organisers': '',
+        'start_datetime': datetime(2099, 1, 1, 9), 'end_datetime': datetime(2099, 1, 1, 12),
+        'tags': [], 'artists': []
+    }).inserted_id
+    first = client.get(f'/ics/{event_id}')
+    assert b'SUMMARY:Gig' in first.data
+    assert client.get(f'/ics/{event_id}', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+    with client.session_transaction() as session:
+        session['admin'] = True
+    client.post(f'/admin/edit/{event_id}', data={
+        'title': 'Gig (moved)', 'organisers': '', 'venue': 'Venue', 'link': 'example.com',
+        'start_datetime': '2099-01-02T20:00', 'end_datetime': '2099-01-02T23:00', 'tags': '', 'artists': ''
+    })
+    changed = client.get(f'/ics/{event_id}', headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    assert b'SUMMARY:Gig (moved)' in changed.data
+
+
+def test_if_modified_since_after_a_write(client):
+    with client.session_transaction() as session:
+        session['admin'] = True
+    client.post('/createVenue', data={'name': 'V', 'description': '', 'location': '', 'contact': '', 'link': ''})
+    client.post('/createEvent', data={
+        'title': 'Gig', 'organisers': '', 'venue': 'V', 'link': 'example.com',
+        'start_datetime': '2099-01-01T20:00', 'end_datetime': '2099-01-01T23:00', 'tags': '', 'artists': 'A'
+    })
+    first = client.get('/artists')
+    assert 'Last-Modified' in first.headers
+    again = client.get('/artists', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert again.status_code == 304
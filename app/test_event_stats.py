@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+from app import get_db_connection
+import event_stats
+
+
+def login(client):
+    with client.session_transaction() as session:
+        session['admin'] = True
+
+
+def form(title, start, **fields):
+    data = {'title': title, 'organisers': 'Crew', 'venue': 'Warehouse', 'link': '', 'tags': 'techno',
+            'artists': '', 'start_datetime': start.strftime('%Y-%m-%dT%H:%M'),
+            'end_datetime': (start + timedelta(hours=3)).strftime('%Y-%m-%dT%H:%M')}
+    data.update(fields)
+    return data
+
+
+def test_writes_keep_stats_in_step_with_a_rebuild(client):
+    db = get_db_connection()
+    login(client)
+    soon = datetime.now() + timedelta(days=2)
+    client.post('/createEvent', data=form('One', soon, tags='Techno, house'))
+    client.post('/createEvent', data=form('Two', soon, venue='Club'))
+    client.post('/createEvent', data=form('Old', datetime(2020, 5, 1, 20)))
+    two = db.events.find_one({'title': 'Two'})
+    client.post(f"/admin/edit/{two['_id']}", data=form('Two', soon, venue='Warehouse', organisers='Other'))
+    client.post(f"/admin/delete/{db.events.find_one({'title': 'One'})['_id']}")
+
+    tags = {row['key']: row for row in event_stats.summary(db, 'tag')}
+    assert (tags['techno']['upcoming'], tags['techno']['past']) == (1, 1)
+    assert 'house' not in tags
+    assert tags['techno']['last'] == soon.strftime('%Y-%m-%d')
+    assert [r['name'] for r in event_stats.summary(db, 'organiser')] == ['Crew', 'Other']
+
+    incremental = {doc['_id']: {d: n for d, n in doc['days'].items() if n}
+                   for doc in db.event_stats.find() if any(doc['days'].values())}
+    event_stats.rebuild(db)
+    assert incremental == {doc['_id']: doc['days'] for doc in db.event_stats.find()}
+
+
+def test_pages_and_listing_facets(client):
+    db = get_db_connection()
+    login(client)
+    soon = datetime.now() + timedelta(days=1)
+    client.post('/createEvent', data=form('Techno gig', soon))
+    client.post('/createEvent', data=form('Folk gig', soon, tags='folk', venue='Pub'))
+    db.venues.insert_one({'name': 'warehouse'})
+
+    page = client.get('/').get_data(as_text=True)
+    assert '?tag=folk' in page and soon.strftime('%Y-%m-%d') in page
+    filtered = client.get('/?tag=folk').get_data(as_text=True)
+    assert 'Folk gig' in filtered and 'Techno gig' not in filtered
+    assert 'Techno gig' in client.get('/?venue=Warehouse').get_data(as_text=True)
+    assert client.get('/?from=soon').status_code == 400
+    assert 'folk' in client.get('/tags').get_data(as_text=True)
+    assert '<td>Crew</td>' in client.get('/organisers').get_data(as_text=True)
+    assert '?venue=warehouse' in client.get('/venues').get_data(as_text=True)
+
+
+def test_string_dated_events_can_be_edited_and_deleted(client):
+    # left as strings by migrate_datetimes when they don't parse, never counted
+    db = get_db_connection()
+    login(client)
+    legacy = {'title': 'Legacy', 'organisers': '', 'venue': 'Warehouse', 'link': '', 'tags': ['techno'],
+              'artists': [], 'start_datetime': 'Friday night', 'end_datetime': 'late'}
+    edited_id = db.events.insert_one(dict(legacy)).inserted_id
+    deleted_id = db.events.insert_one(dict(legacy)).inserted_id
+    soon = datetime.now() + timedelta(days=2)
+    assert client.post(f"/admin/edit/{edited_id}", data=form('Fixed', soon)).status_code == 302
+    assert client.post(f"/admin/delete/{deleted_id}").status_code == 302
+    assert [e['title'] for e in db.events.find()] == ['Fixed']
+    venues = {row['key']: row['upcoming'] for row in event_stats.summary(db, 'venue')}
+    assert venues == {'warehouse': 1}
+
+
+def test_admin_edit_upsert_stamps_creation(client):
+    from bson import ObjectId
+    db = get_db_connection()
+    login(client)
+    event_id = ObjectId()
+    client.post(f"/admin/edit/{event_id}", data=form('Brand new', datetime.now() + timedelta(days=2)))
+    event = db.events.find_one({'_id': event_id})
+    assert event['created_at'] == event['updated_at']
+    client.post(f"/admin/edit/{event_id}", data=form('Renamed', datetime.now() + timedelta(days=2)))
+    assert db.events.find_one({'_id': event_id})['created_at'] == event['created_at']
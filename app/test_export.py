@@ -0,0 +1,32 @@
+import gzip
+import json
+from app import get_db_connection
+
+
+def login(client):
+    with client.session_transaction() as session:
+        session['admin'] = True
+
+
+def test_export_streams_every_collection_in_seed_format(client):
+    db = get_db_connection()
+    db.events.insert_many([{'title': f'Event {i}', 'tags': []} for i in range(3)])
+    db.Artists.insert_one({'name': 'Sun Araw'})
+    db.subscribers.insert_one({'email': 'a@example.com', 'search_terms': ['techno']})
+    login(client)
+    response = client.get('/admin/export_db')
+    assert response.is_streamed
+    data = json.loads(response.data)
+    assert set(data) == {'events', 'Artists', 'subscribers'}
+    assert len(data['events']) == 3
+    assert isinstance(data['Artists'][0]['_id'], str)
+
+
+def test_export_ndjson_gzip(client):
+    db = get_db_connection()
+    db.venues.insert_many([{'name': 'A'}, {'name': 'B'}])
+    login(client)
+    response = client.get('/admin/export_db?format=ndjson&collection=venues&gzip=1')
+    lines = gzip.decompress(response.data).decode().splitlines()
+    assert [json.loads(line)['name'] for line in lines] == ['A', 'B']
+    assert client.get('/admin/export_db?format=ndjson').status_code == 400
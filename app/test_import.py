@@ -0,0 +1,89 @@
+import io
+import json
+import mongomock
+from app import get_db_connection
+import event_import
+from indexes import create_indexes
+
+
+def login(client):
+    with client.session_transaction() as session:
+        session['admin'] = True
+
+
+ROW = {'title': 'Rave', 'start_datetime': '2030-01-01T20:00', 'end_datetime': '2030-01-02T02:00',
+       'organisers': 'Crew', 'venue': 'Warehouse', 'link': 'x.com', 'tags': 'techno', 'artists': 'DJ One, DJ Two'}
+
+
+def test_import_dedupes_and_reports_each_row(client):
+    db = get_db_connection()
+    rows = [ROW, dict(ROW, title='  rave '), dict(ROW, end_datetime='2029-01-01T00:00'),
+            dict(ROW, title='Other', artists=['DJ Two', 'DJ Three'])]
+    result = event_import.import_events(db, rows, batch_size=1)
+    assert [r['status'] for r in result['rows']] == ['inserted', 'duplicate', 'invalid', 'inserted']
+    assert result['rows'][2]['error'] == "End datetime must be after start datetime"
+    assert sorted(result['created_artists']) == ['DJ One', 'DJ Three', 'DJ Two']
+    assert db.events.count_documents({}) == 2
+    # running it again finds everything already in the database
+    again = event_import.import_events(db, [ROW])
+    assert again['duplicates'] == 1 and again['inserted'] == 0
+
+
+def test_import_reads_exports_and_reports_bad_rows(client):
+    db = get_db_connection()
+    # what /export writes: UTC $date values, plus rows that aren't events at all
+    export = json.dumps({'events': [dict(ROW, _id={'$oid': '65a000000000000000000001'},
+                                         start_datetime={'$date': '2030-01-01T09:00:00.000Z'},
+                                         end_datetime={'$date': '2030-01-01T15:00:00.000Z'}),
+                                    'Rave', dict(ROW, start_datetime={'when': 'soon'}), dict(ROW, title=['Rave'])]})
+    result = event_import.import_events(db, event_import.read_rows(io.StringIO(export), 'json'))
+    assert [r['status'] for r in result['rows']] == ['inserted', 'invalid', 'invalid', 'invalid']
+    assert result['rows'][1]['error'] == "Row is not an object"
+    # 09:00 UTC is 20:00 in Melbourne, the same gig as ROW
+    assert db.events.find_one()['start_datetime'].isoformat() == '2030-01-01T09:00:00'
+    assert event_import.import_events(db, [ROW])['duplicates'] == 1
+
+
+def test_import_counts_unique_index_rejections_as_duplicates(client, monkeypatch):
+    db = get_db_connection()
+    create_indexes(db, 'events')
+    event_import.import_events(db, [ROW])
+    # another import inserted the gig after this one checked for it
+    monkeypatch.setattr(mongomock.Collection, 'find', lambda self, *args, **kwargs: iter([]))
+    result = event_import.import_events(db, [ROW, dict(ROW, title='Other')])
+    assert [r['status'] for r in result['rows']] == ['duplicate', 'inserted']
+    assert db.events.count_documents({}) == 2
+
+
+def test_admin_import_csv_upload(client):
+    login(client)
+    csv_file = ','.join(ROW) + '\n' + ','.join(f'"{v}"' for v in ROW.values()) + '\n'
+    response = client.post('/admin/import', data={'file': (io.BytesIO(csv_file.encode()), 'events.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert response.get_json()['inserted'] == 1
+    event = get_db_connection().events.find_one()
+    assert event['artists'] == ['DJ One', 'DJ Two'] and event['fingerprint']
+    assert 'Rave' in client.get('/').get_data(as_text=True)
+
+
+def test_admin_import_ndjson_needs_login(client):
+    body = json.dumps(ROW) + '\n'
+    data = {'file': (io.BytesIO(body.encode()), 'events.ndjson')}
+    assert client.post('/admin/import', data=data, content_type='multipart/form-data').status_code == 302
+
+
+def test_form_and_admin_edit_refuse_duplicate_gigs(client):
+    db = get_db_connection()
+    create_indexes(db, 'events')
+    form = dict(ROW, start_datetime='2030-01-01T20:00', end_datetime='2030-01-02T02:00')
+    assert client.post('/createEvent', data=form).status_code == 302
+    duplicate = client.post('/createEvent', data=dict(form, title=' RAVE '))
+    assert duplicate.status_code == 400 and duplicate.get_data(as_text=True) == "This event is already listed"
+    client.post('/createEvent', data=dict(form, title='Other'))
+    login(client)
+    other = db.events.find_one({'title': 'Other'})
+    edit = client.post(f"/admin/edit/{other['_id']}", data=form)
+    assert edit.status_code == 400
+    assert db.events.find_one({'_id': other['_id']})['title'] == 'Other'
+    assert db.events.count_documents({}) == 2
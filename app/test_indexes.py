@@ -0,0 +1,43 @@
+import mongomock
+from indexes import create_indexes, ensure_indexes, INDEXES, _plan_stages
+
+
+def test_ensure_indexes_is_idempotent_and_backfills_name_key():
+    db = mongomock.MongoClient()['testdb']
+    db.Artists.insert_one({'name': '  Sun  Araw '})
+    first = ensure_indexes(db)
+    assert ensure_indexes(db) == first
+    assert len(first) == sum(len(v) for v in INDEXES.values())
+    assert db.Artists.find_one()['name_key'] == 'sun araw'
+
+
+def test_duplicate_artists_fall_back_to_a_plain_index(caplog):
+    db = mongomock.MongoClient()['testdb']
+    db.Artists.insert_many([{'name_key': 'sun araw'}, {'name_key': 'sun araw'}])
+    assert create_indexes(db, 'Artists') == ['Artists.name_key']
+    assert not db.Artists.index_information()['name_key'].get('unique')
+    assert 'Duplicate keys in Artists.name_key' in caplog.text
+
+
+def test_plan_stages_finds_index_scans():
+    plan = {'stage': 'LIMIT', 'inputStage': {'stage': 'FETCH', 'inputStage': {
+        'stage': 'IXSCAN', 'indexName': 'start_id_end'}}}
+    assert ('IXSCAN', 'start_id_end') in _plan_stages(plan)
+
+
+def test_startup_fingerprints_migrated_legacy_duplicates_once(client, caplog):
+    from app import get_db_connection, prepare_database
+    import event_import
+    db = get_db_connection()
+    legacy = {'title': 'Rave', 'venue': 'Warehouse', 'organisers': '', 'link': '', 'tags': [], 'artists': [],
+              'start_datetime': '2030-01-01T20:00', 'end_datetime': '2030-01-02T02:00'}
+    db.events.insert_many([dict(legacy), dict(legacy), dict(legacy, title='Other')])
+    prepare_database()
+    events = list(db.events.find().sort('_id'))
+    assert [bool(e.get('fingerprint')) for e in events] == [True, False, True]
+    assert str(events[1]['_id']) in caplog.text
+    assert db.events.index_information()['fingerprint'].get('unique')
+    assert db.event_stats.count_documents({}) > 0
+    # imports still run, and see the gig as already listed
+    row = dict(legacy, start_datetime='2030-01-01T20:00', end_datetime='2030-01-02T02:00')
+    assert event_import.import_events(db, [row])['duplicates'] == 1
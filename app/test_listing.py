@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+import app as app_module
+from app import get_db_connection
+
+
+def make_events(db, count, start, step):
+    db.events.insert_many([{
+        'start_datetime': start + step * i,
+        'end_datetime': start + step * i + timedelta(hours=3),
+        'title': f'Event {i:03d}',
+        'organisers': 'Org',
+        'venue': 'Venue',
+        'link': 'example.com',
+        'tags': ['techno'],
+        'artists': []
+    } for i in range(count)])
+
+
+def test_upcoming_pages_with_cursor(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'PAGE_SIZE', 5)
+    make_events(get_db_connection(), 12, datetime.utcnow() + timedelta(days=2), timedelta(hours=1))
+    html = client.get('/').data.decode()
+    assert 'Event 000' in html and 'Event 004' in html
+    assert 'Event 005' not in html
+    assert 'Load more' in html
+
+    db = get_db_connection()
+    fifth = db.events.find_one({'title': 'Event 004'})
+    html = client.get('/', query_string={'after': app_module.encode_cursor(fifth)}).data.decode()
+    assert 'Event 004' not in html
+    assert 'Event 005' in html and 'Event 009' in html
+    assert 'Back to first page' in html
+
+
+def test_past_is_newest_first(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'PAGE_SIZE', 3)
+    make_events(get_db_connection(), 6, datetime.utcnow() - timedelta(days=30), timedelta(days=1))
+    html = client.get('/past').data.decode()
+    assert html.index('Event 005') < html.index('Event 004') < html.index('Event 003')
+    assert 'Event 002' not in html
+
+
+def test_form_times_are_stored_as_utc_and_shown_in_melbourne(client):
+    client.post('/createEvent', data={
+        'title': 'Summer Gig', 'organisers': '', 'venue': 'Venue', 'link': 'example.com',
+        'start_datetime': '2099-01-10T20:00', 'end_datetime': '2099-01-10T23:00', 'tags': '', 'artists': ''
+    })
+    event = get_db_connection().events.find_one({'title': 'Summer Gig'})
+    # Melbourne is UTC+11 in January
+    assert event['start_datetime'] == datetime(2099, 1, 10, 9, 0)
+    assert '(08:00PM)' in client.get('/').data.decode()
+    ics = client.get(f"/ics/{event['_id']}").data.decode()
+    assert 'DTSTART:20990110T090000Z' in ics
+
+
+def test_migrate_events_converts_string_dates():
+    import mongomock
+    from migrate_datetimes import migrate_events
+    db = mongomock.MongoClient()['testdb']
+    db.events.insert_many([
+        {'start_datetime': '2025-07-01T20:00', 'end_datetime': '2025-07-01T23:00'},
+        {'start_datetime': datetime(2025, 7, 2, 10), 'end_datetime': datetime(2025, 7, 2, 13)},
+        {'start_datetime': 'not a date', 'end_datetime': 'nope'},
+    ])
+    converted, failed = migrate_events(db, batch_size=1)
+    assert converted == 1 and len(failed) == 1
+    # Melbourne is UTC+10 in July
+    assert db.events.find_one({'end_datetime': datetime(2025, 7, 1, 13)})
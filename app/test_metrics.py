@@ -0,0 +1,61 @@
+import metrics
+
+
+def test_metrics_requires_admin_or_token(client, monkeypatch):
+    assert client.get('/metrics').status_code == 403
+    monkeypatch.setenv('METRICS_TOKEN', 'secret')
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+
+def test_requests_and_listing_phases_are_recorded(client):
+    client.get('/')
+    with client.session_transaction() as session:
+        session['admin'] = True
+    body = client.get('/metrics').data.decode()
+    assert 'naarm_http_request_duration_seconds_count{route="index",method="GET",status="200"}' in body
+    assert 'naarm_phase_duration_seconds_count{route="index",phase="render"}' in body
+    assert 'naarm_page_cache_misses_total' in body
+    assert '# TYPE naarm_mongo_pool_checkouts_total counter' in body
+    assert '# TYPE naarm_mongo_pool_in_use gauge' in body
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram('h', 'test', ('route',), buckets=(0.1, 1))
+    histogram.observe(0.05, 'a')
+    histogram.observe(0.5, 'a')
+    lines = histogram.render()
+    assert 'h_bucket{route="a",le="0.1"} 1' in lines
+    assert 'h_bucket{route="a",le="1"} 2' in lines
+    assert 'h_bucket{route="a",le="+Inf"} 2' in lines
+    assert 'h_count{route="a"} 2' in lines
+
+
+def test_metrics_dir_adds_up_every_worker(client, monkeypatch, tmp_path):
+    monkeypatch.setenv('METRICS_DIR', str(tmp_path))
+    monkeypatch.setitem(metrics._process, 'retired', False)
+    # another worker's file
+    metrics._write(str(tmp_path / '1-other.json'), {'naarm_slow_requests_total': ('counter', {('feed',): 2})})
+    before = metrics.slow_requests.snapshot().get(('feed',), 0)
+    metrics.slow_requests.inc('feed')
+    assert f'naarm_slow_requests_total{{route="feed"}} {before + 3}' in metrics.render()
+    # an exiting worker folds its counters into retired.json and removes its own file
+    metrics.retire()
+    assert sorted(p.name for p in tmp_path.glob('*.json')) == ['1-other.json', 'retired.json']
+    retired = metrics._read(str(tmp_path / 'retired.json'))
+    assert retired['naarm_slow_requests_total'][1][('feed',)] == before + 1
+    # gauges (pool connections in use) only count live workers
+    assert 'page_cache' in retired and 'mongo_pool' in retired and 'mongo_pool_gauges' not in retired
+
+
+def test_reap_folds_a_killed_workers_file(monkeypatch, tmp_path):
+    monkeypatch.setenv('METRICS_DIR', str(tmp_path))
+    metrics._write(str(tmp_path / '41-abc.json'), {
+        'naarm_slow_requests_total': ('counter', {('feed',): 2}),
+        'mongo_pool_gauges': ('gauge', {('naarm_mongo_pool_in_use',): 3}),
+    })
+    metrics._write(str(tmp_path / '42-def.json'), {'naarm_slow_requests_total': ('counter', {('feed',): 1})})
+    metrics.reap(41)
+    assert sorted(p.name for p in tmp_path.glob('*.json')) == ['42-def.json', 'retired.json']
+    retired = metrics._read(str(tmp_path / 'retired.json'))
+    assert retired == {'naarm_slow_requests_total': ('counter', {('feed',): 2})}
@@ -0,0 +1,22 @@
+import mongo_pool
+
+
+def test_client_is_shared_per_process(monkeypatch):
+    monkeypatch.setenv('DB_URL', 'mongodb://localhost:27017')
+    monkeypatch.setenv('MONGO_MAX_POOL_SIZE', '7')
+    mongo_pool.close_all()
+    client = mongo_pool.get_client()
+    assert mongo_pool.get_client() is client
+    assert client.options.pool_options.max_pool_size == 7
+    mongo_pool.close_all()
+
+
+def test_registry_is_reset_in_forked_child(monkeypatch):
+    monkeypatch.setenv('DB_URL', 'mongodb://localhost:27017')
+    mongo_pool.close_all()
+    client = mongo_pool.get_client()
+    # Pretend we are now running in a child process
+    monkeypatch.setattr(mongo_pool, '_pid', -1)
+    assert mongo_pool.get_client() is not client
+    client.close()
+    mongo_pool.close_all()
@@ -0,0 +1,33 @@
+import os
+from notes_store import NoteStore
+
+
+def write(path, text, mtime):
+    with open(path, 'w') as f:
+        f.write(text)
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_notes_are_parsed_once_and_reloaded_on_change(tmp_path, monkeypatch):
+    import notes_store
+    parsed = []
+    real_parse = notes_store.parse_note
+    monkeypatch.setattr(notes_store, 'parse_note', lambda name, text: parsed.append(name) or real_parse(name, text))
+
+    write(tmp_path / 'a.md', '---\ntitle: Older\ndate: 2024-01-01\ntags: Techno\n---\nhello', 1)
+    write(tmp_path / 'b.md', '---\ntitle: Newer\ndate: 2024-02-01\n---\n*world*', 1)
+    store = NoteStore(str(tmp_path), check_interval=0)
+    assert [n['metadata']['title'] for n in store.search()] == ['Newer', 'Older']
+    assert store.search('techno')[0]['metadata']['title'] == 'Older'
+    assert store.search('world')[0]['content'] == '<p><em>world</em></p>'
+    assert sorted(parsed) == ['a.md', 'b.md']
+
+    write(tmp_path / 'a.md', '---\ntitle: Edited\ndate: 2024-01-01\n---\nhello', 2)
+    (tmp_path / 'b.md').unlink()
+    assert [n['metadata']['title'] for n in store.search()] == ['Edited']
+    assert sorted(parsed) == ['a.md', 'a.md', 'b.md']
+
+
+def test_notes_page_renders(client):
+    html = client.get('/notes').data.decode()
+    assert 'My First Blog Post' in html
@@ -0,0 +1,34 @@
+from app import get_db_connection, page_cache
+
+
+def test_listing_is_cached_until_an_event_is_written(client):
+    client.get('/')
+    client.get('/')
+    assert page_cache.stats()['routes']['index'] == {'hits': 1, 'misses': 1}
+
+    client.post('/createEvent', data={
+        'title': 'Fresh Event',
+        'organisers': 'Org',
+        'venue': 'Venue',
+        'link': 'example.com',
+        'start_datetime': '2099-01-01T20:00',
+        'end_datetime': '2099-01-01T23:00',
+        'tags': '',
+        'artists': ''
+    })
+    assert 'Fresh Event' in client.get('/').data.decode()
+
+
+def test_direct_writes_are_not_seen_until_version_bumps(client):
+    from app import mark_changed
+    db = get_db_connection()
+    client.get('/venues')
+    db.venues.insert_one({'name': 'Sneaky Venue', 'description': '', 'location': '', 'contact': '', 'link': ''})
+    assert 'Sneaky Venue' not in client.get('/venues').data.decode()
+    mark_changed(db, 'venues')
+    assert 'Sneaky Venue' in client.get('/venues').data.decode()
+
+
+def test_search_posts_bypass_the_cache(client):
+    client.post('/', data={'search': 'anything'})
+    assert 'index' not in page_cache.stats()['routes']
@@ -0,0 +1,82 @@
+from datetime import datetime
+import io
+import json
+from bson import ObjectId
+from app import get_db_connection
+import restore
+
+BACKUP = '../db_data/naarm_list_backup_20250609_010607.json'
+
+
+def test_streamed_parse_matches_json_load():
+    with open(BACKUP) as f:
+        expected = json.load(f)
+    with open(BACKUP) as f:
+        docs = {}
+        # tiny chunks so documents straddle the buffer boundary
+        for collection, doc in restore.iter_backup(f, chunk_size=7):
+            docs.setdefault(collection, [])
+            if doc is not None:
+                docs[collection].append(doc)
+    assert docs == expected
+
+
+def test_full_restore_swaps_in_staged_collections(client):
+    db = get_db_connection()
+    db.events.insert_one({'title': 'Stale'})
+    db.venues.insert_one({'name': 'Stale venue'})
+    with open(BACKUP) as f:
+        report = restore.restore(db, f, workers=2, batch_size=20)
+    # the backup's empty venues array leaves the live venues alone
+    assert report == {'events': {'documents': 156}}
+    assert db.events.count_documents({}) == 156 and db.venues.count_documents({}) == 1
+    assert not [name for name in db.list_collection_names() if name.endswith(restore.STAGING_SUFFIX)]
+    event = db.events.find_one({'_id': ObjectId('67f35bbbf9f7a6e863cf848d')})
+    assert event['start_datetime'].isoformat() == '2025-05-03T12:00:00'
+    assert event['fingerprint'] and 'dystopian' in event['search_tokens']
+    assert 'start_id_end' in db.events.index_information()
+    assert db.event_stats.count_documents({'kind': 'venue'}) > 0
+    assert client.get('/past').status_code == 200
+
+    with open(BACKUP) as f:
+        report = restore.restore(db, f, include_empty=True)
+    assert report['venues'] == {'documents': 0} and db.venues.count_documents({}) == 0
+
+
+def test_incremental_restore_only_writes_changes(client):
+    db = get_db_connection()
+    backup = {'events': [
+        {'_id': '0123456789ab0123456789a1', 'title': 'Same', 'venue': 'V', 'start_datetime': '2025-01-01T20:00',
+         'end_datetime': '2025-01-01T23:00', 'tags': [], 'artists': []},
+        {'_id': '0123456789ab0123456789a2', 'title': 'Changed', 'venue': 'V',
+         'start_datetime': {'$date': '2025-01-02T09:00:00.000Z'}, 'end_datetime': {'$date': '2025-01-02T12:00:00.000Z'},
+         'tags': [], 'artists': []},
+    ], 'Artists': [{'_id': '0123456789ab0123456789b1', 'name': 'New Artist', 'description': '', 'links': []}]}
+    restore.restore(db, io.StringIO(json.dumps(backup)))
+    db.events.update_one({'title': 'Changed'}, {'$set': {'title': 'Edited live'}})
+    db.events.insert_one({'title': 'Not in backup'})
+    # fields only the live data has don't make a document differ
+    stamp = datetime(2025, 6, 1)
+    db.events.update_many({}, {'$set': {'updated_at': stamp}})
+
+    report = restore.restore(db, io.StringIO(json.dumps(backup)), incremental=True)
+    assert report['events'] == {'documents': 2, 'written': 1, 'deleted': 1}
+    assert report['Artists'] == {'documents': 1, 'written': 0, 'deleted': 0}
+    assert sorted(e['title'] for e in db.events.find()) == ['Changed', 'Same']
+    assert all(e['updated_at'] == stamp for e in db.events.find())
+
+
+def test_unparseable_dates_are_kept_and_counted(client):
+    db = get_db_connection()
+    backup = {'events': [
+        {'_id': '0123456789ab0123456789a1', 'title': 'Good', 'venue': 'V', 'start_datetime': '2025-01-01T20:00',
+         'end_datetime': '2025-01-01T23:00', 'tags': [], 'artists': []},
+        {'_id': '0123456789ab0123456789a2', 'title': 'Bad', 'venue': 'V', 'start_datetime': 'Friday night',
+         'end_datetime': '2025-01-02T02:00', 'tags': [], 'artists': []},
+    ]}
+    report = restore.restore(db, io.StringIO(json.dumps(backup)), workers=2, batch_size=1)
+    assert report['events'] == {'documents': 2, 'unparsed_dates': 1}
+    bad = db.events.find_one({'title': 'Bad'})
+    assert bad['start_datetime'] == 'Friday night' and 'fingerprint' not in bad
+    report = restore.restore(db, io.StringIO(json.dumps(backup)), incremental=True)
+    assert report['events'] == {'documents': 2, 'written': 0, 'deleted': 0, 'unparsed_dates': 1}
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+import app as app_module
+from app import get_db_connection
+import search
+
+
+def test_tokenize_strips_accents_and_punctuation():
+    assert search.tokenize('Café Drøm (live) .*.*') == ['cafe', 'drøm', 'live']
+    assert search.search_filter('.*.*.*') == {'_id': None}
+
+
+def test_search_is_prefix_matched_and_ranked(client):
+    start = datetime.now() + timedelta(days=3)
+    for title, artists in [('Warehouse Party', ['Technoir']), ('Techno Night', ['DJ A']), ('Jazz Brunch', [])]:
+        client.post('/createEvent', data={
+            'title': title,
+            'organisers': 'Org',
+            'venue': 'Venue',
+            'link': 'example.com',
+            'start_datetime': start.strftime('%Y-%m-%dT%H:%M'),
+            'end_datetime': (start + timedelta(hours=4)).strftime('%Y-%m-%dT%H:%M'),
+            'tags': '',
+            'artists': ', '.join(artists)
+        })
+    assert get_db_connection().events.find_one({'title': 'Techno Night'})['search_tokens'] == \
+        ['a', 'dj', 'night', 'org', 'techno', 'venue']
+
+    html = client.post('/', data={'search': 'techn'}).data.decode()
+    assert 'Jazz Brunch' not in html
+    # a title match outranks an artist match
+    assert html.index('Techno Night') < html.index('Warehouse Party')
+
+
+def test_past_search_pages_newest_first(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'SEARCH_LIMIT', 2)
+    start = datetime.utcnow() - timedelta(days=30)
+    get_db_connection().events.insert_many([{
+        'title': f'Gig {day}', 'organisers': '', 'venue': '', 'link': '', 'tags': [], 'artists': [],
+        'start_datetime': start + timedelta(days=day), 'end_datetime': start + timedelta(days=day, hours=3),
+        'search_tokens': ['gig', str(day)]} for day in range(5)])
+    html = client.post('/past', data={'search': 'gig'}).data.decode()
+    # equally good matches keep the past listing's order, the newest gigs come first
+    assert html.index('Gig 4') < html.index('Gig 3') and 'Gig 2' not in html
+    assert 'search=gig' in html and 'after=' in html
+    html = client.get('/past?' + html.split('href="/past?')[-1].split('"')[0].replace('&amp;', '&')).data.decode()
+    assert html.index('Gig 2') < html.index('Gig 1') and 'Gig 3' not in html
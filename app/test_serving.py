@@ -0,0 +1,18 @@
+from app import create_app
+
+
+def test_health_and_readiness(client):
+    assert client.get('/healthz').json == {'status': 'ok'}
+    ready = client.get('/readyz')
+    assert ready.status_code == 200
+    assert 'pool' in ready.json
+
+
+def test_create_app_prepares_database(client):
+    from app import get_db_connection
+    db = get_db_connection()
+    db.events.insert_one({'start_datetime': '2025-07-01T20:00', 'end_datetime': '2025-07-01T23:00'})
+    app = create_app()
+    assert app.name == 'app'
+    assert 'start_id_end' in db.events.index_information()
+    assert not isinstance(db.events.find_one()['start_datetime'], str)
@@ -0,0 +1,46 @@
+import os
+from datetime import datetime
+from app import get_db_connection
+import static_site
+
+
+def add_event(db, title):
+    return db.events.insert_one({
+        'title': title, 'venue': 'Warehouse', 'link': 'example.com', 'organisers': 'Crew', 'tags': ['techno'],
+        'artists': [], 'start_datetime': datetime(2099, 1, 1, 9), 'end_datetime': datetime(2099, 1, 1, 12)
+    }).inserted_id
+
+
+def test_generates_pages_then_only_what_changed(client, tmp_path):
+    db = get_db_connection()
+    event_id = add_event(db, 'First gig')
+    artist_id = db.Artists.insert_one({'name': 'Sun Araw', 'name_key': 'sun araw', 'description': 'Drone',
+                                       'tags': '', 'links': []}).inserted_id
+    other_id = db.Artists.insert_one({'name': 'Other', 'name_key': 'other', 'description': '',
+                                      'tags': '', 'links': []}).inserted_id
+    out = str(tmp_path)
+
+    first = static_site.generate(out)
+    assert set(first['rendered']) >= {'/', '/past', '/venues', '/organisers', '/tags', '/artists', '/notes',
+                                      '/calendar.ics', f'/artist/{artist_id}', f'/ics/{event_id}'}
+    assert 'First gig' in (tmp_path / 'index.html').read_text()
+    assert 'Drone' in (tmp_path / 'artist' / str(artist_id) / 'index.html').read_text()
+    assert 'SUMMARY:First gig' in (tmp_path / 'ics' / f'{event_id}.ics').read_text()
+    assert (tmp_path / 'static' / 'css' / 'style.css').exists()
+
+    assert static_site.generate(out)['rendered'] == []
+
+    # editing one artist re-renders that artist and the pages linking artists, nothing else
+    client.post(f'/artist/{artist_id}/edit', data={'name': 'Sun Araw', 'description': 'Guitar', 'tags': '',
+                                                    'links': ''})
+    second = static_site.generate(out)
+    assert sorted(second['rendered']) == sorted(['/', '/past', '/artists', f'/artist/{artist_id}'])
+    assert 'Guitar' in (tmp_path / 'artist' / str(artist_id) / 'index.html').read_text()
+
+    db.Artists.delete_one({'_id': other_id})
+    db.events.delete_one({'_id': event_id})
+    static_site.content_version.bump(db, 'events', 'Artists')
+    third = static_site.generate(out)
+    assert set(third['removed']) == {f'/artist/{other_id}', f'/ics/{event_id}'}
+    assert not os.path.exists(tmp_path / 'ics' / f'{event_id}.ics')
+    assert 'First gig' not in (tmp_path / 'index.html').read_text()
@@ -0,0 +1,98 @@
+import glob
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+
+# Builds a realistic benchmark database by scaling up the real db_data snapshots:
+# events are cloned from the snapshot events (keeping their titles, venues, tags and
+# artist lists) and spread over a two year window around today, with extra
+# synthetic artists and subscribers whose search terms come from the same data.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BATCH_SIZE = 1000
+
+
+def load_snapshot_events(pattern=os.path.join(ROOT, 'db_data', 'naarm_list_backup_*.json')):
+    # Newest copy of each event across all the snapshots
+    events = {}
+    for path in sorted(glob.glob(pattern)):
+        with open(path) as f:
+            for event in json.load(f).get('events', []):
+                events[event['_id']] = event
+    return list(events.values())
+
+
+def synthesise(db, events=1000, artists=10000, subscribers=10000, seed=1234):
+    # Imported here so bench can be pointed at the app after sys.path is set up
+    import event_time
+    from artist_store import name_key
+    from search import event_search_tokens
+    from event_import import fingerprint
+    import event_stats
+
+    rng = random.Random(seed)
+    templates = load_snapshot_events()
+    for collection in ('events', 'Artists', 'subscribers', 'venues', 'site_meta', 'event_stats', 'events_archive'):
+        db[collection].drop()
+
+    real_artists = sorted({a.strip() for e in templates for a in e.get('artists', []) if a.strip()})
+    tags = sorted({t.strip() for e in templates for t in e.get('tags', []) if t.strip()})
+    venues = sorted({e['venue'] for e in templates if e.get('venue')})
+
+    # One spelling per artist, the Artists collection is unique on name_key
+    spellings = {}
+    for name in real_artists:
+        spellings.setdefault(name_key(name), name)
+    artist_names = list(spellings.values())
+    while len(artist_names) < artists:
+        artist_names.append(f"{rng.choice(real_artists)} {len(artist_names)}")
+    artist_names = artist_names[:artists]
+
+    now = datetime.utcnow()
+    batch = []
+    for i in range(events):
+        template = templates[i % len(templates)]
+        start = now + timedelta(days=rng.uniform(-600, 120), hours=rng.randint(0, 23))
+        start = start.replace(second=0, microsecond=0)
+        event = {
+            '_id': ObjectId(),
+            'title': f"{template['title']} #{i}" if i >= len(templates) else template['title'],
+            'organisers': template.get('organisers', ''),
+            'venue': template.get('venue', ''),
+            'link': template.get('link', ''),
+            'tags': template.get('tags', []),
+            'artists': list(template.get('artists', [])) + rng.sample(artist_names, 2),
+            'start_datetime': start,
+            'end_datetime': start + timedelta(hours=rng.randint(2, 10)),
+        }
+        event['search_tokens'] = event_search_tokens(event)
+        event['fingerprint'] = fingerprint(event)
+        event['created_at'] = event['updated_at'] = event_time.utcnow()
+        batch.append(event)
+        if len(batch) >= BATCH_SIZE:
+            db.events.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        db.events.insert_many(batch, ordered=False)
+
+    db.Artists.insert_many([{
+        'name': name,
+        'name_key': name_key(name),
+        # roughly a third of artists have a bio and so get linked
+        'description': 'Bio' if rng.random() < 0.3 else '',
+        'tags': '',
+        'links': [],
+    } for name in artist_names], ordered=False)
+
+    db.venues.insert_many([{'name': v, 'description': '', 'location': '', 'contact': '', 'link': ''}
+                           for v in venues], ordered=False)
+
+    terms = tags + venues + real_artists
+    db.subscribers.insert_many([{
+        'email': f'subscriber{i}@example.com',
+        'search_terms': rng.sample(terms, min(len(terms), rng.randint(1, 4))),
+    } for i in range(subscribers)], ordered=False)
+    # Facets and the organisers/venues pages read the materialised counts
+    event_stats.rebuild(db)
@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from urllib.parse import urlencode
+
+# Benchmarks the Flask routes, the export and the mail digest against a synthesised
+# dataset (see dataset.py), reporting latency percentiles, throughput and peak
+# memory, and comparing against a stored baseline.
+#
+#   python bench/run.py --events 1000                      # mongomock, in process
+#   BENCH_DB_URL=mongodb://localhost:27017 python bench/run.py --events 100000
+#   python bench/run.py --save-baseline                     # store as the baseline
+#   python bench/run.py --compare                           # fail on regressions
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path[:0] = [os.path.join(ROOT, 'app'), os.path.join(ROOT, 'mail'), HERE]
+
+import dataset  # noqa: E402
+
+
+def get_database(args):
+    url = os.getenv('BENCH_DB_URL')
+    if url:
+        from pymongo import MongoClient
+        return 'mongo', MongoClient(url)[os.getenv('BENCH_DB_NAME', 'naarm_bench')]
+    import mongomock
+    return 'mongomock', mongomock.MongoClient()['naarm_bench']
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure(fn, iterations):
+    # Slow one-shot scenarios (the digest) aren't worth warming up
+    warmup = min(2, iterations - 1)
+    for _ in range(warmup):
+        fn()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t) * 1000)
+    elapsed = time.perf_counter() - started
+    # Peak memory from a separate run, tracemalloc slows everything down
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'p50_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(percentile(samples, 95), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'throughput_per_s': round(iterations / elapsed, 2),
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def scenarios(db):
+    import app as app_module
+    import mailsend
+
+    flask_app = app_module.app
+    flask_app.db_override = db
+    client = flask_app.test_client()
+    event_id = str(db.events.find_one({}, {'_id': 1}, sort=[('start_datetime', -1)])['_id'])
+
+    def cold(path):
+        # Rendered from scratch every time, the page cache is cleared first
+        def run():
+            app_module.page_cache.clear()
+            app_module.artist_links.invalidate()
+            assert client.get(path).status_code == 200
+        return run
+
+    def warm(path):
+        def run():
+            assert client.get(path).status_code == 200
+        return run
+
+    def search():
+        assert client.post('/', data={'search': 'techno'}).status_code == 200
+
+    # /past runs newest first, so a deep page continues from an event half way down that order
+    past = {'end_datetime': {'$lt': app_module.listing_cutoff()}}
+    middle = list(db.events.find(past, {'start_datetime': 1})
+                  .sort([('start_datetime', -1), ('_id', -1)])
+                  .skip(db.events.count_documents(past) // 2).limit(1))
+    deep_path = '/past?' + urlencode({'after': app_module.encode_cursor(middle[0])})
+
+    def past_deep_page():
+        app_module.page_cache.clear()
+        app_module.artist_links.invalidate()
+        response = client.get(deep_path)
+        assert response.status_code == 200 and b'No events found' not in response.data
+
+    def export():
+        with flask_app.test_request_context():
+            for _ in app_module.export_database():
+                pass
+
+    def digest():
+        os.environ.setdefault('SES_STUB', '1')
+        os.environ.setdefault('FROM_EMAIL', 'bench@example.com')
+        os.environ.setdefault('SES_MAX_SEND_RATE', '1000000')
+        mailsend.get_db_connection = lambda: db
+        db.subscribers.update_many({}, {'$unset': {'last_sent': ''}})
+        mailsend.lambda_handler({}, None)
+
+    return {
+        'index': (cold('/'), 20),
+        'index_cached': (warm('/'), 200),
+        'past': (cold('/past'), 20),
+        'past_deep_page': (past_deep_page, 20),
+        'search': (search, 20),
+        'artists': (cold('/artists'), 10),
+        'notes': (cold('/notes'), 50),
+        'ics': (warm(f'/ics/{event_id}'), 100),
+        'export': (export, 3),
+        'digest': (digest, 1),
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            continue
+        change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+        marker = ''
+        if change > threshold:
+            marker = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:16} p95 {before['p95_ms']:>10.2f} -> {result['p95_ms']:>10.2f} ms ({change:+.1f}%){marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the naarmlist routes')
+    parser.add_argument('--events', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=10000)
+    parser.add_argument('--subscribers', type=int, default=10000)
+    parser.add_argument('--only', nargs='*', help='scenario names to run')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true')
+    parser.add_argument('--threshold', type=float, default=20.0, help='p95 regression threshold in percent')
+    args = parser.parse_args()
+
+    backend, db = get_database(args)
+    started = time.perf_counter()
+    dataset.synthesise(db, events=args.events, artists=args.artists, subscribers=args.subscribers)
+    from indexes import ensure_indexes
+    ensure_indexes(db)
+    print(f"Synthesised {args.events} events, {args.artists} artists, {args.subscribers} subscribers "
+          f"on {backend} in {time.perf_counter() - started:.1f}s")
+
+    results = {}
+    for name, (fn, iterations) in scenarios(db).items():
+        if args.only and name not in args.only:
+            continue
+        results[name] = measure(fn, iterations)
+        r = results[name]
+        print(f"{name:16} p50 {r['p50_ms']:>10.2f}  p95 {r['p95_ms']:>10.2f}  p99 {r['p99_ms']:>10.2f} ms  "
+              f"{r['throughput_per_s']:>9.1f}/s  peak {r['peak_memory_kb']:>9.1f} KB")
+
+    baseline_path = os.path.join(HERE, 'baselines', f'{backend}-{args.events}.json')
+    if args.compare:
+        if not os.path.exists(baseline_path):
+            print(f"No baseline at {baseline_path}")
+            return 1
+        with open(baseline_path) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"Regressed: {', '.join(regressions)}")
+            return 1
+    if args.save_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump({'backend': backend, 'events': args.events, 'artists': args.artists,
+                       'subscribers': args.subscribers, 'results': results}, f, indent=2)
+        print(f"Saved baseline to {baseline_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
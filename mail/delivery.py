@@ -0,0 +1,179 @@
+import itertools
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+
+# Sends the digest emails from a bounded pool of worker threads. A shared token
+# bucket keeps the whole pool under the SES sending rate, throttling errors are
+# retried with exponential backoff, and every recipient gets an outcome record.
+
+# SES error codes that mean "slow down" rather than "this message is bad"
+THROTTLE_CODES = {'Throttling', 'ThrottlingException', 'TooManyRequestsException', 'MaxSendingRateExceeded'}
+
+# SendBulkTemplatedEmail takes at most 50 destinations per call
+MAX_BULK_DESTINATIONS = 50
+
+
+class TokenBucket:
+    # `rate` tokens are added per second up to `burst`, acquire() blocks until enough are available
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        # SES counts every destination of a bulk call, so a withdrawal bigger than the
+        # bucket is taken in bucket-sized parts rather than capped
+        while tokens > 0:
+            part = min(tokens, self.capacity)
+            self._take(part)
+            tokens -= part
+
+    def _take(self, tokens):
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+class StubSES:
+    # Stand-in for the boto3 SES client for local runs and tests, records what was sent
+
+    def __init__(self, fail=None, throttle_first=0):
+        self.sent = []
+        self.fail = set(fail or [])
+        self.throttle_first = throttle_first
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def _check(self, operation):
+        with self._lock:
+            if self.throttle_first:
+                self.throttle_first -= 1
+                raise ClientError({'Error': {'Code': 'Throttling', 'Message': 'Maximum sending rate exceeded.'}},
+                                  operation)
+
+    def send_email(self, Source, Destination, Message):
+        self._check('SendEmail')
+        email = Destination['ToAddresses'][0]
+        if email in self.fail:
+            raise ClientError({'Error': {'Code': 'MessageRejected', 'Message': 'Address rejected'}}, 'SendEmail')
+        with self._lock:
+            self.sent.append(email)
+            return {'MessageId': f'stub-{next(self._ids)}'}
+
+    def send_bulk_templated_email(self, Source, Template, DefaultTemplateData, Destinations):
+        self._check('SendBulkTemplatedEmail')
+        status = []
+        for destination in Destinations:
+            email = destination['Destination']['ToAddresses'][0]
+            if email in self.fail:
+                status.append({'Status': 'MessageRejected', 'Error': 'Address rejected'})
+            else:
+                with self._lock:
+                    self.sent.append(email)
+                status.append({'Status': 'Success', 'MessageId': f'stub-{next(self._ids)}'})
+        return {'Status': status}
+
+
+class Delivery:
+
+    def __init__(self, ses, source, subject, rate=14, workers=8, max_retries=5,
+                 template=None, bulk_size=MAX_BULK_DESTINATIONS, sleep=time.sleep):
+        self.ses = ses
+        self.source = source
+        self.subject = subject
+        self.bucket = TokenBucket(rate, sleep=sleep)
+        self.workers = workers
+        self.max_retries = max_retries
+        self.template = template
+        self.bulk_size = min(bulk_size, MAX_BULK_DESTINATIONS)
+        self.sleep = sleep
+
+    def _call(self, send, tokens):
+        # Returns (response, attempts), re-raising anything that isn't throttling
+        attempt = 0
+        while True:
+            attempt += 1
+            self.bucket.acquire(tokens)
+            try:
+                return send(), attempt
+            except ClientError as e:
+                if e.response['Error']['Code'] not in THROTTLE_CODES or attempt > self.max_retries:
+                    raise
+                self.sleep(min(30, 0.5 * 2 ** (attempt - 1)) * (0.5 + random.random()))
+
+    def _send_one(self, message):
+        email, body = message
+        try:
+            response, attempts = self._call(lambda: self.ses.send_email(
+                Source=self.source,
+                Destination={'ToAddresses': [email]},
+                Message={
+                    'Subject': {'Data': self.subject},
+                    'Body': {'Html': {'Data': body}}
+                }
+            ), 1)
+        except ClientError as e:
+            return [{'email': email, 'status': 'failed', 'error': e.response['Error']['Message']}]
+        return [{'email': email, 'status': 'sent', 'message_id': response['MessageId'], 'attempts': attempts}]
+
+    def _send_batch(self, messages):
+        # One SendBulkTemplatedEmail call, the template renders {{{body}}} as the HTML part
+        try:
+            response, attempts = self._call(lambda: self.ses.send_bulk_templated_email(
+                Source=self.source,
+                Template=self.template,
+                DefaultTemplateData=json.dumps({'body': '', 'subject': self.subject}),
+                Destinations=[{
+                    'Destination': {'ToAddresses': [email]},
+                    'ReplacementTemplateData': json.dumps({'body': body, 'subject': self.subject})
+                } for email, body in messages]
+            ), len(messages))
+        except ClientError as e:
+            return [{'email': email, 'status': 'failed', 'error': e.response['Error']['Message']}
+                    for email, _ in messages]
+        results = []
+        for (email, _), status in zip(messages, response['Status']):
+            if status.get('Status') == 'Success':
+                results.append({'email': email, 'status': 'sent', 'message_id': status['MessageId'],
+                                'attempts': attempts})
+            else:
+                results.append({'email': email, 'status': 'failed', 'error': status.get('Error', status.get('Status'))})
+        return results
+
+    def _guarded(self, work, job):
+        # Anything but a ClientError (a bad response, a network error) fails just this
+        # job's recipients, the others' outcomes are still reported
+        try:
+            return work(job)
+        except Exception as e:
+            messages = job if self.template else [job]
+            return [{'email': email, 'status': 'failed', 'error': f'{type(e).__name__}: {e}'}
+                    for email, _ in messages]
+
+    def send(self, messages):
+        # `messages` is a list of (email, html body), returns one outcome dict per recipient
+        if self.template:
+            jobs = [messages[i:i + self.bulk_size] for i in range(0, len(messages), self.bulk_size)]
+            work = self._send_batch
+        else:
+            jobs = messages
+            work = self._send_one
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(self._guarded, work, job) for job in jobs]
+            return [result for future in futures for result in future.result()]
@@ -1,15 +1,41 @@
 import os
+import time
+from contextlib import contextmanager
 import boto3
-from datetime import datetime, timedelta
+from datetime import datetime
 from pymongo import MongoClient
 from base64 import b64encode
-from botocore.exceptions import ClientError
 import pytz
+from matcher import match_subscribers
+from delivery import Delivery, StubSES
+
+MELBOURNE = pytz.timezone("Australia/Melbourne")
+
+# Created lazily on the first invocation and kept at module level so warm
+# Lambda invocations reuse the same connection pool
+_client = None
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    if value is None or value == '':
+        return default
+    return int(value)
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = MongoClient(
+            os.environ["DB_URL"],
+            maxPoolSize=_env_int("MONGO_MAX_POOL_SIZE", 10),
+            minPoolSize=_env_int("MONGO_MIN_POOL_SIZE", 0),
+            maxIdleTimeMS=_env_int("MONGO_MAX_IDLE_TIME_MS", 60000),
+            connectTimeoutMS=_env_int("MONGO_CONNECT_TIMEOUT_MS", 5000),
+            serverSelectionTimeoutMS=_env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+        )
+    return _client
 
 def get_db_connection():
-    client = MongoClient(os.environ["DB_URL"])
-    db = client[os.environ["DB_NAME"]]
-    return db
+    return get_client()[os.environ["DB_NAME"]]
 
 def create_email_body(events, search_terms, email):
     email_token = b64encode(email.encode()).decode()
@@ -21,7 +47,8 @@ def create_email_body(events, search_terms, email):
     """
     
     for event in events:
-        start_dt = datetime.fromisoformat(event['start_datetime'])
+        # Stored as UTC, shown in Melbourne time
+        start_dt = pytz.utc.localize(event['start_datetime']).astimezone(MELBOURNE)
         body += f"""
         <li>
             <strong>{event['title']}</strong><br>
@@ -41,66 +68,80 @@ def create_email_body(events, search_terms, email):
     
     return body
 
+# Only the fields the matcher and the email need
+EVENT_FIELDS = {'title': 1, 'venue': 1, 'tags': 1, 'artists': 1, 'start_datetime': 1, 'link': 1, 'updated_at': 1}
+
+def get_delivery(ses):
+    # Sending rate defaults to the SES sandbox limit, raise it to match the account's quota.
+    # With DIGEST_TEMPLATE set (an SES template whose HTML part is {{{body}}}) emails
+    # go out through SendBulkTemplatedEmail, up to 50 per call.
+    return Delivery(
+        ses,
+        source=os.environ["FROM_EMAIL"],
+        subject='Your Weekly Event Updates',
+        rate=float(os.environ.get("SES_MAX_SEND_RATE", 1)),
+        workers=_env_int("SES_WORKERS", 8),
+        max_retries=_env_int("SES_MAX_RETRIES", 5),
+        template=os.environ.get("DIGEST_TEMPLATE") or None,
+    )
+
+@contextmanager
+def timed(timings, phase):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = round(time.perf_counter() - started, 3)
+
 def lambda_handler(event, context):
+    timings = {}
     db = get_db_connection()
-    ses = boto3.client('ses', region_name=os.environ["AWS_REGION"])
-    
-    # Get all subscribers
-    subscribers = db.subscribers.find()
+    # SES_STUB=1 records the emails instead of sending them, for local runs
+    if os.environ.get("SES_STUB") == "1":
+        ses = StubSES()
+    else:
+        ses = boto3.client('ses', region_name=os.environ["AWS_REGION"])
     
-    melbourne_tz = pytz.timezone("Australia/Melbourne")
-    melbourne_now = datetime.now(melbourne_tz)
+    # Becomes the new watermark, taken before reading so nothing written mid-run is missed
+    run_started = datetime.utcnow()
+
+    # Load all subscribers and the upcoming window once, then match them in one pass
+    with timed(timings, 'load_subscribers'):
+        subscribers = list(db.subscribers.find({}, {'email': 1, 'search_terms': 1, 'last_sent': 1}))
+    with timed(timings, 'load_events'):
+        query = {'start_datetime': {'$gte': run_started}}
+        # Once everyone has a watermark, only events changed since the oldest one matter
+        watermarks = [s.get('last_sent') for s in subscribers]
+        if watermarks and all(watermarks):
+            query['updated_at'] = {'$gt': min(watermarks)}
+        events = list(db.events.find(query, EVENT_FIELDS).sort('start_datetime', 1))
+    with timed(timings, 'match'):
+        matches = match_subscribers(events, subscribers)
     
-    for subscriber in subscribers:
-        # Find matching events for this subscriber
-        query = {
-            'start_datetime': {'$gte': melbourne_now.isoformat()},
-            '$or': []
-        }
-        
-        # Add search conditions for each term
-        for term in subscriber['search_terms']:
-            query['$or'].extend([
-                {'title': {'$regex': term, '$options': 'i'}},
-                {'venue': {'$regex': term, '$options': 'i'}},
-                {'tags': {'$regex': term, '$options': 'i'}},
-                {'artists': {'$regex': term, '$options': 'i'}}
-            ])
-        
-        matching_events = set(db.events.find(query))
-        
-        if not matching_events:
-            continue
-        
-        # Create email content
-        email_body = create_email_body(
-            matching_events, 
-            subscriber['search_terms'],
-            subscriber['email']
-        )
-        
-        try:
-            response = ses.send_email(
-                Source=os.environ["FROM_EMAIL"],
-                Destination={'ToAddresses': [subscriber['email']]},
-                Message={
-                    'Subject': {
-                        'Data': 'Your Weekly Event Updates'
-                    },
-                    'Body': {
-                        'Html': {
-                            'Data': email_body
-                        }
-                    }
-                }
-            )
-            print(f"Email sent to {subscriber['email']}: {response['MessageId']}")
-            print(f"Response: {response}")
-        except ClientError as e:
-            print(f"Error sending to {subscriber['email']}: {e.response['Error']['Message']}")
-            continue
+    with timed(timings, 'render'):
+        messages = [
+            (subscriber['email'], create_email_body(matches[subscriber['email']],
+                                                    subscriber['search_terms'],
+                                                    subscriber['email']))
+            for subscriber in subscribers if matches.get(subscriber['email'])
+        ]
+
+    with timed(timings, 'send'):
+        results = get_delivery(ses).send(messages)
+    failed = [r for r in results if r['status'] != 'sent']
+    # Only subscribers whose email actually went out move their watermark forward
+    sent = [r['email'] for r in results if r['status'] == 'sent']
+    if sent:
+        db.subscribers.update_many({'email': {'$in': sent}}, {'$set': {'last_sent': run_started}})
+    for result in failed:
+        print(f"Error sending to {result['email']}: {result['error']}")
+
+    print(f"Digest for {len(subscribers)} subscribers over {len(events)} events "
+          f"({len(matches)} with matches): {len(results) - len(failed)} sent, {len(failed)} failed, "
+          f"timings (s): {timings}")
     
     return {
         'statusCode': 200,
-        'body': 'Weekly emails sent successfully'
+        'body': 'Weekly emails sent successfully',
+        'results': results
     }
@@ -0,0 +1,104 @@
+from collections import deque
+
+# Matches every subscriber's search terms against every upcoming event in a single
+# pass. All distinct terms go into one Aho-Corasick automaton, each event's text is
+# scanned once, and the terms found are mapped back to the subscribers who want them.
+
+# Fields a search term is matched against, as in the old per-subscriber $regex query
+MATCH_FIELDS = ('title', 'venue', 'tags', 'artists')
+
+# Joins fields so a term can never match across the end of one field into the next
+SEPARATOR = '\x00'
+
+
+def normalise(text):
+    return ' '.join(text.split()).casefold()
+
+
+def event_text(event):
+    parts = []
+    for field in MATCH_FIELDS:
+        value = event.get(field) or ''
+        if isinstance(value, (list, tuple)):
+            parts.extend(normalise(v) for v in value if isinstance(v, str))
+        else:
+            parts.append(normalise(str(value)))
+    return SEPARATOR.join(parts)
+
+
+class TermMatcher:
+    # Aho-Corasick automaton: a trie of the terms plus failure links, so scanning
+    # text for all terms at once is linear in the length of the text
+
+    def __init__(self, terms):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [set()]
+        for term in terms:
+            if term:
+                self._add(term)
+        self._link()
+
+    def _add(self, term):
+        state = 0
+        for char in term:
+            nxt = self.goto[state].get(char)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(set())
+                self.goto[state][char] = nxt
+            state = nxt
+        self.output[state].add(term)
+
+    def _link(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(char, 0)
+                self.output[nxt] |= self.output[self.fail[nxt]]
+
+    def find(self, text):
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            if self.output[state]:
+                found |= self.output[state]
+        return found
+
+
+def match_subscribers(events, subscribers):
+    # Returns {email: [events...]} for every subscriber with at least one match,
+    # events in the order given. A subscriber with a `last_sent` watermark only gets
+    # events whose `updated_at` is after it (events without a stamp count as old).
+    wanted_by = {}
+    watermarks = {}
+    for subscriber in subscribers:
+        if subscriber.get('last_sent'):
+            watermarks[subscriber['email']] = subscriber['last_sent']
+        for term in subscriber.get('search_terms', []):
+            term = normalise(term)
+            if term:
+                wanted_by.setdefault(term, set()).add(subscriber['email'])
+    matcher = TermMatcher(wanted_by)
+
+    matches = {}
+    for event in events:
+        emails = set()
+        for term in matcher.find(event_text(event)):
+            emails |= wanted_by[term]
+        for email in emails:
+            watermark = watermarks.get(email)
+            if watermark and not (event.get('updated_at') and event['updated_at'] > watermark):
+                continue
+            matches.setdefault(email, []).append(event)
+    return matches
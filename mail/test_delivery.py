@@ -0,0 +1,59 @@
+from delivery import Delivery, StubSES, TokenBucket
+
+
+def test_token_bucket_waits_for_refill():
+    now = [0.0]
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=2, burst=2, clock=lambda: now[0], sleep=sleep)
+    for _ in range(4):
+        bucket.acquire()
+    assert round(sum(slept), 3) == 1.0
+
+
+def test_token_bucket_charges_every_token_of_a_large_withdrawal():
+    now = [0.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=1, clock=lambda: now[0], sleep=sleep)
+    bucket.acquire(50)
+    assert round(now[0], 3) == 49.0
+
+
+def test_delivery_retries_throttling_and_records_outcomes():
+    ses = StubSES(fail=['bad@example.com'], throttle_first=2)
+    delivery = Delivery(ses, 'from@example.com', 'Digest', rate=1000, workers=4, sleep=lambda s: None)
+    messages = [(f'user{i}@example.com', '<p>hi</p>') for i in range(10)] + [('bad@example.com', '<p>hi</p>')]
+    results = {r['email']: r for r in delivery.send(messages)}
+    assert results['bad@example.com']['status'] == 'failed'
+    assert sum(r['status'] == 'sent' for r in results.values()) == 10
+    assert max(r.get('attempts', 1) for r in results.values()) > 1
+    assert sorted(ses.sent) == sorted(email for email, _ in messages[:10])
+
+
+def test_bulk_templated_sends_batch_destinations():
+    ses = StubSES(fail=['bad@example.com'])
+    delivery = Delivery(ses, 'from@example.com', 'Digest', rate=1000, template='digest', bulk_size=3,
+                        sleep=lambda s: None)
+    messages = [(f'user{i}@example.com', 'body') for i in range(5)] + [('bad@example.com', 'body')]
+    results = delivery.send(messages)
+    assert [r['status'] for r in results] == ['sent'] * 5 + ['failed']
+
+
+def test_unexpected_errors_fail_only_their_recipients():
+    class BrokenSES(StubSES):
+        def send_email(self, Source, Destination, Message):
+            if Destination['ToAddresses'][0] == 'bad@example.com':
+                raise ConnectionError('connection reset')
+            return super().send_email(Source, Destination, Message)
+
+    delivery = Delivery(BrokenSES(), 'from@example.com', 'Digest', rate=1000, sleep=lambda s: None)
+    results = delivery.send([('bad@example.com', 'body'), ('good@example.com', 'body')])
+    assert [r['status'] for r in results] == ['failed', 'sent']
+    assert results[0]['error'] == 'ConnectionError: connection reset'
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+import mongomock
+import mailsend
+
+
+def test_lambda_handler_sends_matching_digests(monkeypatch):
+    db = mongomock.MongoClient()['testdb']
+    monkeypatch.setattr(mailsend, 'get_db_connection', lambda: db)
+    monkeypatch.setenv('SES_STUB', '1')
+    monkeypatch.setenv('FROM_EMAIL', 'digest@example.com')
+    monkeypatch.setenv('SES_MAX_SEND_RATE', '1000')
+    start = datetime.utcnow() + timedelta(days=3)
+    db.events.insert_many([
+        {'title': 'Techno Night', 'venue': 'Solace', 'tags': ['techno'], 'artists': [],
+         'start_datetime': start, 'link': 'example.com'},
+        {'title': 'Old Techno', 'venue': 'Solace', 'tags': ['techno'], 'artists': [],
+         'start_datetime': datetime(2000, 1, 1, 9), 'link': 'example.com'},
+    ])
+    db.subscribers.insert_many([
+        {'email': 'a@example.com', 'search_terms': ['techno']},
+        {'email': 'b@example.com', 'search_terms': ['polka']},
+    ])
+    result = mailsend.lambda_handler({}, None)
+    assert [(r['email'], r['status']) for r in result['results']] == [('a@example.com', 'sent')]
+
+
+def test_second_run_only_sends_new_events(monkeypatch):
+    db = mongomock.MongoClient()['testdb']
+    monkeypatch.setattr(mailsend, 'get_db_connection', lambda: db)
+    monkeypatch.setenv('SES_STUB', '1')
+    monkeypatch.setenv('FROM_EMAIL', 'digest@example.com')
+    monkeypatch.setenv('SES_MAX_SEND_RATE', '1000')
+    start = datetime.utcnow() + timedelta(days=3)
+    db.events.insert_one({'title': 'Techno Night', 'venue': 'Solace', 'tags': [], 'artists': [],
+                          'start_datetime': start, 'link': 'example.com',
+                          'updated_at': datetime.utcnow() - timedelta(days=1)})
+    db.subscribers.insert_one({'email': 'a@example.com', 'search_terms': ['techno']})
+
+    assert len(mailsend.lambda_handler({}, None)['results']) == 1
+    assert db.subscribers.find_one()['last_sent']
+    # Nothing new since the last digest
+    assert mailsend.lambda_handler({}, None)['results'] == []
+
+    db.events.insert_one({'title': 'More Techno', 'venue': 'Solace', 'tags': [], 'artists': [],
+                          'start_datetime': start, 'link': 'example.com',
+                          'updated_at': datetime.utcnow() + timedelta(seconds=1)})
+    sent = mailsend.lambda_handler({}, None)['results']
+    assert [r['email'] for r in sent] == ['a@example.com']
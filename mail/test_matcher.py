@@ -0,0 +1,27 @@
+from matcher import TermMatcher, match_subscribers
+
+
+def test_term_matcher_finds_overlapping_terms():
+    matcher = TermMatcher(['he', 'she', 'his', 'hers'])
+    assert matcher.find('ushers') == {'she', 'he', 'hers'}
+    assert matcher.find('nothing here') == {'he'}
+
+
+def test_match_subscribers_single_pass():
+    events = [
+        {'title': 'Techno Night', 'venue': '+SIX12', 'tags': ['techno'], 'artists': ['Halv Drøm']},
+        {'title': 'Jazz Brunch', 'venue': 'Bar', 'tags': [], 'artists': []},
+        {'title': 'Ambient', 'venue': 'Solace', 'tags': ['drone'], 'artists': []},
+    ]
+    subscribers = [
+        {'email': 'a@example.com', 'search_terms': ['TECHNO', 'halv drøm']},
+        {'email': 'b@example.com', 'search_terms': ['solace', 'jazz']},
+        {'email': 'c@example.com', 'search_terms': ['polka']},
+        # terms never match across two fields
+        {'email': 'd@example.com', 'search_terms': ['night+six']},
+    ]
+    matches = match_subscribers(events, subscribers)
+    assert [e['title'] for e in matches['a@example.com']] == ['Techno Night']
+    assert [e['title'] for e in matches['b@example.com']] == ['Jazz Brunch', 'Ambient']
+    assert 'c@example.com' not in matches
+    assert 'd@example.com' not in matches
@@ -4,7 +4,7 @@
 set -e
 
 # Default values
-BACKUP_DIR="db_data"
+BACKUP_DIR=${BACKUP_DIR:-"db_data"}
 DB_NAME=${DB_NAME:-"gigsdb"}
 # Use 'db' as default host for Docker Compose
 MONGO_HOST=${MONGO_HOST:-"db"}
@@ -14,10 +14,13 @@ MONGO_PORT=${MONGO_PORT:-"27017"}
 CONFIRM="yes"
 BACKUP_FILE=""
 AUTO_CONFIRM="no"
+RESTORE_ARGS=""
 
 usage() {
-  echo "Usage: $0 [-y] [backup_file.json]"
+  echo "Usage: $0 [-y] [--incremental] [--include-empty] [backup_file.json]"
   echo "  -y                Skip confirmation prompt (dangerous!)"
+  echo "  --incremental     Only write the documents that differ from the database"
+  echo "  --include-empty   Also restore collections that are empty in the backup (empties them)"
   echo "  backup_file.json  Path to backup JSON file (default: latest in $BACKUP_DIR)"
   exit 1
 }
@@ -38,6 +41,10 @@ while [[ $# -gt 0 ]]; do
       AUTO_CONFIRM="yes"
       shift
       ;;
+    --incremental|--include-empty)
+      RESTORE_ARGS="$RESTORE_ARGS $1"
+      shift
+      ;;
     -h|--help)
       usage
       ;;
@@ -72,29 +79,13 @@ if [ "$AUTO_CONFIRM" != "yes" ]; then
 fi
 
 
-# Extract collections from JSON (assumes top-level keys are collection names)
-COLLECTIONS=$(jq -r 'keys[]' "$BACKUP_FILE")
-echo "Seeding database: $DEFAULT_DB from backup file: $BACKUP_FILE" to "$MONGO_HOST:$MONGO_PORT"
+# app/restore.py streams the file into staging collections and swaps them in, so the
+# site keeps serving the old data until the restore is complete
+export DB_URL=${DB_URL:-"mongodb://$MONGO_HOST:$MONGO_PORT"}
+export DB_NAME="$DEFAULT_DB"
+RESTORE=${RESTORE:-"$(dirname "$0")/app/restore.py"}
 
-for COL in $COLLECTIONS; do
-  echo "Importing collection: $COL"
-  jq ".\"$COL\"" "$BACKUP_FILE" > "/tmp/${COL}.json"
-  # Skip import if file is empty array
-  if [ "$(cat /tmp/${COL}.json)" = "[]" ]; then
-    echo "Skipping $COL: empty collection."
-    rm "/tmp/${COL}.json"
-    continue
-  fi
-  mongoimport --host "$MONGO_HOST" --port "$MONGO_PORT" \
-    --db "$DEFAULT_DB" --collection "$COL" --drop \
-    --file "/tmp/${COL}.json" --jsonArray
-  rm "/tmp/${COL}.json"
-done
+echo "Seeding database: $DEFAULT_DB from backup file: $BACKUP_FILE"
+python "$RESTORE" "$BACKUP_FILE" $RESTORE_ARGS
 
 echo "Database seeding complete."
-echo "\nSample data from each collection in $DEFAULT_DB:" 
-
-for COL in $COLLECTIONS; do
-  echo "\nCollection: $COL (top 5 documents)"
-  mongosh --host "$MONGO_HOST" --port "$MONGO_PORT" "$DEFAULT_DB" --quiet --eval "db.getCollection('$COL').find().limit(5).forEach(doc => printjson(doc))"
-done